@@ -1,5 +1,4 @@
 import os
-import httpx
 import hashlib
 import time
 from typing import Optional
@@ -109,6 +108,9 @@ def generate_badge(label: str, value: str, style: str = "flat", color: Optional[
 
 # Multi-provider support
 async def fetch_api(url: str, headers=None) -> dict:
+    # Imported on first upstream call; custom badges never need it
+    import httpx
+
     async with httpx.AsyncClient() as client:
         response = await client.get(url, headers=headers or {})
         if response.status_code == 200:
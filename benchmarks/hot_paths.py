@@ -0,0 +1,191 @@
+"""Microbenchmarks for the render, compose, cache and sanitize hot paths.
+
+    python -m benchmarks.hot_paths                  # run and print
+    python -m benchmarks.hot_paths --save           # write benchmarks/baseline.json
+    python -m benchmarks.hot_paths --compare        # flag regressions vs the baseline
+    python -m benchmarks.hot_paths --filter compose # only matching cases
+
+Each case reports ops/sec and the peak bytes allocated by a single call
+(tracemalloc high-water mark). Baselines are machine specific; regenerate
+them on the machine that runs the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from src import badge as legacy_badge
+from src.badges import generate_badge
+from src.composer import compose_badges
+from src.themes import THEMES
+from src.utils import sanitize_string
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+ICONS = ["", "github", "star", "flame", "bolt"]
+
+Case = Tuple[str, Callable[[], object]]
+
+
+def render_cases() -> List[Case]:
+    cases = []
+    for style in THEMES:
+        for icon in ICONS:
+            for animated in (False, True):
+                name = f"render/{style}/{icon or 'none'}/{'animated' if animated else 'static'}"
+                cases.append((name, lambda s=style, i=icon, a=animated: generate_badge("stars", "12345", style=s, icon=i, animated=a)))
+    for style in legacy_badge.THEMES:
+        for icon in ICONS:
+            cases.append((f"render_v1/{style}/{icon or 'none'}", lambda s=style, i=icon: legacy_badge.generate_badge("stars", "12345", style=s, icon=i)))
+    return cases
+
+
+def compose_cases() -> List[Case]:
+    cases = []
+    for count in (10, 100, 1000):
+        badges = [
+            {"svg": generate_badge(f"label{i}", str(i)), "width": 90, "height": 20}
+            for i in range(count)
+        ]
+        for layout in ("horizontal", "vertical"):
+            cases.append((f"compose/{layout}/{count}", lambda b=badges, layout=layout: compose_badges(b, layout)))
+    return cases
+
+
+def sanitize_cases() -> List[Case]:
+    inputs = {
+        "plain_short": "passing",
+        "plain_10k": "a" * 10_000,
+        "all_special_10k": "&<>\"'" * 2_000,
+        "entity_lookalike": "&amp;&lt;&#39;" * 500,
+        "unicode_mixed": "星<script>é&" * 1_000,
+        "script_tag": '<script>alert("x")</script>' * 100,
+    }
+    return [(f"sanitize/{name}", lambda s=value: sanitize_string(s)) for name, value in inputs.items()]
+
+
+def cache_cases() -> List[Case]:
+    # In-memory mode only; Redis round trips would dominate the numbers
+    os.environ.pop("REDIS_URL", None)
+    from src.cache import Cache
+
+    cache = Cache()
+    loop = asyncio.new_event_loop()
+    svg = generate_badge("stars", "12345")
+    keys = [f"bench:{i}" for i in range(1000)]
+    batch = len(keys)
+
+    async def set_all():
+        for key in keys:
+            await cache.set(key, svg, 300)
+
+    async def get_all():
+        for key in keys:
+            await cache.get(key)
+
+    loop.run_until_complete(set_all())
+    # Each call runs a batch of 1000 operations so event loop overhead is amortized
+    cases = [
+        (f"cache/memory/set_x{batch}", lambda: loop.run_until_complete(set_all())),
+        (f"cache/memory/get_x{batch}", lambda: loop.run_until_complete(get_all())),
+    ]
+    if hasattr(os, "fork"):
+        from src.shared_cache import SharedMemoryCache
+
+        shared = SharedMemoryCache(os.path.join(tempfile.mkdtemp(), "shm"), slots=4096, slot_size=4096)
+        for key in keys:
+            shared.set(key, svg, 300)
+        cases += [
+            (f"cache/shared/set_x{batch}", lambda: [shared.set(key, svg, 300) for key in keys]),
+            (f"cache/shared/get_x{batch}", lambda: [shared.get(key) for key in keys]),
+        ]
+    return cases
+
+
+def measure(func: Callable[[], object], min_time: float) -> Dict[str, float]:
+    for _ in range(3):
+        func()
+
+    # Grow the batch until one timing run takes at least min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time * 1.1 / max(elapsed, 1e-9)))
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    return {"ops_per_sec": round(number / elapsed, 1), "peak_bytes": peak}
+
+
+def run(filter_text: str, min_time: float) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, func in render_cases() + compose_cases() + sanitize_cases() + cache_cases():
+        if filter_text and filter_text not in name:
+            continue
+        results[name] = measure(func, min_time)
+        print(f"{name:<45} {results[name]['ops_per_sec']:>14,.1f} ops/s {results[name]['peak_bytes']:>10,} B/call")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['ops_per_sec']:,.1f} ops/s vs baseline {base['ops_per_sec']:,.1f}")
+        if current["peak_bytes"] > base["peak_bytes"] * (1 + threshold) + 64:
+            regressions.append(f"{name}: {current['peak_bytes']:,} B/call vs baseline {base['peak_bytes']:,}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path microbenchmarks")
+    parser.add_argument("--filter", default="", help="only run cases containing this text")
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per timing run")
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="compare against the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown ratio")
+    args = parser.parse_args()
+
+    results = run(args.filter, args.min_time)
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}")
+
+    if args.save:
+        baseline = {}
+        if args.filter and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"saved {len(results)} results to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
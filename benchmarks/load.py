@@ -0,0 +1,249 @@
+"""End-to-end load harness against a local fake GitHub/PyPI upstream.
+
+    python -m benchmarks.load --requests 5000 --concurrency 50 --repos 500
+    python -m benchmarks.load --latency-ms 80 --rate-limit 5000 --json
+
+The ASGI app in src.main is driven in process through httpx.ASGITransport.
+Upstream calls go to FakeUpstream through httpx.MockTransport. Repos,
+metrics and styles are drawn from Zipf distributions, so a few hot badges
+dominate the traffic, as in production.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Keep the app's own limiter out of the measurement and off the real network
+os.environ.setdefault("RATE_LIMIT", "100000000/minute")
+os.environ["GITHUB_TOKEN"] = ""
+os.environ["REDIS_URL"] = ""
+
+import httpx  # noqa: E402
+
+METRICS = ["stars", "forks", "open_issues", "license", "release", "ci_status",
+           "open_prs", "last_commit", "watchers", "contributors", "trophy"]
+STYLES = ["flat", "neon", "minimal", "cyberpunk", "glass", "pixel"]
+PYPI_PACKAGES = ["requests", "httpx", "fastapi", "numpy", "pydantic", "redis"]
+# Served from the one PyPI JSON document; downloads would need pypistats.org
+PYPI_METRICS = ["version", "license", "releases", "python_requires"]
+
+REPO_RE = re.compile(r"^/repos/([^/]+)/([^/]+)(/.*)?$")
+
+
+class FakeUpstream:
+    """Emulates the GitHub REST and PyPI JSON endpoints the providers use.
+
+    Every response carries an ETag, and If-None-Match gets a 304. GitHub
+    responses carry X-RateLimit-* headers. Once the budget is spent, requests
+    get a 403 until the window resets, which matches GitHub's behaviour.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, rate_limit: int = 5000, missing_ratio: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.missing_ratio = missing_ratio
+        self.calls: Counter = Counter()
+        self.not_modified = 0
+
+    def endpoint(self, request: httpx.Request) -> str:
+        if request.url.host == "pypi.org":
+            return "pypi"
+        match = REPO_RE.match(request.url.path)
+        if not match:
+            return "other"
+        suffix = (match.group(3) or "").strip("/")
+        return suffix.split("/")[0] if suffix else "repo"
+
+    def body(self, endpoint: str, request: httpx.Request) -> Optional[object]:
+        path = request.url.path
+        seed = int(hashlib.md5(path.encode()).hexdigest()[:8], 16)
+        if endpoint == "pypi":
+            name = path.split("/")[2]
+            return {"info": {"name": name, "version": f"{seed % 10}.{seed % 7}.0",
+                             "license": "MIT", "requires_python": ">=3.9"},
+                    "releases": {f"0.{i}.0": [] for i in range(seed % 50)}, "urls": []}
+        owner, repo = REPO_RE.match(path).group(1, 2)
+        if (seed % 1000) / 1000 < self.missing_ratio:
+            return None
+        if endpoint == "repo":
+            return {"full_name": f"{owner}/{repo}", "stargazers_count": seed % 50000,
+                    "forks_count": seed % 5000, "open_issues_count": seed % 300,
+                    "subscribers_count": seed % 900, "size": seed % 100000,
+                    "stars": seed % 50000, "forks": seed % 5000, "open_issues": seed % 300,
+                    "license": {"spdx_id": "MIT"}}
+        if endpoint == "pulls":
+            return [{"number": i} for i in range(seed % 30)]
+        if endpoint == "commits":
+            return [{"sha": f"{seed:x}{i}", "commit": {"committer": {"date": "2024-06-30T10:00:00Z"}}}
+                    for i in range(seed % 5 + 1)]
+        if endpoint == "releases":
+            return {"tag_name": f"v{seed % 9}.{seed % 13}.0"}
+        if endpoint == "actions":
+            return {"workflow_runs": [{"conclusion": "success"}]}
+        if endpoint == "contributors":
+            return [{"login": "someone"}]
+        return None
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        endpoint = self.endpoint(request)
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        headers = {}
+        if endpoint != "pypi":
+            if self.remaining <= 0:
+                return httpx.Response(403, json={"message": "API rate limit exceeded"},
+                                      headers={"X-RateLimit-Remaining": "0"})
+            headers = {"X-RateLimit-Limit": str(self.rate_limit),
+                       "X-RateLimit-Remaining": str(self.remaining)}
+
+        body = self.body(endpoint, request)
+        if body is None:
+            return httpx.Response(404, json={"message": "Not Found"}, headers=headers)
+        content = json.dumps(body).encode()
+        etag = f'"{hashlib.md5(content).hexdigest()}"'
+        headers["ETag"] = etag
+        if request.headers.get("If-None-Match") == etag:
+            # Conditional hits don't count against GitHub's rate limit
+            self.not_modified += 1
+            return httpx.Response(304, headers=headers)
+        if endpoint != "pypi":
+            self.remaining -= 1
+            headers["X-RateLimit-Remaining"] = str(self.remaining)
+        return httpx.Response(200, content=content, headers={**headers, "Content-Type": "application/json"})
+
+
+def zipf_weights(n: int, s: float) -> List[float]:
+    return [1 / (k ** s) for k in range(1, n + 1)]
+
+
+def build_traffic(count: int, repos: int, s: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    repo_names = [f"org{i % 97}/repo{i}" for i in range(repos)]
+    repo_picks = rng.choices(repo_names, weights=zipf_weights(repos, s), k=count)
+    metric_picks = rng.choices(METRICS, weights=zipf_weights(len(METRICS), s), k=count)
+    style_picks = rng.choices(STYLES, weights=zipf_weights(len(STYLES), s), k=count)
+    kinds = rng.choices(["v2", "v1", "custom", "compose", "pypi"], weights=[65, 15, 10, 5, 5], k=count)
+
+    urls = []
+    for repo, metric, style, kind in zip(repo_picks, metric_picks, style_picks, kinds):
+        if kind == "v2":
+            urls.append(f"/v2/badge/github/{repo}/{metric}?style={style}")
+        elif kind == "v1":
+            urls.append(f"/badge/github/{repo}/{metric}?style={style}")
+        elif kind == "pypi":
+            package = rng.choices(PYPI_PACKAGES, weights=zipf_weights(len(PYPI_PACKAGES), s))[0]
+            urls.append(f"/v2/badge/pypi/{package}/{rng.choice(PYPI_METRICS)}?style={style}")
+        elif kind == "custom":
+            urls.append(f"/v2/badge/custom?label={metric}&value={rng.randint(0, 50)}&style={style}")
+        else:
+            urls.append(f"/v2/compose?badges={metric}:{rng.randint(0, 99)},forks:{rng.randint(0, 9)}&style={style}")
+    return urls
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_load(args) -> Dict:
+    from src import analytics, http_client
+    from src.cache import cache
+    from src.main import app
+    from src.plugins import load_plugins
+    from src.snapshots import snapshots
+
+    workdir = tempfile.mkdtemp()
+    analytics.DB_PATH = os.path.join(workdir, "analytics.db")
+    snapshots.path = os.path.join(workdir, "snapshots.db")
+    await analytics.init_db()
+    load_plugins()
+
+    upstream = FakeUpstream(args.latency_ms, args.rate_limit, args.missing_ratio)
+    http_client.use_transport(httpx.MockTransport(upstream))
+
+    urls = build_traffic(args.requests, args.repos, args.zipf, args.seed)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    queue: asyncio.Queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load.test") as client:
+        async def worker():
+            while True:
+                try:
+                    url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    await http_client.close_client()
+    latencies.sort()
+    upstream_calls = sum(upstream.calls.values())
+    lookups = cache.hits + cache.misses
+    return {
+        "requests": len(urls),
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(urls) / elapsed, 1),
+        "latency_ms": {p: round(percentile(latencies, float(p[1:])) * 1000, 3)
+                       for p in ("p50", "p90", "p99", "p99.9")},
+        "cache_hit_ratio": round(cache.hits / lookups, 4) if lookups else 0.0,
+        "upstream_calls": upstream_calls,
+        "upstream_calls_per_request": round(upstream_calls / len(urls), 4),
+        "upstream_by_endpoint": dict(upstream.calls),
+        "upstream_not_modified": upstream.not_modified,
+        "rate_limit_remaining": upstream.remaining,
+        "statuses": dict(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the badge API against a fake upstream")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--repos", type=int, default=300, help="distinct repos in the Zipf mix")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent (higher = hotter head)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake upstream latency")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="fake GitHub rate limit budget")
+    parser.add_argument("--missing-ratio", type=float, default=0.0, help="share of repos that 404")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"requests        {report['requests']} @ concurrency {report['concurrency']} in {report['elapsed_s']}s")
+    print(f"throughput      {report['throughput_rps']} req/s")
+    print("latency         " + "  ".join(f"{p}={v}ms" for p, v in report["latency_ms"].items()))
+    print(f"cache hit ratio {report['cache_hit_ratio']:.2%}")
+    print(f"upstream calls  {report['upstream_calls']} ({report['upstream_calls_per_request']} per request, "
+          f"{report['upstream_not_modified']} not modified, {report['rate_limit_remaining']} rate limit left)")
+    print(f"  by endpoint   {report['upstream_by_endpoint']}")
+    print(f"statuses        {report['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import psutil
-import asyncio
 
-async def get_metric(metric: str) -> str:
+# psutil calls are blocking syscalls, so run them in the plugin thread pool
+PLUGIN_META = {"sync": True, "cache_ttl": 5, "max_latency": 1.0}
+
+def get_metric(metric: str) -> str:
     if metric == "cpu":
         return f"{psutil.cpu_percent()}%"
     elif metric == "memory":
@@ -9,4 +11,4 @@ async def get_metric(metric: str) -> str:
     elif metric == "disk":
         return f"{psutil.disk_usage('/').percent}%"
     else:
-        raise ValueError(f"Unknown metric: {metric}")
\ No newline at end of file
+        raise ValueError(f"Unknown metric: {metric}")
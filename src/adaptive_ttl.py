@@ -0,0 +1,98 @@
+"""Per-value TTLs learned from how often values actually change.
+
+Every time a metric value is fetched or revalidated, its snapshot counts
+how much the value changed and how long it was observed. Counts change by
+the size of the step (stars going from 10 to 14 is four changes), so
+values that are fetched rarely still show their real rate. Both counts decay
+with a half-life of ADAPTIVE_TTL_HALF_LIFE, so the estimate follows a repo
+whose activity picks up or dies down. Treating changes as a Poisson process
+with rate r (changes per second), the TTL is the longest interval over which
+a change is less likely than ADAPTIVE_TTL_STALENESS:
+
+    ttl = -ln(1 - ADAPTIVE_TTL_STALENESS) / r
+
+It is then clamped to the bounds of the metric's class. A new value starts
+from one pseudo-change over the span that gives CACHE_TTL. That prior
+decays like any other observation, so a value that never changes reaches
+its class maximum within a few half-lives.
+"""
+import math
+from typing import Dict, Tuple
+from .config import settings
+
+# (min, max) seconds per class of metric
+CLASS_BOUNDS: Dict[str, Tuple[int, int]] = {
+    "static": (3600, 86400),
+    "slow": (900, 21600),
+    "counter": (300, 3600),
+    "volatile": (60, 600),
+}
+METRIC_CLASSES = {
+    "license": "static",
+    "python_requires": "static",
+    "release": "slow",
+    "version": "slow",
+    "releases": "slow",
+    "last_upload": "slow",
+    "size": "slow",
+    "contributors": "slow",
+    "trophy": "slow",
+    "activity_rank": "slow",
+    "commit_velocity": "slow",
+    "heatmap": "slow",
+    "stars": "counter",
+    "forks": "counter",
+    "watchers": "counter",
+    "open_issues": "counter",
+    "open_prs": "counter",
+    "commit_frequency": "counter",
+    "downloads": "counter",
+    "ci_status": "volatile",
+    "last_commit": "volatile",
+}
+DEFAULT_CLASS = "counter"
+
+
+def metric_class(metric: str) -> str:
+    return METRIC_CLASSES.get(metric, DEFAULT_CLASS)
+
+
+def bounds(metric: str) -> Tuple[int, int]:
+    return CLASS_BOUNDS[metric_class(metric)]
+
+
+def decay(elapsed: float) -> float:
+    return 0.5 ** (elapsed / settings.ADAPTIVE_TTL_HALF_LIFE)
+
+
+def prior() -> Tuple[float, float]:
+    """(changes, observed seconds) for a value with no history: one change per CACHE_TTL-giving span"""
+    return 1.0, settings.CACHE_TTL / -math.log(1 - settings.ADAPTIVE_TTL_STALENESS)
+
+
+def change_rate(changes: float, observed: float) -> float:
+    """Changes per second"""
+    if observed <= 0:
+        changes, observed = prior()
+    return changes / observed
+
+
+def choose_ttl(changes: float, observed: float, limits: Tuple[int, int]) -> int:
+    if not settings.ADAPTIVE_TTL:
+        return settings.CACHE_TTL
+    rate = change_rate(changes, observed)
+    if rate <= 0:
+        return limits[1]
+    ttl = -math.log(1 - settings.ADAPTIVE_TTL_STALENESS) / rate
+    low, high = limits
+    return int(min(max(ttl, low), high))
+
+
+def changes_between(old: str, new: str) -> float:
+    """Counted changes: the size of the step for counts (a star is one change), else 0 or 1"""
+    if old == new:
+        return 0.0
+    try:
+        return abs(float(new) - float(old))
+    except ValueError:
+        return 1.0
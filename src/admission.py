@@ -0,0 +1,107 @@
+"""Admission control for when the event loop falls behind.
+
+A probe task sleeps ADMISSION_PROBE_INTERVAL seconds at a time and measures
+how late it wakes up. That delay is the event-loop lag every request is
+currently paying. The reading rises immediately and decays by
+LAG_DECAY per probe, so a burst keeps the process shedding briefly instead
+of flapping. Upstream calls in flight are counted as well.
+
+While either measure is over its threshold (ADMISSION_LAG_MS,
+ADMISSION_MAX_UPSTREAM), the process is overloaded:
+
+- new upstream calls are refused with MetricUnavailable(OVERLOADED). Providers
+  serve a stale value when they have one. Routes otherwise answer with an
+  uncached placeholder badge, or a 503 with Retry-After: ADMISSION_RETRY_AFTER
+  for JSON
+- analytics flushes are deferred, unless the queue is half full
+- new WebSocket subscriptions are refused
+
+Cache hits never consult the controller and are served as usual.
+"""
+import asyncio
+from functools import lru_cache
+from typing import Optional
+from .config import settings
+from .metrics import CallbackFamily, Family
+from .negative_cache import OVERLOADED, MetricUnavailable
+
+LAG_DECAY = 0.8
+
+SHED = Family("badge_admission_shed_total", "Work refused or deferred while overloaded", "counter", ("kind",))
+
+
+class AdmissionController:
+    def __init__(self):
+        self.lag = 0.0
+        self.inflight = 0
+        self._probe: Optional[asyncio.Task] = None
+        self._shed_upstream = SHED.labels("upstream")
+        self._shed_websocket = SHED.labels("websocket")
+        self._shed_analytics = SHED.labels("analytics")
+
+    def start(self):
+        """Start the lag probe on the running loop; cheap to call per request"""
+        if self._probe is None or self._probe.done():
+            if settings.ADMISSION_LAG_MS > 0:
+                self._probe = asyncio.get_running_loop().create_task(self._measure())
+
+    async def stop(self):
+        if self._probe is not None:
+            self._probe.cancel()
+            self._probe = None
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        interval = settings.ADMISSION_PROBE_INTERVAL
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            late = max(loop.time() - started - interval, 0.0)
+            self.lag = max(late, self.lag * LAG_DECAY)
+
+    @property
+    def overloaded(self) -> bool:
+        if settings.ADMISSION_LAG_MS > 0 and self.lag * 1000 >= settings.ADMISSION_LAG_MS:
+            return True
+        return 0 < settings.ADMISSION_MAX_UPSTREAM <= self.inflight
+
+    def enter_upstream(self, provider: str):
+        """Count an upstream call about to start, or refuse it while overloaded"""
+        if self.overloaded:
+            self._shed_upstream.inc()
+            raise MetricUnavailable(OVERLOADED, provider)
+        self.inflight += 1
+
+    def exit_upstream(self):
+        self.inflight -= 1
+
+    def admit_websocket(self) -> bool:
+        if self.overloaded:
+            self._shed_websocket.inc()
+            return False
+        return True
+
+    def defer_analytics(self, queued: int) -> bool:
+        if self.overloaded and queued < settings.ANALYTICS_QUEUE_SIZE // 2:
+            self._shed_analytics.inc()
+            return True
+        return False
+
+
+admission = AdmissionController()
+
+
+@lru_cache(maxsize=256)
+def placeholder(label: str, style: str) -> str:
+    """Badge served instead of queuing an upstream call while overloaded"""
+    from .badges import generate_badge
+
+    return generate_badge(label, "busy", style=style, color="#9f9f9f")
+
+
+CallbackFamily("badge_event_loop_lag_seconds", "Event loop lag measured by the admission probe", "gauge", (),
+               lambda: {(): admission.lag})
+CallbackFamily("badge_upstream_inflight", "Upstream calls in flight", "gauge", (),
+               lambda: {(): admission.inflight})
+CallbackFamily("badge_overloaded", "1 while new upstream calls are being shed", "gauge", (),
+               lambda: {(): int(admission.overloaded)})
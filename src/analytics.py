@@ -1,11 +1,66 @@
-import aiosqlite
-from typing import Dict, List
+import asyncio
+import csv
+import io
+import json
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from .admission import admission
 from .config import settings
+from .metrics import CallbackFamily
+from .timing import timed
 
 DB_PATH = "analytics.db"
+FLUSH_BATCH = 500
+# Rollup bucket -> strftime format over the stored "%Y-%m-%d %H:%M:%S" timestamps
+BUCKETS = {"minute": "%Y-%m-%d %H:%M", "hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+GROUP_COLUMNS = ("type", "identifier", "metric")
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+RENDER_FIELDS = ["timestamp", "type", "identifier", "metric"]
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS badge_renders_timestamp ON badge_renders (timestamp)",
+    "CREATE INDEX IF NOT EXISTS badge_renders_identifier ON badge_renders (type, identifier, timestamp)",
+    "CREATE INDEX IF NOT EXISTS badge_renders_metric ON badge_renders (metric, timestamp)",
+)
+
+# Row chunks from iter_rows, closed by consumers that stop early
+Chunks = AsyncGenerator[List[Tuple], None]
+
+_db_ready = False
+# Renders waiting to be written: (type, identifier, metric, timestamp, referrer host)
+_pending: Deque[Tuple[str, str, str, str, Optional[str]]] = deque()
+_writer: Optional[asyncio.Task] = None
+_referrer: ContextVar[Optional[str]] = ContextVar("analytics_referrer", default=None)
+dropped = 0
+
+# With Redis, analytics are kept there for the whole cluster instead of per process in SQLite
+if settings.REDIS_URL:
+    from .analytics_redis import RedisAnalytics
+
+    _redis: Optional["RedisAnalytics"] = RedisAnalytics(settings.REDIS_URL)
+else:
+    _redis = None
+
+def connect():
+    # aiosqlite is imported on first use to keep it off the cold start path
+    import aiosqlite
+
+    return aiosqlite.connect(DB_PATH)
+
+def set_referrer(header: Optional[str]):
+    """Referer of the current request; only its host is kept"""
+    _referrer.set(urlsplit(header).hostname if header else None)
 
 async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
+    global _db_ready
+    if _db_ready:
+        return
+    if _redis is not None:
+        _db_ready = True
+        return
+    async with connect() as db:
         await db.execute('''
             CREATE TABLE IF NOT EXISTS badge_renders (
                 id INTEGER PRIMARY KEY,
@@ -15,18 +70,60 @@ async def init_db():
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        for statement in INDEXES:
+            await db.execute(statement)
+        # Lets long exports read while the flusher keeps writing
+        await db.execute("PRAGMA journal_mode=WAL")
         await db.commit()
+    _db_ready = True
 
+@timed("analytics")
 async def track_badge_render(badge_type: str, identifier: str, metric: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT INTO badge_renders (type, identifier, metric) VALUES (?, ?, ?)",
-            (badge_type, identifier, metric)
-        )
+    """Queue a render; a background task writes queued renders in batches"""
+    global dropped, _writer
+    if len(_pending) >= settings.ANALYTICS_QUEUE_SIZE:
+        dropped += 1
+        return
+    _pending.append((badge_type, identifier, metric, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()), _referrer.get()))
+    if _writer is None or _writer.done():
+        _writer = asyncio.get_running_loop().create_task(_write_loop())
+
+async def _write_loop():
+    while True:
+        await asyncio.sleep(settings.ANALYTICS_FLUSH_INTERVAL)
+        if admission.defer_analytics(len(_pending)):
+            continue
+        try:
+            await flush()
+        except Exception as e:
+            print(f"Analytics flush failed: {e}")
+
+async def flush():
+    """Write every queued render"""
+    if not _pending:
+        return
+    if _redis is not None:
+        # One pipelined round trip for everything queued
+        batch = [_pending.popleft() for _ in range(len(_pending))]
+        await _redis.write(batch)
+        return
+    if not _db_ready:
+        await init_db()
+    async with connect() as db:
+        while _pending:
+            batch = [_pending.popleft() for _ in range(min(len(_pending), FLUSH_BATCH))]
+            await db.executemany(
+                "INSERT INTO badge_renders (type, identifier, metric, timestamp) VALUES (?, ?, ?, ?)",
+                [render[:4] for render in batch]
+            )
         await db.commit()
 
 async def get_analytics() -> Dict:
-    async with aiosqlite.connect(DB_PATH) as db:
+    if _redis is not None:
+        return await _redis.summary()
+    if not _db_ready:
+        await init_db()
+    async with connect() as db:
         cursor = await db.execute("SELECT COUNT(*) FROM badge_renders")
         total_renders = await cursor.fetchone()
 
@@ -36,4 +133,111 @@ async def get_analytics() -> Dict:
         return {
             "total_renders": total_renders[0] if total_renders else 0,
             "popular_metrics": [{"metric": row[0], "count": row[1]} for row in popular]
-        }
\ No newline at end of file
+        }
+
+def render_filter(start: Optional[str] = None, end: Optional[str] = None, badge_type: Optional[str] = None,
+                  identifier: Optional[str] = None, metric: Optional[str] = None) -> Tuple[str, List[str]]:
+    """WHERE clause over [start, end); dates or ISO timestamps in UTC"""
+    clauses, params = [], []
+    if start:
+        clauses.append("timestamp >= ?")
+        params.append(start.replace("T", " ").rstrip("Z"))
+    if end:
+        clauses.append("timestamp < ?")
+        params.append(end.replace("T", " ").rstrip("Z"))
+    for column, value in (("type", badge_type), ("identifier", identifier), ("metric", metric)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def rollup_query(bucket: str, group_by: Optional[str], where: str) -> Tuple[str, List[str]]:
+    """Render counts per bucket (and per ``group_by`` column), oldest bucket first"""
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    if group_by is not None and group_by not in GROUP_COLUMNS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_COLUMNS)}")
+    columns = ["strftime(?, timestamp) AS bucket"] + ([group_by] if group_by else [])
+    groups = "bucket" + (f", {group_by}" if group_by else "")
+    sql = f"SELECT {', '.join(columns)}, COUNT(*) FROM badge_renders{where} GROUP BY {groups} ORDER BY {groups}"
+    return sql, [BUCKETS[bucket]]
+
+def require_sqlite():
+    if _redis is not None:
+        raise ValueError("range queries need the SQLite analytics backend (REDIS_URL unset)")
+
+async def iter_rows(sql: str, params: List[Any], chunk: int) -> Chunks:
+    """Rows of a query, ``chunk`` at a time from an open cursor"""
+    # Renders still queued belong in the answer
+    await flush()
+    if not _db_ready:
+        await init_db()
+    async with connect() as db:
+        cursor = await db.execute(sql, params)
+        while True:
+            rows = await cursor.fetchmany(chunk)
+            if not rows:
+                break
+            yield rows
+
+def iter_renders(filters: Dict[str, Optional[str]], chunk: int) -> Chunks:
+    require_sqlite()
+    where, params = render_filter(**filters)
+    sql = f"SELECT timestamp, type, identifier, metric FROM badge_renders{where} ORDER BY timestamp"
+    return iter_rows(sql, params, chunk)
+
+def iter_rollups(filters: Dict[str, Optional[str]], bucket: str, group_by: Optional[str], chunk: int) -> Chunks:
+    require_sqlite()
+    where, params = render_filter(**filters)
+    sql, head = rollup_query(bucket, group_by, where)
+    return iter_rows(sql, head + params, chunk)
+
+async def query_rollups(filters: Dict[str, Optional[str]], bucket: str, group_by: Optional[str] = None,
+                        limit: int = 1000) -> List[Dict[str, Any]]:
+    """Up to ``limit`` rollup rows as dicts"""
+    fields = ["bucket"] + ([group_by] if group_by else []) + ["count"]
+    rows: List[Dict[str, Any]] = []
+    chunks = iter_rollups(filters, bucket, group_by, min(limit, settings.ANALYTICS_EXPORT_CHUNK))
+    try:
+        async for chunk in chunks:
+            rows.extend(dict(zip(fields, row)) for row in chunk[:limit - len(rows)])
+            if len(rows) >= limit:
+                break
+    finally:
+        await chunks.aclose()
+    return rows
+
+def export(filters: Dict[str, Optional[str]], format: str, rollup: Optional[str] = None,
+           group_by: Optional[str] = None) -> AsyncIterator[str]:
+    """Renders, or rollups per ``rollup`` bucket, encoded one cursor chunk at a time"""
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    chunk = settings.ANALYTICS_EXPORT_CHUNK
+    if rollup is None:
+        return _encode(RENDER_FIELDS, iter_renders(filters, chunk), format)
+    fields = ["bucket"] + ([group_by] if group_by else []) + ["count"]
+    return _encode(fields, iter_rollups(filters, rollup, group_by, chunk), format)
+
+async def _encode(fields: List[str], chunks: Chunks, format: str) -> AsyncIterator[str]:
+    try:
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            async for rows in chunks:
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            async for rows in chunks:
+                yield "".join(json.dumps(dict(zip(fields, row))) + "\n" for row in rows)
+    finally:
+        await chunks.aclose()
+
+CallbackFamily("badge_analytics_queue_depth", "Renders waiting to be written", "gauge", (),
+               lambda: {(): len(_pending)})
+CallbackFamily("badge_analytics_dropped_total", "Renders dropped because the queue was full", "counter", (),
+               lambda: {(): dropped})
@@ -0,0 +1,139 @@
+"""Cluster-wide render analytics in Redis, in fixed memory.
+
+Used instead of the SQLite table when REDIS_URL is set, so every replica
+reports into the same numbers. Renders are queued by the analytics module
+as before. Each flush aggregates the queued renders in process and writes
+them in one pipelined round trip:
+
+- plain counters for renders, in total and per UTC day
+- one HyperLogLog per day for unique repos and one for unique referrer
+  hosts, 12 KB each whatever the traffic (about 0.8% standard error). Unique
+  counts over several days are read as the union of their days
+- a count-min sketch (ANALYTICS_SKETCH_DEPTH rows of ANALYTICS_SKETCH_WIDTH
+  32-bit counters) plus a sorted set of the ANALYTICS_TOP_K most counted
+  candidates, one pair for badges and one for metrics. A badge that falls
+  out of the sorted set keeps its count in the sketch and re-enters with it
+
+Daily keys expire after ANALYTICS_RETENTION_DAYS.
+"""
+import hashlib
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from .config import settings
+
+PREFIX = "analytics"
+# Identifiers of these render types are owner/repo
+REPO_TYPES = frozenset({"github", "sparkline", "delta"})
+UNIQUE_WINDOWS = (1, 7, 30)
+
+# Add counts to the sketch and move each item's estimate into the candidate set.
+# ARGV: depth, keep, then per item: name, count and its counter in each row
+TOP_K_SCRIPT = """
+local depth, keep = tonumber(ARGV[1]), tonumber(ARGV[2])
+local i = 3
+while i <= #ARGV do
+    local ops = {'OVERFLOW', 'SAT'}
+    for row = 1, depth do
+        table.insert(ops, 'INCRBY')
+        table.insert(ops, 'u32')
+        table.insert(ops, '#' .. ARGV[i + 1 + row])
+        table.insert(ops, ARGV[i + 1])
+    end
+    local counts = redis.call('BITFIELD', KEYS[1], unpack(ops))
+    redis.call('ZADD', KEYS[2], math.min(unpack(counts)), ARGV[i])
+    i = i + 2 + depth
+end
+local size = redis.call('ZCARD', KEYS[2])
+if size > keep then
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, size - keep - 1)
+end
+return size
+"""
+
+
+def day_of(timestamp: str) -> str:
+    """Bucket of a queued render's "%Y-%m-%d %H:%M:%S" timestamp"""
+    return timestamp[:10]
+
+
+def sketch_counters(item: str, depth: int, width: int) -> List[int]:
+    """Index of ``item``'s counter in each row of a depth x width sketch"""
+    digest = hashlib.blake2b(item.encode(), digest_size=4 * depth).digest()
+    return [row * width + int.from_bytes(digest[4 * row:4 * row + 4], "little") % width for row in range(depth)]
+
+
+def past_days(count: int, now: Optional[float] = None) -> List[str]:
+    now = time.time() if now is None else now
+    return [time.strftime("%Y-%m-%d", time.gmtime(now - i * 86400)) for i in range(count)]
+
+
+class RedisAnalytics:
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.retention = settings.ANALYTICS_RETENTION_DAYS * 86400
+        self.sketch = (settings.ANALYTICS_SKETCH_DEPTH, settings.ANALYTICS_SKETCH_WIDTH, settings.ANALYTICS_TOP_K)
+
+    def _top_k(self, pipe, name: str, counts: Counter):
+        depth, width, keep = self.sketch
+        args: List[Any] = [depth, keep]
+        for item, count in counts.items():
+            args += (item, count, *sketch_counters(item, depth, width))
+        pipe.eval(TOP_K_SCRIPT, 2, f"{PREFIX}:sketch:{name}", f"{PREFIX}:top:{name}", *args)
+
+    async def write(self, renders: Iterable[Tuple[str, str, str, str, Optional[str]]]):
+        """Record (type, identifier, metric, timestamp, referrer host) renders in one round trip"""
+        per_day: Counter = Counter()
+        repos: Dict[str, Set[str]] = defaultdict(set)
+        referrers: Dict[str, Set[str]] = defaultdict(set)
+        badges: Counter = Counter()
+        metrics: Counter = Counter()
+        for badge_type, identifier, metric, timestamp, referrer in renders:
+            day = day_of(timestamp)
+            per_day[day] += 1
+            if badge_type in REPO_TYPES:
+                repos[day].add(identifier.lower())
+            if referrer:
+                referrers[day].add(referrer)
+            badges[f"{badge_type}:{identifier}:{metric}"] += 1
+            metrics[metric] += 1
+        if not per_day:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.incrby(f"{PREFIX}:renders", sum(per_day.values()))
+        for day, count in per_day.items():
+            pipe.incrby(f"{PREFIX}:renders:{day}", count)
+            pipe.expire(f"{PREFIX}:renders:{day}", self.retention)
+        for kind, members in (("repos", repos), ("referrers", referrers)):
+            for day, values in members.items():
+                pipe.pfadd(f"{PREFIX}:{kind}:{day}", *values)
+                pipe.expire(f"{PREFIX}:{kind}:{day}", self.retention)
+        self._top_k(pipe, "badges", badges)
+        self._top_k(pipe, "metrics", metrics)
+        await pipe.execute()
+
+    async def summary(self, top: int = 10) -> Dict[str, Any]:
+        days = past_days(max(UNIQUE_WINDOWS))
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.get(f"{PREFIX}:renders")
+        pipe.mget([f"{PREFIX}:renders:{day}" for day in days])
+        for kind in ("repos", "referrers"):
+            for window in UNIQUE_WINDOWS:
+                pipe.pfcount(*(f"{PREFIX}:{kind}:{day}" for day in days[:window]))
+        pipe.zrevrange(f"{PREFIX}:top:metrics", 0, top - 1, withscores=True)
+        pipe.zrevrange(f"{PREFIX}:top:badges", 0, top - 1, withscores=True)
+        total, per_day, *rest = await pipe.execute()
+        uniques, (metrics, badges) = rest[:-2], rest[-2:]
+        windows = len(UNIQUE_WINDOWS)
+        return {
+            "backend": "redis",
+            "total_renders": int(total or 0),
+            "renders_by_day": {day: int(count or 0) for day, count in zip(days, per_day)},
+            "unique_repos": {f"{w}d": n for w, n in zip(UNIQUE_WINDOWS, uniques[:windows])},
+            "unique_referrers": {f"{w}d": n for w, n in zip(UNIQUE_WINDOWS, uniques[windows:])},
+            "popular_metrics": [{"metric": m.decode(), "count": int(c)} for m, c in metrics],
+            "popular_badges": [{"badge": b.decode(), "count": int(c)} for b, c in badges],
+        }
@@ -134,5 +134,9 @@ def generate_badge(label: str, value: str, style: str = "flat", color: Optional[
     else:
         text = f'<text x="50%" y="50%" dominant-baseline="middle" text-anchor="middle" fill="{text_color}" font-family="Arial, sans-serif" font-size="{font_size}">{icon_svg}{sanitize_string(label)}: {sanitize_string(value)}</text>'
 
-    svg = theme["template"].format(width=width, height=height, bg_color=bg_color, text=text)
+    # Templates without a text_template (transparent) inline the text fields themselves
+    svg = theme["template"].format(
+        width=width, height=height, bg_color=bg_color, text=text, text_color=text_color,
+        font_size=font_size, icon=icon_svg, label=sanitize_string(label), value=sanitize_string(value)
+    )
     return svg
\ No newline at end of file
@@ -1,7 +1,8 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Sequence
 import re
 from ..utils import sanitize_string
 from ..themes import get_theme
+from ..timing import timed
 
 def calculate_width(label: str, value: str, icon: str = "", font_size: int = 11) -> int:
     icon_width = 16 if icon else 0
@@ -18,6 +19,7 @@ def get_icon_svg(icon_name: str) -> str:
         return f'<g transform="translate(5,2) scale(0.8)">{icons[icon_name]}</g> '
     return ""
 
+@timed("render")
 def generate_badge(label: str, value: str, style: str = "flat", color: Optional[str] = None, icon: str = "", animated: bool = False) -> str:
     theme = get_theme(style)
     bg_color = color or theme.get("bg_color", "#555")
@@ -64,4 +66,76 @@ def compose_badges(badges: List[Dict[str, Any]], layout: str = "horizontal") ->
         composed += '</svg>'
         return composed
     # Add vertical and matrix layouts as needed
-    return ""
\ No newline at end of file
+    return ""
+
+def generate_sparkline(label: str, values: Sequence[float], style: str = "flat", color: Optional[str] = None,
+                       chart_width: int = 100) -> str:
+    """Label plus a line chart of ``values``, drawn in the theme's colors"""
+    import numpy as np
+
+    theme = get_theme(style)
+    height = theme.get("height", 20)
+    text_color = theme.get("text_color", "#fff")
+    label = sanitize_string(label)
+    label_width = len(label) * 7 + 10
+    width = label_width + chart_width + 5
+
+    text = (f'<text x="5" y="50%" dominant-baseline="middle" fill="{text_color}" '
+            f'font-family="DejaVu Sans,Verdana,Geneva,sans-serif" font-size="11">{label}</text>')
+    points = np.asarray(values, dtype=np.float64)
+    if len(points) == 0:
+        text += (f'<text x="{label_width}" y="50%" dominant-baseline="middle" fill="{text_color}" '
+                 f'font-family="DejaVu Sans,Verdana,Geneva,sans-serif" font-size="11">no data</text>')
+    else:
+        if len(points) == 1:
+            points = np.repeat(points, 2)
+        low, span = points.min(), np.ptp(points)
+        ys = height - 3 - ((points - low) / span if span else np.full(len(points), 0.5)) * (height - 6)
+        xs = label_width + np.linspace(0, chart_width, len(points))
+        coords = " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs, ys))
+        text += f'<polyline points="{coords}" fill="none" stroke="{color or text_color}" stroke-width="1.5"/>'
+
+    template = theme.get("template", '''<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">
+<rect width="100%" height="100%" fill="{bg_color}"/>
+{text}
+</svg>''')
+    return template.format(width=width, height=height, bg_color=theme.get("bg_color", "#555"), text=text, animation="")
+
+def generate_delta_badge(label: str, delta: Optional[float], period: str, style: str = "flat", icon: str = "") -> str:
+    """``+N period`` badge: green when up, red when down, grey when flat or unknown"""
+    if delta is None:
+        return generate_badge(label, "no data", style=style, color="#9f9f9f", icon=icon)
+    color = "#4c1" if delta > 0 else "#e05d44" if delta < 0 else "#9f9f9f"
+    return generate_badge(label, f"{delta:+,.0f} {period}", style=style, color=color, icon=icon)
+
+def generate_heatmap(label: str, matrix, style: str = "flat", color: Optional[str] = None, cell: int = 4, gap: int = 1) -> str:
+    """Label plus a weekday x week grid; cell shade follows the commit count"""
+    import numpy as np
+    from ..heatmap import levels
+
+    theme = get_theme(style)
+    text_color = theme.get("text_color", "#fff")
+    fill = color or text_color
+    label = sanitize_string(label)
+    label_width = len(label) * 7 + 10
+    rows, weeks = matrix.shape
+    height = max(theme.get("height", 20), rows * (cell + gap) + 3)
+    width = label_width + max(weeks, 1) * (cell + gap) + 5
+
+    text = (f'<text x="5" y="50%" dominant-baseline="middle" fill="{text_color}" '
+            f'font-family="DejaVu Sans,Verdana,Geneva,sans-serif" font-size="11">{label}</text>')
+    shade = levels(matrix)
+    days, columns = np.indices(matrix.shape)
+    xs = label_width + columns.ravel() * (cell + gap)
+    ys = 2 + days.ravel() * (cell + gap)
+    opacity = (0.15, 0.4, 0.6, 0.8, 1.0)
+    text += "".join(
+        f'<rect x="{x}" y="{y}" width="{cell}" height="{cell}" fill="{fill}" fill-opacity="{opacity[level]}"/>'
+        for x, y, level in zip(xs.tolist(), ys.tolist(), shade.ravel().tolist())
+    )
+
+    template = theme.get("template", '''<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">
+<rect width="100%" height="100%" fill="{bg_color}"/>
+{text}
+</svg>''')
+    return template.format(width=width, height=height, bg_color=theme.get("bg_color", "#555"), text=text, animation="")
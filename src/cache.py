@@ -1,31 +1,99 @@
-import redis.asyncio as redis
-from typing import Optional
+import time
+from typing import Dict, Optional, Tuple
 from .config import settings
+from .metrics import CallbackFamily
+from .timing import timed
 
-_cache = {}
+# key -> (expires at, value); dict order is insertion order, oldest first
+_cache: Dict[str, Tuple[float, str]] = {}
 
 class Cache:
     def __init__(self):
         self.redis = None
+        self.shared = None
+        self.tier = "memory"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
         if settings.REDIS_URL:
+            import redis.asyncio as redis
+
             self.redis = redis.from_url(settings.REDIS_URL)
+            self.tier = "redis"
+        elif settings.CACHE_BACKEND == "shared":
+            from .shared_cache import SharedMemoryCache
+
+            self.shared = SharedMemoryCache(
+                settings.SHARED_CACHE_PATH, settings.SHARED_CACHE_SLOTS, settings.SHARED_CACHE_SLOT_SIZE
+            )
+            self.tier = "shared"
 
     async def get(self, key: str) -> Optional[str]:
         if self.redis:
-            return await self.redis.get(key)
-        return _cache.get(key)
+            value = await self.redis.get(key)
+        elif self.shared:
+            # Values too big for a slot live in process memory
+            value = self.shared.get(key)
+            if value is None and _cache:
+                value = self._memory_get(key)
+        else:
+            value = self._memory_get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
 
     async def set(self, key: str, value: str, ttl: int = 300):
         if self.redis:
             await self.redis.setex(key, ttl, value)
-        else:
-            _cache[key] = value
-            # Simple ttl, but not implemented for in-memory
+        elif not (self.shared and self.shared.set(key, value, ttl)):
+            self._memory_set(key, value, ttl)
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _cache[key]
+            self.expirations += 1
+            return None
+        return entry[1]
+
+    def _memory_set(self, key: str, value: str, ttl: int):
+        _cache.pop(key, None)
+        if len(_cache) >= settings.CACHE_MAX_ENTRIES:
+            # Evict the oldest insert; cheaper than tracking recency on every get
+            del _cache[next(iter(_cache))]
+            self.evictions += 1
+        _cache[key] = (time.monotonic() + ttl, value)
 
 cache = Cache()
 
+@timed("cache_get")
 async def cache_get(key: str) -> Optional[str]:
     return await cache.get(key)
 
+@timed("cache_set")
 async def cache_set(key: str, value: str, ttl: int = 300):
-    await cache.set(key, value, ttl)
\ No newline at end of file
+    await cache.set(key, value, ttl)
+
+CallbackFamily("badge_cache_hits_total", "Cache lookups that found a value", "counter", ("tier",),
+               lambda: {(cache.tier,): cache.hits})
+CallbackFamily("badge_cache_misses_total", "Cache lookups that found nothing", "counter", ("tier",),
+               lambda: {(cache.tier,): cache.misses})
+def _shared_stat(name: str) -> int:
+    return getattr(cache.shared, name) if cache.shared else 0
+
+def _entries():
+    entries = {("memory",): len(_cache)}
+    if cache.shared:
+        entries[("shared",)] = cache.shared.count()
+    return entries
+
+CallbackFamily("badge_cache_evictions_total", "Entries dropped to stay under CACHE_MAX_ENTRIES or a full probe window", "counter",
+               ("tier",), lambda: {(cache.tier,): cache.evictions + _shared_stat("evictions")})
+CallbackFamily("badge_cache_expirations_total", "Entries dropped because their TTL passed", "counter", ("tier",),
+               lambda: {(cache.tier,): cache.expirations + _shared_stat("expirations")})
+CallbackFamily("badge_cache_entries", "Entries held in process memory or the shared table", "gauge", ("tier",), _entries)
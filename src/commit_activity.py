@@ -0,0 +1,126 @@
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+# Rolling windows (in days) kept up to date as commits arrive
+WINDOWS = (7, 30, 90)
+
+
+def today() -> int:
+    return datetime.now(timezone.utc).date().toordinal()
+
+
+def day_of(timestamp: str) -> int:
+    """Ordinal day of a GitHub ISO-8601 timestamp (YYYY-MM-DDTHH:MM:SSZ)"""
+    return date.fromisoformat(timestamp[:10]).toordinal()
+
+
+def since_timestamp(days: int) -> str:
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    return start.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class CommitActivity:
+    """Daily commit counts for one repository.
+
+    Counts live in a fixed-size ring buffer indexed by ordinal day. The totals
+    for every window in WINDOWS are adjusted as days enter and leave the
+    buffer, so reading a window is O(1). The cursor (newest committer
+    timestamp seen plus the SHAs at that timestamp) lets refreshes ask GitHub
+    for new commits only.
+    """
+
+    def __init__(self, capacity: int = max(WINDOWS)):
+        if capacity < max(WINDOWS):
+            raise ValueError(f"capacity must be at least {max(WINDOWS)} days")
+        self.capacity = capacity
+        self.counts = array("I", [0]) * capacity
+        self.head_day: Optional[int] = None
+        self.totals: Dict[int, int] = dict.fromkeys(WINDOWS, 0)
+        self.cursor: Optional[str] = None
+        self.cursor_shas: List[str] = []
+        self.refreshed_at = 0.0
+
+    def advance(self, day: int) -> int:
+        """Move the newest bucket forward to ``day``, expiring old days; returns the newest day"""
+        if self.head_day is None:
+            self.head_day = day
+            return day
+        if day <= self.head_day:
+            return self.head_day
+        if day - self.head_day >= self.capacity:
+            self.counts = array("I", [0]) * self.capacity
+            self.totals = dict.fromkeys(WINDOWS, 0)
+            self.head_day = day
+            return day
+        while self.head_day < day:
+            self.head_day += 1
+            for w in WINDOWS:
+                self.totals[w] -= self.counts[(self.head_day - w) % self.capacity]
+            self.counts[self.head_day % self.capacity] = 0
+        return day
+
+    def add(self, day: int, count: int = 1):
+        age = self.advance(day) - day
+        if age >= self.capacity:
+            return
+        self.counts[day % self.capacity] += count
+        for w in WINDOWS:
+            if age < w:
+                self.totals[w] += count
+
+    def window(self, days: int, now: Optional[int] = None) -> int:
+        """Commits in the last ``days`` days (one of WINDOWS)"""
+        self.advance(today() if now is None else now)
+        return self.totals[days]
+
+    def ingest(self, commits: Iterable[Dict[str, Any]]) -> int:
+        """Count commits newer than the cursor and move the cursor forward.
+
+        GitHub lists commits newest first, so every page of one refresh must
+        be passed in a single call: after the first page the cursor is already
+        past the commits on the later ones.
+        """
+        cursor, cursor_shas = self.cursor, set(self.cursor_shas)
+        newest, newest_shas = self.cursor, list(self.cursor_shas)
+        added = 0
+        for commit in commits:
+            sha = commit["sha"]
+            timestamp = commit["commit"]["committer"]["date"]
+            if cursor and (timestamp < cursor or sha in cursor_shas):
+                continue
+            self.add(day_of(timestamp))
+            added += 1
+            if newest is None or timestamp > newest:
+                newest, newest_shas = timestamp, [sha]
+            elif timestamp == newest and sha not in newest_shas:
+                newest_shas.append(sha)
+        self.cursor, self.cursor_shas = newest, newest_shas
+        return added
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "head_day": self.head_day,
+            "counts": self.counts.tolist(),
+            "cursor": self.cursor,
+            "cursor_shas": self.cursor_shas,
+            "refreshed_at": self.refreshed_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CommitActivity":
+        counts = data.get("counts") or []
+        activity = cls(capacity=max(len(counts), max(WINDOWS)))
+        activity.head_day = data.get("head_day")
+        activity.cursor = data.get("cursor")
+        activity.cursor_shas = list(data.get("cursor_shas") or [])
+        activity.refreshed_at = data.get("refreshed_at", 0.0)
+        if activity.head_day is not None:
+            for i, count in enumerate(counts):
+                activity.counts[i] = count
+            for age in range(activity.capacity):
+                count = activity.counts[(activity.head_day - age) % activity.capacity]
+                for w in WINDOWS:
+                    if age < w:
+                        activity.totals[w] += count
+        return activity
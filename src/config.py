@@ -1,3 +1,4 @@
+import os
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -5,7 +6,74 @@ class Settings(BaseSettings):
     GITHUB_TOKEN: Optional[str] = None
     REDIS_URL: Optional[str] = None
     CACHE_TTL: int = 300  # 5 minutes
+    CACHE_MAX_ENTRIES: int = 10000  # in-memory cache, oldest insert evicted first
+    CACHE_BACKEND: str = "memory"  # memory, or shared (mmap table shared by all workers); REDIS_URL wins
+    SHARED_CACHE_PATH: str = "/dev/shm/github-badge-cache" if os.path.isdir("/dev/shm") else "github-badge-cache"
+    SHARED_CACHE_SLOTS: int = 8192
+    SHARED_CACHE_SLOT_SIZE: int = 4096  # bytes; larger values stay in process memory
+    COMMIT_ACTIVITY_TTL: int = 604800  # 7 days, persisted commit cursors
+    COMMIT_ACTIVITY_MAX_PAGES: int = 10  # 100 commits per page
     RATE_LIMIT: str = "100/minute"
+    RATE_LIMIT_CUSTOM: Optional[str] = None  # /badge/custom, plugin badges
+    RATE_LIMIT_GITHUB: Optional[str] = None  # upstream-backed badges
+    RATE_LIMIT_COMPOSE: Optional[str] = None  # /v2/compose
+    RATE_LIMIT_LEASE_SIZE: int = 10  # tokens leased from Redis per round trip
+    PLUGIN_CACHE_TTL: int = 30  # default per-plugin result cache
+    PLUGIN_TIMEOUT: float = 2.0  # default max latency per plugin call
+    PLUGIN_WORKERS: int = 4  # thread pool for sync plugins
+    PLUGIN_RELOAD_INTERVAL: float = 2.0  # seconds between mtime polls, 0 disables
+    UPSTREAM_MAX_CONNECTIONS: int = 100  # pooled connections to GitHub/PyPI
+    ANALYTICS_QUEUE_SIZE: int = 10000  # renders buffered before new ones are dropped
+    ANALYTICS_FLUSH_INTERVAL: float = 1.0  # seconds between batched analytics writes
+    ANALYTICS_EXPORT_CHUNK: int = 1000  # rows read from the cursor per chunk of an export
+    ANALYTICS_RETENTION_DAYS: int = 30  # daily Redis counters and unique-count sketches (REDIS_URL only)
+    ANALYTICS_SKETCH_WIDTH: int = 8192  # count-min sketch counters per row
+    ANALYTICS_SKETCH_DEPTH: int = 4  # rows; overestimates are rarer with more
+    ANALYTICS_TOP_K: int = 100  # most rendered badges and metrics kept by name
+    SLOW_REQUEST_MS: float = 500.0  # requests slower than this go to the slow log
+    SLOW_REQUEST_LOG_SIZE: int = 100  # slow requests kept for the dashboard
+    WATCHDOG_MS: float = 0.0  # report callbacks holding the event loop this long, 0 disables
+    WATCHDOG_MAX_SITES: int = 50  # blocking call sites kept for the dashboard
+    WATCHDOG_RECENT: int = 50  # individual stalls kept for the dashboard
+    ADMIN_API_KEY: Optional[str] = None  # enables /admin endpoints, sent as X-Admin-Key
+    PROFILE_MAX_SECONDS: float = 30.0  # longest allowed /admin/profile run
+    NEGATIVE_TTL_NOT_FOUND: int = 600  # missing repos
+    NEGATIVE_TTL_UNKNOWN_METRIC: int = 3600
+    NEGATIVE_TTL_UPSTREAM_ERROR: int = 30  # 5xx, timeouts, rate limited
+    NEGATIVE_FILTER_CAPACITY: int = 100000  # subjects per Bloom filter generation
+    NEGATIVE_FILTER_ERROR_RATE: float = 0.01
+    UPSTREAM_CONNECT_TIMEOUT: float = 3.0
+    UPSTREAM_READ_TIMEOUT: float = 5.0
+    UPSTREAM_BREAKER_FAILURES: int = 5  # consecutive failures that open the circuit
+    UPSTREAM_BREAKER_RESET: float = 30.0  # seconds open before a probe call
+    UPSTREAM_STALE_TTL: int = 86400  # last known values served while a circuit is open
+    UPSTREAM_HEDGE: bool = False  # send a second GET once the first passes the p95
+    UPSTREAM_HEDGE_MIN_DELAY: float = 0.05
+    UPSTREAM_HEDGE_MAX_RATIO: float = 0.1  # at most this share of calls are hedged
+    SNAPSHOT_PATH: str = "snapshots.db"  # metric snapshots kept across restarts, empty disables
+    SNAPSHOT_MAX_ENTRIES: int = 50000
+    SNAPSHOT_MAX_AGE: int = 604800  # rows older than this are dropped at startup
+    SNAPSHOT_FLUSH_INTERVAL: float = 5.0
+    ADMISSION_LAG_MS: float = 200.0  # event loop lag that starts load shedding, 0 disables
+    ADMISSION_MAX_UPSTREAM: int = 256  # upstream calls in flight that start load shedding, 0 disables
+    ADMISSION_PROBE_INTERVAL: float = 0.1
+    ADMISSION_RETRY_AFTER: int = 5  # Retry-After seconds on shed JSON requests
+    ADAPTIVE_TTL: bool = True  # learn TTLs per value; False uses CACHE_TTL everywhere
+    ADAPTIVE_TTL_STALENESS: float = 0.05  # accepted chance a value changed before its TTL ran out
+    ADAPTIVE_TTL_HALF_LIFE: float = 604800.0  # 7 days of weight on old observations
+    WORKERS: int = 0  # badge-server processes, 0 for one per core
+    GRACEFUL_TIMEOUT: float = 30.0  # seconds a stopping worker gets to finish in-flight requests
+    PRIMARY_WORKER: bool = True  # set by badge-server; only the primary runs cluster-wide scheduled jobs
+    GITHUB_OWNER_TTL: int = 3600  # org/user aggregates are served this long before a background refresh
+    GITHUB_OWNER_STATE_TTL: int = 604800  # 7 days, persisted per-page ETags and repo counts
+    GITHUB_OWNER_CONCURRENCY: int = 4  # aggregate page fetches in flight, shared by all owners
+    GITHUB_OWNER_MAX_PAGES: int = 500  # 100 repos per page
+    PYPI_BULK_MAX: int = 50  # packages per /v2/pypi/{metric} request
+    TIMESERIES_MAX_SERIES: int = 10000  # ~14 KB each, least recently updated dropped first
+    TIMESERIES_SAMPLE_INTERVAL: float = 3600.0  # seconds between scheduler resamples, 0 disables
+    TIMESERIES_SAMPLE_LIMIT: int = 200  # series resampled per run, stalest first
+    TIMESERIES_FLUSH_INTERVAL: float = 5.0  # seconds samples wait before they are written to the shared series
+    STARTUP_BUDGET: bool = False  # defer heavy imports and subsystems past cold start
     HOST: str = "0.0.0.0"
     PORT: int = 8000
 
@@ -1,15 +1,32 @@
+from functools import cache
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="src/dashboard/templates")
+
+@cache
+def get_templates():
+    # Jinja2 is only loaded once a dashboard page is requested
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory="src/dashboard/templates")
 
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return get_templates().TemplateResponse(request, "dashboard.html")
 
 @router.get("/dashboard/analytics")
 async def dashboard_analytics():
     from ..analytics import get_analytics
-    return await get_analytics()
\ No newline at end of file
+    return await get_analytics()
+
+@router.get("/dashboard/slow")
+async def dashboard_slow_requests():
+    from ..config import settings
+    from ..timing import slow_request_log
+    return {"threshold_ms": settings.SLOW_REQUEST_MS, "requests": slow_request_log()}
+
+@router.get("/dashboard/blocking")
+async def dashboard_blocking_calls():
+    from ..watchdog import watchdog_report
+    return watchdog_report()
@@ -0,0 +1,73 @@
+"""Weekday x week commit matrices for heatmap badges.
+
+A matrix has 7 rows (Sunday first, like GitHub's contribution graph) and
+one column per week, oldest first. GitHub's stats/commit_activity endpoint
+already reports commits per weekday for the last 52 weeks. While GitHub is
+still computing those stats (202), the daily counts kept by CommitActivity
+are binned instead, which covers the last 13 weeks.
+
+The ``heatmap`` metric value is the matrix encoded as text, so snapshots
+and the stale fallback carry it like any other metric. Decoded matrices are
+kept per repo, so rendering the same value in another style neither
+refetches nor re-bins.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from .commit_activity import CommitActivity
+
+MAX_MATRICES = 4096
+
+_matrices: 'OrderedDict[str, Tuple[str, np.ndarray]]' = OrderedDict()
+
+
+def from_commit_activity_stats(weeks: List[Dict[str, Any]]) -> np.ndarray:
+    """Matrix from /stats/commit_activity, where each week lists its 7 daily counts"""
+    if not weeks:
+        return np.zeros((7, 0), dtype=np.int64)
+    return np.array([week["days"] for week in weeks], dtype=np.int64).T
+
+
+def from_daily_counts(activity: CommitActivity) -> np.ndarray:
+    """Matrix from a CommitActivity ring buffer, padded to whole weeks"""
+    if activity.head_day is None:
+        return np.zeros((7, 0), dtype=np.int64)
+    days = activity.head_day - np.arange(activity.capacity - 1, -1, -1)
+    counts = np.asarray(activity.counts, dtype=np.int64)[days % activity.capacity]
+    # Day ordinals are Monday-based (ordinal 1 is a Monday), so ordinal % 7 is 0 on Sundays
+    before, after = int(days[0] % 7), 6 - int(days[-1] % 7)
+    return np.pad(counts, (before, after)).reshape(-1, 7).T
+
+
+def encode(matrix: np.ndarray) -> str:
+    return " ".join(map(str, matrix.ravel().tolist()))
+
+
+def decode(value: str) -> np.ndarray:
+    return np.array(value.split(), dtype=np.int64).reshape(7, -1)
+
+
+def remember(repo: str, value: str, matrix: np.ndarray):
+    _matrices[repo] = (value, matrix)
+    _matrices.move_to_end(repo)
+    if len(_matrices) > MAX_MATRICES:
+        _matrices.popitem(last=False)
+
+
+def matrix_for(repo: str, value: str) -> np.ndarray:
+    """The matrix behind a heatmap value, decoded at most once per value"""
+    cached = _matrices.get(repo)
+    if cached is not None and cached[0] == value:
+        _matrices.move_to_end(repo)
+        return cached[1]
+    matrix = decode(value)
+    remember(repo, value, matrix)
+    return matrix
+
+
+def levels(matrix: np.ndarray) -> np.ndarray:
+    """Intensity 0-4 per cell: 0 for no commits, then quartiles of the busiest day"""
+    peak = matrix.max() if matrix.size else 0
+    if not peak:
+        return np.zeros(matrix.shape, dtype=np.int64)
+    return np.ceil(matrix * 4 / peak).astype(np.int64)
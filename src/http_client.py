@@ -0,0 +1,59 @@
+import time
+import httpx
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from .config import settings
+from .metrics import UpstreamInstruments, status_class
+
+# One pooled client per process so upstream connections are reused
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            transport=_transport,
+            limits=httpx.Limits(max_connections=settings.UPSTREAM_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(settings.UPSTREAM_READ_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT),
+        )
+    return _client
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]):
+    """Route upstream calls through ``transport`` (tests and the load harness)"""
+    global _client, _transport
+    _transport = transport
+    _client = None
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def instrumented_get(instruments: UpstreamInstruments, url: str, **kwargs) -> httpx.Response:
+    """GET through the shared client, recording latency and status class"""
+    start = time.perf_counter()
+    try:
+        response = await get_client().get(url, **kwargs)
+    except httpx.HTTPError:
+        instruments.record("error", time.perf_counter() - start)
+        raise
+    instruments.record(status_class(response.status_code), time.perf_counter() - start)
+    return response
+
+
+@asynccontextmanager
+async def instrumented_stream(instruments: UpstreamInstruments, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+    """Streaming GET; latency is recorded when the headers arrive, the body is left to the caller"""
+    start = time.perf_counter()
+    recorded = False
+    try:
+        async with get_client().stream("GET", url, **kwargs) as response:
+            instruments.record(status_class(response.status_code), time.perf_counter() - start)
+            recorded = True
+            yield response
+    except httpx.HTTPError:
+        if not recorded:
+            instruments.record("error", time.perf_counter() - start)
+        raise
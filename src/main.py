@@ -1,13 +1,8 @@
+import os
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
-import time
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 import asyncio
 from typing import Optional, List
 import hashlib
@@ -15,13 +10,18 @@ import json
 
 from .config import settings
 from .badges import generate_badge
-from .providers.github import get_github_metric
 from .cache import cache_get, cache_set
-from .rate_limit import limiter
-from .analytics import track_badge_render, init_db
+from .rate_limit import limiter, limit
+from .analytics import track_badge_render, init_db, set_referrer
 from .plugins import load_plugins, get_plugin_metric
-from .themes import get_theme
-from .dashboard import router as dashboard_router
+from .dashboard import router as dashboard_router, get_templates
+from .startup import PHASES, phase
+from .negative_cache import OVERLOADED, UPSTREAM_ERROR, MetricUnavailable, negative_ttl
+from .admission import admission, placeholder
+from .metrics import WEBSOCKET_SUBSCRIBERS, bind_routes, route_latency
+from .timing import record_if_slow, start_request
+
+STATIC_DIR = "src/dashboard/static"
 
 app = FastAPI(
     title="GitHub Badge API 3.0",
@@ -31,43 +31,104 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
+if limiter is not None:
+    from slowapi import _rate_limit_exceeded_handler
+    from slowapi.errors import RateLimitExceeded
+    from slowapi.middleware import SlowAPIMiddleware
+
+    app.state.limiter = limiter
+    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+    app.add_middleware(SlowAPIMiddleware)
 
 # Mount static files for dashboard
-app.mount("/static", StaticFiles(directory="src/dashboard/static"), name="static")
-templates = Jinja2Templates(directory="src/dashboard/templates")
+if os.path.isdir(STATIC_DIR):
+    from fastapi.staticfiles import StaticFiles
+
+    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 # Include dashboard router
 app.include_router(dashboard_router)
 
+# Subsystems deferred until the first request in startup budget mode
+_deferred_started = not settings.STARTUP_BUDGET
+
+def start_background_tasks():
+    global _deferred_started
+    _deferred_started = True
+    with phase("scheduler"):
+        from .scheduler import start_scheduler
+        start_scheduler(primary=settings.PRIMARY_WORKER)
+
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
+    global _deferred_started
+    timer = start_request()
+    admission.start()
+    set_referrer(request.headers.get("referer"))
     response = await call_next(request)
-    process_time = time.time() - start_time
+    if not _deferred_started:
+        # Set now: requests finishing before the callback runs must not queue it again
+        _deferred_started = True
+        # Run after this response goes out rather than ahead of it
+        asyncio.get_running_loop().call_soon(start_background_tasks)
+    process_time = time.perf_counter() - timer.start
+    route_latency(request.scope.get("endpoint")).observe(process_time)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    record_if_slow(timer, request.method, request.url.path, route, response.status_code, process_time)
     response.headers["X-Badge-Generated-In"] = f"{process_time:.3f}s"
+    response.headers["Server-Timing"] = timer.server_timing(process_time)
     # ETag for caching (only for Response, not StreamingResponse)
     if hasattr(response, 'body'):
         content = response.body
         etag = hashlib.md5(content).hexdigest()
         response.headers["ETag"] = etag
-        response.headers["Cache-Control"] = "public, max-age=300"
+        response.headers.setdefault("Cache-Control", "public, max-age=300")
     return response
 
 @app.on_event("startup")
 async def startup_event():
-    await init_db()
-    load_plugins()
-    # Start background tasks
-    from .scheduler import start_scheduler
-    start_scheduler()
+    if settings.WATCHDOG_MS > 0:
+        from .watchdog import watchdog
+        watchdog.start(app.routes)
+    with phase("plugins"):
+        load_plugins()
+    with phase("snapshots"):
+        # Warm metric values from the last run before taking traffic
+        from .snapshots import snapshots
+        await snapshots.load()
+    if settings.STARTUP_BUDGET:
+        # The DB table is created on first write, the scheduler after the first request
+        return
+    with phase("init_db"):
+        # A no-op in badge-server workers: the parent did it before forking
+        await init_db()
+    start_background_tasks()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from .analytics import flush
+    from .http_client import close_client
+    from .snapshots import snapshots
+    from .timeseries import flush as flush_timeseries
+    await admission.stop()
+    if settings.WATCHDOG_MS > 0:
+        from .watchdog import watchdog
+        watchdog.stop()
+    await flush()
+    await snapshots.flush()
+    await flush_timeseries()
+    await close_client()
 
 # WebSocket for live badges
 @app.websocket("/ws/live/{provider}/{owner}/{repo}")
 async def websocket_live_badge(websocket: WebSocket, provider: str, owner: str, repo: str):
+    from .providers.github import get_github_metric
+    if not admission.admit_websocket():
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
     await websocket.accept()
+    WEBSOCKET_SUBSCRIBERS.inc()
     try:
         while True:
             # Send live stats every 30 seconds
@@ -79,18 +140,57 @@ async def websocket_live_badge(websocket: WebSocket, provider: str, owner: str,
             await asyncio.sleep(30)
     except WebSocketDisconnect:
         pass
+    finally:
+        WEBSOCKET_SUBSCRIBERS.dec()
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request, "version": "3.0.0"})
+    return get_templates().TemplateResponse(request, "dashboard.html", {"version": "3.0.0"})
 
 @app.get("/health")
 async def health():
     return {"status": "healthy", "version": "2.0.0"}
 
+@app.get("/metrics")
+async def metrics():
+    from .metrics import render
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/upstreams")
+async def upstream_health():
+    from .providers import github, pypi  # noqa: F401, registers their breakers
+    from .resilience import upstream_status
+    return upstream_status()
+
+@app.get("/health/ttl/github/{owner}/{repo}/{metric}")
+async def github_ttl(owner: str, repo: str, metric: str):
+    """Learned TTL and change rate behind a GitHub badge"""
+    from .adaptive_ttl import bounds, metric_class
+    from .snapshots import snapshots
+    snapshot = snapshots.get(f"github:{owner}/{repo}".lower() + f"/{metric}")
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No value fetched yet")
+    return {"class": metric_class(metric), "bounds": bounds(metric), **snapshot.describe()}
+
+@app.get("/health/startup")
+async def startup_report():
+    return {"budget_mode": settings.STARTUP_BUDGET, "phases_ms": PHASES}
+
+async def unavailable_response(e: MetricUnavailable, label: str, style: str, cache_key: str, format: str = "svg") -> Response:
+    """Badge or JSON error for a failed lookup; shed lookups get an uncached placeholder"""
+    if format == "json":
+        headers = {"Retry-After": str(settings.ADMISSION_RETRY_AFTER)} if e.category == OVERLOADED else None
+        status = 503 if e.category in (UPSTREAM_ERROR, OVERLOADED) else 404
+        return JSONResponse({"error": e.category}, status_code=status, headers=headers)
+    if e.category == OVERLOADED:
+        return Response(content=placeholder(label, style), media_type="image/svg+xml", headers={"Cache-Control": "no-cache"})
+    error_svg = generate_badge("error", e.label, style=style, color="red")
+    await cache_set(cache_key, error_svg, ttl=negative_ttl(e.category))
+    return Response(content=error_svg, media_type="image/svg+xml")
+
 # V1 endpoints (backward compatibility)
 @app.get("/badge/github/{owner}/{repo}/{metric}")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("github")
 async def github_badge_v1(request: Request, owner: str, repo: str, metric: str, style: str = "flat", color: Optional[str] = None, icon: str = ""):
     await track_badge_render("github", f"{owner}/{repo}", metric)
     cache_key = f"github:{owner}:{repo}:{metric}:{style}:{color}:{icon}"
@@ -99,16 +199,24 @@ async def github_badge_v1(request: Request, owner: str, repo: str, metric: str,
         return Response(content=cached, media_type="image/svg+xml")
 
     try:
+        from .providers.github import get_github_metric, value_ttl
         value = await get_github_metric(owner, repo, metric)
-        svg = generate_badge(metric, value, style=style, color=color, icon=icon)
-        await cache_set(cache_key, svg, ttl=settings.CACHE_TTL)
+        if metric == "heatmap":
+            from .badges import generate_heatmap
+            from .heatmap import matrix_for
+            svg = generate_heatmap("commits", matrix_for(f"{owner}/{repo}".lower(), value), style=style, color=color)
+        else:
+            svg = generate_badge(metric, value, style=style, color=color, icon=icon)
+        await cache_set(cache_key, svg, ttl=value_ttl(owner, repo, metric))
         return Response(content=svg, media_type="image/svg+xml")
+    except MetricUnavailable as e:
+        return await unavailable_response(e, metric, style, cache_key)
     except Exception as e:
         error_svg = generate_badge("error", "unknown", style=style, color="red")
         return Response(content=error_svg, media_type="image/svg+xml")
 
 @app.get("/badge/custom")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("custom")
 async def custom_badge_v1(request: Request, label: str, value: str, style: str = "flat", color: Optional[str] = None, icon: str = ""):
     await track_badge_render("custom", label, value)
     cache_key = f"custom:{label}:{value}:{color}:{style}:{icon}"
@@ -122,7 +230,7 @@ async def custom_badge_v1(request: Request, label: str, value: str, style: str =
 
 # V2 endpoints
 @app.get("/v2/badge/github/{owner}/{repo}/{metric}")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("github")
 async def github_badge_v2(request: Request, owner: str, repo: str, metric: str, style: str = "flat", color: Optional[str] = None, icon: str = "", animated: bool = False, format: str = "svg"):
     await track_badge_render("github", f"{owner}/{repo}", metric)
     cache_key = f"v2:github:{owner}:{repo}:{metric}:{style}:{color}:{icon}:{animated}"
@@ -131,20 +239,75 @@ async def github_badge_v2(request: Request, owner: str, repo: str, metric: str,
         return Response(content=cached, media_type="image/svg+xml")
 
     try:
+        from .providers.github import get_github_metric, value_ttl
         value = await get_github_metric(owner, repo, metric)
+        if metric == "heatmap":
+            from .badges import generate_heatmap
+            from .heatmap import matrix_for
+            matrix = matrix_for(f"{owner}/{repo}".lower(), value)
+            if format == "json":
+                return JSONResponse({"label": metric, "value": matrix.tolist(), "style": style, "color": color})
+            svg = generate_heatmap("commits", matrix, style=style, color=color)
+            await cache_set(cache_key, svg, ttl=value_ttl(owner, repo, metric))
+            return Response(content=svg, media_type="image/svg+xml")
         if format == "json":
             return JSONResponse({"label": metric, "value": value, "style": style, "color": color, "icon": icon, "animated": animated})
         svg = generate_badge(metric, value, style=style, color=color, icon=icon, animated=animated)
-        await cache_set(cache_key, svg, ttl=settings.CACHE_TTL)
+        await cache_set(cache_key, svg, ttl=value_ttl(owner, repo, metric))
         return Response(content=svg, media_type="image/svg+xml")
+    except MetricUnavailable as e:
+        return await unavailable_response(e, metric, style, cache_key, format)
     except Exception as e:
         if format == "json":
             return JSONResponse({"error": "unknown"}, status_code=404)
         error_svg = generate_badge("error", "unknown", style=style, color="red")
         return Response(content=error_svg, media_type="image/svg+xml")
 
+@app.get("/v2/badge/github/{owner}/{repo}/{metric}/sparkline")
+@limit("custom")
+async def github_sparkline(request: Request, owner: str, repo: str, metric: str, days: int = 90, style: str = "flat", color: Optional[str] = None):
+    # Drawn from recorded history only; never calls GitHub
+    from .badges import generate_sparkline
+    from .timeseries import sparkline
+    await track_badge_render("sparkline", f"{owner}/{repo}", metric)
+    values = await sparkline(f"{owner}/{repo}".lower(), metric, min(max(days, 1), 400))
+    svg = generate_sparkline(f"{metric} {days}d", values, style=style, color=color)
+    return Response(content=svg, media_type="image/svg+xml")
+
+@app.get("/v2/badge/github/{owner}/{repo}/{metric}/delta")
+@limit("custom")
+async def github_delta(request: Request, owner: str, repo: str, metric: str, days: int = 7, style: str = "flat", icon: str = ""):
+    from .badges import generate_delta_badge
+    from .timeseries import delta as series_delta
+    await track_badge_render("delta", f"{owner}/{repo}", metric)
+    delta = await series_delta(f"{owner}/{repo}".lower(), metric, min(max(days, 1), 400))
+    period = "this week" if days == 7 else f"in {days}d"
+    svg = generate_delta_badge(metric, delta, period, style=style, icon=icon)
+    return Response(content=svg, media_type="image/svg+xml")
+
+@app.get("/v2/badge/github/{owner}/{metric}")
+@limit("github")
+async def github_owner_badge(request: Request, owner: str, metric: str, style: str = "flat", color: Optional[str] = None, icon: str = "", animated: bool = False, format: str = "svg"):
+    # Totals over every public repo of an org or user
+    await track_badge_render("github_owner", owner, metric)
+    cache_key = f"v2:github_owner:{owner}:{metric}:{style}:{color}:{icon}:{animated}"
+    cached = await cache_get(cache_key)
+    if cached and format == "svg":
+        return Response(content=cached, media_type="image/svg+xml")
+
+    from .providers.github_owner import get_owner_metric, value_ttl
+    try:
+        value = await get_owner_metric(owner, metric)
+    except MetricUnavailable as e:
+        return await unavailable_response(e, metric, style, cache_key, format)
+    if format == "json":
+        return JSONResponse({"label": metric, "value": value, "style": style, "color": color, "icon": icon, "animated": animated})
+    svg = generate_badge(metric, value, style=style, color=color, icon=icon, animated=animated)
+    await cache_set(cache_key, svg, ttl=value_ttl(owner))
+    return Response(content=svg, media_type="image/svg+xml")
+
 @app.get("/v2/badge/custom")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("custom")
 async def custom_badge_v2(request: Request, label: str, value: str, style: str = "flat", color: Optional[str] = None, icon: str = "", animated: bool = False, format: str = "svg"):
     await track_badge_render("custom", label, value)
     cache_key = f"v2:custom:{label}:{value}:{color}:{style}:{icon}:{animated}"
@@ -159,7 +322,7 @@ async def custom_badge_v2(request: Request, label: str, value: str, style: str =
     return Response(content=svg, media_type="image/svg+xml")
 
 @app.get("/v2/badge/plugin/{plugin}/{metric}")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("custom")
 async def plugin_badge(request: Request, plugin: str, metric: str, style: str = "flat", color: Optional[str] = None, icon: str = "", animated: bool = False, format: str = "svg"):
     await track_badge_render("plugin", plugin, metric)
     try:
@@ -174,8 +337,35 @@ async def plugin_badge(request: Request, plugin: str, metric: str, style: str =
         error_svg = generate_badge("error", "unknown", style=style, color="red")
         return Response(content=error_svg, media_type="image/svg+xml")
 
+@app.get("/v2/badge/pypi/{package}/{metric}")
+@limit("custom")
+async def pypi_badge(request: Request, package: str, metric: str, style: str = "flat", color: Optional[str] = None, icon: str = "", animated: bool = False, format: str = "svg"):
+    await track_badge_render("pypi", package, metric)
+    cache_key = f"v2:pypi:{package}:{metric}:{style}:{color}:{icon}:{animated}"
+    cached = await cache_get(cache_key)
+    if cached and format == "svg":
+        return Response(content=cached, media_type="image/svg+xml")
+
+    from .providers.pypi import get_pypi_metric, value_ttl
+    try:
+        value = await get_pypi_metric(package, metric)
+    except MetricUnavailable as e:
+        return await unavailable_response(e, metric, style, cache_key, format)
+    if format == "json":
+        return JSONResponse({"label": metric, "value": value, "style": style, "color": color, "icon": icon, "animated": animated})
+    svg = generate_badge(metric, value, style=style, color=color, icon=icon, animated=animated)
+    await cache_set(cache_key, svg, ttl=value_ttl(package, metric))
+    return Response(content=svg, media_type="image/svg+xml")
+
+@app.get("/v2/pypi/{metric}")
+@limit("custom")
+async def pypi_bulk(request: Request, metric: str, packages: str):
+    from .providers.pypi import get_pypi_metrics
+    names = [name.strip() for name in packages.split(",") if name.strip()][:settings.PYPI_BULK_MAX]
+    return JSONResponse(await get_pypi_metrics(names, metric))
+
 @app.get("/v2/compose")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("compose")
 async def compose_badges_endpoint(request: Request, badges: str, layout: str = "horizontal", style: str = "flat"):
     badge_list = badges.split(',')
     composed_badges = []
@@ -192,6 +382,53 @@ async def compose_badges_endpoint(request: Request, badges: str, layout: str = "
     final_svg = compose_func(composed_badges, layout)
     return Response(content=final_svg, media_type="image/svg+xml")
 
+# Admin endpoints, disabled unless ADMIN_API_KEY is set
+def require_admin(request: Request):
+    import hmac
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    key = request.headers.get("X-Admin-Key", "")
+    if not hmac.compare_digest(key.encode(), settings.ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+@app.get("/api/analytics/export")
+async def analytics_export(request: Request, format: str = "ndjson", start: Optional[str] = None, end: Optional[str] = None,
+                           type: Optional[str] = None, identifier: Optional[str] = None, metric: Optional[str] = None,
+                           rollup: Optional[str] = None, group_by: Optional[str] = None):
+    """Stream renders (or rollups per ``rollup`` bucket) as NDJSON or CSV"""
+    from fastapi.responses import StreamingResponse
+    from .analytics import EXPORT_FORMATS, export
+    require_admin(request)
+    filters = {"start": start, "end": end, "badge_type": type, "identifier": identifier, "metric": metric}
+    try:
+        body = export(filters, format, rollup, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    filename = f"badge_renders{'_' + rollup if rollup else ''}.{format}"
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/admin/profile")
+async def profile(request: Request, seconds: float = 10.0, interval_ms: float = 10.0, format: str = "json", top: int = 25):
+    import threading
+    from .profiler import ProfilerBusy, SamplingProfiler
+    require_admin(request)
+    if not 0 < seconds <= settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {settings.PROFILE_MAX_SECONDS}]")
+    # Sample the thread running the event loop, i.e. this one
+    profiler = SamplingProfiler(threading.get_ident(), interval_ms / 1000)
+    try:
+        profiler.start()
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running") from None
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return profiler.report(top)
+
 # Theme endpoints
 @app.get("/themes/list")
 async def list_themes():
@@ -207,8 +444,8 @@ async def install_theme(url: str):
 # Plugin endpoints
 @app.get("/plugins/list")
 async def list_plugins():
-    from .plugin_loader import list_plugins
-    return {"plugins": list_plugins()}
+    from .plugins import list_plugins, plugin_stats, registry_stats
+    return {"plugins": list_plugins(), "stats": plugin_stats(), "registry": registry_stats()}
 
 # Webhook endpoint
 @app.post("/webhook/github")
@@ -221,15 +458,29 @@ async def github_webhook(request: Request):
 # Dashboard
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return get_templates().TemplateResponse(request, "dashboard.html")
 
 @app.get("/api/analytics")
 async def get_analytics():
     from .analytics import get_analytics as get_analytics_data
     return await get_analytics_data()
 
+@app.get("/api/analytics/query")
+async def analytics_query(request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                          type: Optional[str] = None, identifier: Optional[str] = None, metric: Optional[str] = None,
+                          bucket: str = "day", group_by: Optional[str] = None, limit: int = 1000):
+    """Render counts per time bucket over [start, end), optionally per repo, metric or type"""
+    from .analytics import query_rollups
+    require_admin(request)
+    filters = {"start": start, "end": end, "badge_type": type, "identifier": identifier, "metric": metric}
+    try:
+        rows = await query_rollups(filters, bucket, group_by, min(max(limit, 1), 10000))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return {"bucket": bucket, "group_by": group_by, "rows": rows}
+
 @app.get("/badge/custom")
-@limiter.limit(settings.RATE_LIMIT)
+@limit("custom")
 async def custom_badge(request: Request, label: str, value: str, color: str = "blue", style: str = "flat"):
     cache_key = f"custom:{label}:{value}:{color}:{style}"
     cached = await cache_get(cache_key)
@@ -238,4 +489,6 @@ async def custom_badge(request: Request, label: str, value: str, color: str = "b
 
     svg = generate_badge(label, value, style=style, color=color)
     await cache_set(cache_key, svg, ttl=settings.CACHE_TTL)
-    return Response(content=svg, media_type="image/svg+xml")
\ No newline at end of file
+    return Response(content=svg, media_type="image/svg+xml")
+
+bind_routes(app.routes)
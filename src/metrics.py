@@ -0,0 +1,178 @@
+"""Prometheus text-format metrics.
+
+Label sets are bound once, either at import or when a route or plugin is
+first registered. The hot path then only increments a preallocated child;
+it never builds a label dict per request. Values that already live elsewhere
+(cache counters, queue depth) are read by callbacks at scrape time.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        return [f"{name}{labels} {_num(self.value)}"]
+
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        prefix = labels[:-1] + "," if labels else "{"
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{prefix}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{labels} {_num(self.sum)}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+class Family:
+    """A named metric with fixed label names; one child per label set"""
+
+    def __init__(self, name: str, help: str, kind: str, label_names: Tuple[str, ...] = (),
+                 factory: Callable = Counter):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label_names = label_names
+        self.factory = factory
+        self.children: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.factory()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.children.items():
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, values))
+            lines.extend(child.samples(self.name, f"{{{labels}}}" if labels else ""))
+        return lines
+
+
+class CallbackFamily(Family):
+    """Values read at scrape time from ``callback() -> {label values: value}``"""
+
+    def __init__(self, name: str, help: str, kind: str, label_names: Tuple[str, ...],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, help, kind, label_names)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        self.children = {}
+        for values, value in self.callback().items():
+            self.labels(*values).value = value
+        return super().render()
+
+
+REGISTRY: List[Family] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for family in REGISTRY:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_LATENCY = Family(
+    "badge_request_duration_seconds", "Request latency per route", "histogram", ("route",), Histogram)
+UPSTREAM_REQUESTS = Family(
+    "badge_upstream_requests_total", "Upstream calls per provider, endpoint and status class",
+    "counter", ("provider", "endpoint", "status"))
+UPSTREAM_LATENCY = Family(
+    "badge_upstream_duration_seconds", "Upstream call latency", "histogram", ("provider", "endpoint"), Histogram)
+GITHUB_RATE_LIMIT_REMAINING = Family(
+    "badge_github_rate_limit_remaining", "X-RateLimit-Remaining from the latest GitHub response",
+    "gauge", factory=Gauge).labels()
+WEBSOCKET_SUBSCRIBERS = Family(
+    "badge_websocket_subscribers", "Open live badge WebSocket connections", "gauge", factory=Gauge).labels()
+PLUGIN_LATENCY = Family(
+    "badge_plugin_duration_seconds", "Plugin call latency (cache misses only)", "histogram", ("plugin",), Histogram)
+PLUGIN_ERRORS = Family(
+    "badge_plugin_errors_total", "Plugin calls that raised or timed out", "counter", ("plugin",))
+
+UNMATCHED_ROUTE = REQUEST_LATENCY.labels("unmatched")
+_route_latency: Dict[Callable, Histogram] = {}
+
+
+def bind_routes(routes: List) -> None:
+    """Preallocate one latency histogram per route, keyed by endpoint"""
+    for route in routes:
+        endpoint = getattr(route, "endpoint", None)
+        if endpoint is not None:
+            _route_latency[endpoint] = REQUEST_LATENCY.labels(route.path)
+
+
+def route_latency(endpoint: Optional[Callable]) -> Histogram:
+    return _route_latency.get(endpoint, UNMATCHED_ROUTE)
+
+
+def status_class(status: int) -> str:
+    return ("1xx", "2xx", "3xx", "4xx", "5xx")[min(status // 100, 5) - 1] if status >= 100 else "error"
+
+
+class UpstreamInstruments:
+    """Preallocated children for one (provider, endpoint)"""
+
+    __slots__ = ("latency", "by_status")
+
+    def __init__(self, provider: str, endpoint: str):
+        self.latency = UPSTREAM_LATENCY.labels(provider, endpoint)
+        self.by_status = {
+            status: UPSTREAM_REQUESTS.labels(provider, endpoint, status)
+            for status in ("2xx", "3xx", "4xx", "5xx", "error")
+        }
+
+    def record(self, status: str, seconds: float):
+        self.latency.observe(seconds)
+        self.by_status.get(status, self.by_status["error"]).inc()
+
+
+def upstream_instruments(provider: str, endpoints: Tuple[str, ...]) -> Dict[str, UpstreamInstruments]:
+    return {endpoint: UpstreamInstruments(provider, endpoint) for endpoint in endpoints}
@@ -0,0 +1,105 @@
+"""Negative caching for metrics that failed.
+
+Failures are cached by category, each with its own TTL, so repeated
+requests for a missing repo or a failing upstream skip the upstream call.
+Each subject with a recent failure is also added to an in-process Bloom
+filter. The filter answers "definitely no recent failure" without a cache
+round trip, which covers nearly all traffic. Only a filter hit is confirmed
+against the cache. A false positive therefore costs one extra lookup and
+never a wrong badge.
+"""
+from typing import Dict, Optional
+from .bloom import BloomFilter
+from .cache import cache_get, cache_set
+from .config import settings
+from .metrics import Family
+
+NOT_FOUND = "not_found"
+UNKNOWN_METRIC = "unknown_metric"
+UPSTREAM_ERROR = "upstream_error"
+# Shed by admission control before reaching the upstream; never negative cached
+OVERLOADED = "overloaded"
+
+# Value shown on the error badge for each category
+ERROR_LABELS = {NOT_FOUND: "not found", UNKNOWN_METRIC: "unknown metric", UPSTREAM_ERROR: "unavailable", OVERLOADED: "busy"}
+
+NEGATIVE_HITS = Family(
+    "badge_negative_cache_hits_total", "Requests answered from the negative cache", "counter", ("provider", "category"))
+
+
+def negative_ttl(category: str) -> int:
+    return {
+        NOT_FOUND: settings.NEGATIVE_TTL_NOT_FOUND,
+        UNKNOWN_METRIC: settings.NEGATIVE_TTL_UNKNOWN_METRIC,
+    }.get(category, settings.NEGATIVE_TTL_UPSTREAM_ERROR)
+
+
+def classify(exc: Exception) -> str:
+    if isinstance(exc, MetricUnavailable):
+        return exc.category
+    # httpx.HTTPStatusError, matched structurally to keep httpx off the import path
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 404:
+        return NOT_FOUND
+    return UPSTREAM_ERROR
+
+
+class MetricUnavailable(Exception):
+    def __init__(self, category: str, subject: str):
+        super().__init__(f"{subject}: {category}")
+        self.category = category
+        self.subject = subject
+
+    @property
+    def label(self) -> str:
+        return ERROR_LABELS[self.category]
+
+
+class MissingFilter:
+    """Two generations of Bloom filters; the older one is dropped when the newer fills.
+
+    Bloom filters can't delete, so rotation is what lets subjects that
+    recovered (a repo that was created, an upstream that came back) stop
+    costing a confirmation lookup.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous: Optional[BloomFilter] = None
+
+    def add(self, item: str):
+        if self.current.full:
+            self.previous, self.current = self.current, BloomFilter(self.capacity, self.error_rate)
+        self.current.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.current or (self.previous is not None and item in self.previous)
+
+
+class NegativeCache:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.filter = MissingFilter(settings.NEGATIVE_FILTER_CAPACITY, settings.NEGATIVE_FILTER_ERROR_RATE)
+        self._hits: Dict[str, object] = {c: NEGATIVE_HITS.labels(provider, c) for c in ERROR_LABELS}
+
+    def _key(self, subject: str) -> str:
+        return f"negative:{self.provider}:{subject}"
+
+    async def check(self, subject: str):
+        """Raise MetricUnavailable if subject failed recently"""
+        if subject not in self.filter:
+            return
+        category = await cache_get(self._key(subject))
+        if category is None:
+            return
+        if isinstance(category, bytes):
+            category = category.decode()
+        self._hits.get(category, self._hits[UPSTREAM_ERROR]).inc()
+        raise MetricUnavailable(category, subject)
+
+    async def record(self, subject: str, category: str) -> MetricUnavailable:
+        self.filter.add(subject)
+        await cache_set(self._key(subject), category, ttl=negative_ttl(category))
+        return MetricUnavailable(category, subject)
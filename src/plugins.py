@@ -1,24 +1,291 @@
+import asyncio
 import importlib
+import importlib.util
 import os
-from typing import Dict, Any, Callable
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from .config import settings
+from .metrics import PLUGIN_ERRORS, PLUGIN_LATENCY
+from .timing import timed
 
-PLUGINS: Dict[str, Callable] = {}
+PLUGIN_DIR = "plugins"
 
-def load_plugins():
-    plugin_dir = "plugins"
-    if not os.path.exists(plugin_dir):
-        return
-    for file in os.listdir(plugin_dir):
-        if file.endswith(".py") and not file.startswith("__"):
-            module_name = file[:-3]
+
+def plugin_meta(module: Any) -> Dict[str, Any]:
+    """Runtime metadata a plugin declares through a module-level PLUGIN_META dict.
+
+    Keys: ``cache_ttl`` (seconds), ``sync`` (run in the thread pool; detected
+    from ``get_metric`` when omitted) and ``max_latency`` (timeout in seconds).
+    """
+    declared = getattr(module, "PLUGIN_META", {})
+    return {
+        "cache_ttl": declared.get("cache_ttl", settings.PLUGIN_CACHE_TTL),
+        "sync": declared.get("sync", not asyncio.iscoroutinefunction(module.get_metric)),
+        "max_latency": declared.get("max_latency", settings.PLUGIN_TIMEOUT),
+    }
+
+
+class PluginEntry:
+    """One plugin file. Entries are never mutated after they are published;
+    loading or reloading builds a new entry and replaces the old one."""
+
+    __slots__ = ("name", "path", "mtime", "get_metric", "meta", "load_ms", "error")
+
+    def __init__(self, name: str, path: str, mtime: float, get_metric: Optional[Callable] = None,
+                 meta: Optional[Dict[str, Any]] = None, load_ms: float = 0.0, error: Optional[str] = None):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.get_metric = get_metric
+        self.meta = meta
+        self.load_ms = load_ms
+        self.error = error
+
+    @property
+    def loaded(self) -> bool:
+        return self.get_metric is not None
+
+
+class PluginRegistry:
+    """Indexes plugin files without importing them and imports on first use.
+
+    ``check_for_changes`` polls file mtimes and rebuilds changed plugins that
+    are already loaded. The new module is fully executed before its entry
+    replaces the old one in a single dict assignment, so a request sees either
+    the old plugin or the new one, never a half-loaded module. Calls already
+    in flight keep running the function they started with.
+    """
+
+    def __init__(self, plugin_dir: str = PLUGIN_DIR):
+        self.plugin_dir = plugin_dir
+        self.entries: Dict[str, PluginEntry] = {}
+        self.index_ms = 0.0
+        self.reloads = 0
+        self.last_reload_ms = 0.0
+
+    def _scan(self) -> Dict[str, Tuple[str, float]]:
+        found: Dict[str, Tuple[str, float]] = {}
+        if not os.path.isdir(self.plugin_dir):
+            return found
+        with os.scandir(self.plugin_dir) as it:
+            for item in it:
+                if item.name.endswith(".py") and not item.name.startswith("__"):
+                    found[item.name[:-3]] = (item.path, item.stat().st_mtime)
+        return found
+
+    def index(self):
+        start = time.perf_counter()
+        # Plugins imported before a fork (see server.preload) stay loaded if unchanged
+        previous = self.entries
+        self.entries = {
+            name: previous[name] if name in previous and previous[name].mtime == mtime else PluginEntry(name, path, mtime)
+            for name, (path, mtime) in self._scan().items()
+        }
+        self.index_ms = (time.perf_counter() - start) * 1000
+
+    def _build(self, entry: PluginEntry, mtime: float) -> PluginEntry:
+        start = time.perf_counter()
+        module_name = f"{PLUGIN_DIR}.{entry.name}"
+        spec = importlib.util.spec_from_file_location(module_name, entry.path)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"Plugin {entry.name} cannot be loaded from {entry.path}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if not hasattr(module, "get_metric"):
+            raise ImportError(f"Plugin {entry.name} has no get_metric")
+        sys.modules[module_name] = module
+        return PluginEntry(entry.name, entry.path, mtime, module.get_metric, plugin_meta(module),
+                           load_ms=(time.perf_counter() - start) * 1000)
+
+    def get(self, name: str) -> PluginEntry:
+        entry = self.entries.get(name)
+        if entry is None:
+            raise ValueError(f"Plugin {name} not found")
+        if not entry.loaded:
             try:
-                module = importlib.import_module(f"plugins.{module_name}")
-                if hasattr(module, "get_metric"):
-                    PLUGINS[module_name] = module.get_metric
-            except ImportError:
-                pass
+                entry = self._build(entry, entry.mtime)
+            except Exception as e:
+                self.entries[name] = PluginEntry(name, entry.path, entry.mtime, error=repr(e))
+                raise ValueError(f"Plugin {name} failed to load: {e}") from e
+            self.entries[name] = entry
+        return entry
+
+    def check_for_changes(self) -> List[str]:
+        """Pick up new, removed and modified plugin files; returns reloaded names"""
+        reloaded = []
+        found = self._scan()
+        for name in list(self.entries):
+            if name not in found:
+                del self.entries[name]
+                runtime.invalidate(name)
+        for name, (path, mtime) in found.items():
+            entry = self.entries.get(name)
+            if entry is None:
+                self.entries[name] = PluginEntry(name, path, mtime)
+            elif mtime != entry.mtime:
+                if not entry.loaded:
+                    # Never imported, so the next use loads the new file anyway
+                    self.entries[name] = PluginEntry(name, path, mtime)
+                    continue
+                start = time.perf_counter()
+                try:
+                    new_entry = self._build(entry, mtime)
+                except Exception as e:
+                    # Keep serving the old module until the file is fixed
+                    self.entries[name] = PluginEntry(name, path, mtime, entry.get_metric, entry.meta,
+                                                     entry.load_ms, error=repr(e))
+                    continue
+                self.entries[name] = new_entry
+                runtime.invalidate(name)
+                self.reloads += 1
+                self.last_reload_ms = (time.perf_counter() - start) * 1000
+                reloaded.append(name)
+        return reloaded
+
+
+class PluginStats:
+    def __init__(self, plugin: str):
+        self.latency = PLUGIN_LATENCY.labels(plugin)
+        self.failures = PLUGIN_ERRORS.labels(plugin)
+        self.calls = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        executed = self.calls - self.cache_hits
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_latency_ms": round(self.total_latency / executed * 1000, 3) if executed else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 3),
+        }
+
+
+class PluginRuntime:
+    """Runs plugin calls with per-plugin TTL caching and timeouts.
+
+    Sync plugins are offloaded to a bounded thread pool so they never block
+    the event loop. A timed-out sync call keeps its worker thread until it
+    returns, which is why the pool is bounded.
+    """
 
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plugin")
+        self.stats: Dict[str, PluginStats] = {}
+        self._cache: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    async def call(self, plugin: str, func: Callable, meta: Dict[str, Any], metric: str) -> str:
+        stats = self.stats.get(plugin)
+        if stats is None:
+            stats = self.stats[plugin] = PluginStats(plugin)
+        stats.calls += 1
+        key = (plugin, metric)
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            stats.cache_hits += 1
+            return cached[1]
+
+        # Concurrent misses for the same metric share one plugin call
+        pending = self._inflight.get(key)
+        if pending is not None:
+            stats.cache_hits += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.ensure_future(self._execute(stats, func, meta, metric))
+        self._inflight[key] = future
+        try:
+            value = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+        if meta["cache_ttl"] > 0:
+            self._cache[key] = (time.monotonic() + meta["cache_ttl"], value)
+        return value
+
+    async def _execute(self, stats: PluginStats, func: Callable, meta: Dict[str, Any], metric: str) -> str:
+        start = time.perf_counter()
+        try:
+            if meta["sync"]:
+                call = asyncio.get_running_loop().run_in_executor(self.executor, func, metric)
+            else:
+                call = func(metric)
+            return str(await asyncio.wait_for(call, timeout=meta["max_latency"]))
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            stats.failures.inc()
+            raise
+        except Exception:
+            stats.errors += 1
+            stats.failures.inc()
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            stats.latency.observe(latency)
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+
+    def invalidate(self, plugin: str):
+        for key in [k for k in self._cache if k[0] == plugin]:
+            del self._cache[key]
+
+
+runtime = PluginRuntime(max_workers=settings.PLUGIN_WORKERS)
+registry = PluginRegistry()
+
+
+def load_plugins():
+    """Index plugin files; modules are imported on first use"""
+    registry.index()
+
+
+def preload_plugins():
+    """Import every indexed plugin now instead of on first use"""
+    for name in list(registry.entries):
+        try:
+            registry.get(name)
+        except ValueError as e:
+            print(f"Plugin preload failed: {e}")
+
+
+async def reload_plugins():
+    registry.check_for_changes()
+
+
+@timed("provider")
 async def get_plugin_metric(plugin: str, metric: str) -> str:
-    if plugin in PLUGINS:
-        return await PLUGINS[plugin](metric)
-    raise ValueError(f"Plugin {plugin} not found")
\ No newline at end of file
+    entry = registry.get(plugin)
+    if entry.get_metric is None or entry.meta is None:
+        raise ValueError(f"Plugin {plugin} is not loaded")
+    return await runtime.call(plugin, entry.get_metric, entry.meta, metric)
+
+
+def list_plugins() -> List[str]:
+    return list(registry.entries.keys())
+
+
+def plugin_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {}
+    for name, entry in registry.entries.items():
+        stats[name] = {
+            "loaded": entry.loaded,
+            "load_ms": round(entry.load_ms, 3),
+            "error": entry.error,
+            **(entry.meta or {}),
+            **runtime.stats.get(name, PluginStats(name)).as_dict(),
+        }
+    return stats
+
+
+def registry_stats() -> Dict[str, Any]:
+    return {
+        "index_ms": round(registry.index_ms, 3),
+        "reloads": registry.reloads,
+        "last_reload_ms": round(registry.last_reload_ms, 3),
+    }
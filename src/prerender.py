@@ -0,0 +1,207 @@
+"""Render badges to static files for a CDN or static host.
+
+    python -m src.prerender badges.yaml --out dist/
+    python -m src.prerender badges.json --out dist/ --concurrency 4 --workers 8 --force
+
+Manifest (YAML or JSON)::
+
+    defaults:
+      style: flat
+    badges:
+      - github: octocat/hello-world
+        metrics: [stars, forks, license]
+        styles: [flat, neon]
+      - label: build
+        value: passing
+        color: green
+
+Files mirror the API paths. ``/v2/badge/github/octocat/hello-world/stars``
+becomes ``dist/v2/badge/github/octocat/hello-world/stars.svg``, with a
+``.svg.gz`` next to it. Query options that differ from the API defaults go
+into the file name, e.g. ``stars_style-neon_icon-star.svg``, and custom
+badges become ``v2/badge/custom_label-build_value-passing.svg``.
+
+Metric values are resolved concurrently with at most ``--concurrency``
+upstream requests in flight. Rendering runs in a process pool with the same
+``generate_badge`` the API uses. A state file records a digest of each
+badge's value and options, so re-runs only rewrite badges that changed.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+STATE_FILE = ".prerender-state.json"
+OPTION_DEFAULTS = {"style": "flat", "color": None, "icon": "", "animated": False}
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("YAML manifests need PyYAML: pip install pyyaml") from None
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _as_list(value: Any) -> List[Any]:
+    return value if isinstance(value, list) else [value]
+
+
+def expand(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One job per badge file; list-valued fields fan out"""
+    defaults = {**OPTION_DEFAULTS, **manifest.get("defaults", {})}
+    jobs = []
+    for spec in manifest.get("badges", []):
+        spec = {**defaults, **spec}
+        if "styles" in spec:
+            spec["style"] = spec.pop("styles")
+        for style in _as_list(spec["style"]):
+            options = {key: spec[key] for key in OPTION_DEFAULTS}
+            options["style"] = style
+            if "github" in spec:
+                owner, repo = spec["github"].split("/", 1)
+                for metric in _as_list(spec.get("metrics", spec.get("metric"))):
+                    jobs.append({"path": f"v2/badge/github/{owner}/{repo}/{metric}", "query": [],
+                                 "github": (owner, repo, metric), "label": metric, **options})
+            else:
+                label, value = str(spec["label"]), str(spec["value"])
+                jobs.append({"path": "v2/badge/custom", "query": [("label", label), ("value", value)],
+                             "label": label, "value": value, **options})
+    return jobs
+
+
+def file_name(job: Dict[str, Any]) -> str:
+    query = job["query"] + [(key, job[key]) for key, default in OPTION_DEFAULTS.items() if job[key] != default]
+    parts = [f"{key}-{value}".replace("/", "-").replace("#", "") for key, value in query]
+    return "_".join([job["path"]] + parts) + ".svg"
+
+
+def digest(job: Dict[str, Any]) -> str:
+    fields = [job["label"], job["value"]] + [str(job[key]) for key in OPTION_DEFAULTS]
+    return hashlib.sha1("\0".join(fields).encode()).hexdigest()
+
+
+async def resolve(jobs: List[Dict[str, Any]], concurrency: int) -> List[str]:
+    """Fill in job values; each (repo, metric) is fetched once whatever its styles"""
+    from .negative_cache import MetricUnavailable
+    from .providers.github import get_github_metric
+
+    semaphore = asyncio.Semaphore(concurrency)
+    errors: List[str] = []
+
+    async def fetch(owner: str, repo: str, metric: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                return await get_github_metric(owner, repo, metric)
+            except MetricUnavailable as e:
+                errors.append(f"{owner}/{repo} {metric}: {e.label}")
+            except Exception as e:
+                errors.append(f"{owner}/{repo} {metric}: {e}")
+            return None
+
+    wanted = {job["github"] for job in jobs if "github" in job}
+    values = dict(zip(wanted, await asyncio.gather(*(fetch(*key) for key in wanted))))
+    for job in jobs:
+        if "github" in job:
+            job["value"] = values[job["github"]]
+    return errors
+
+
+def render_file(out: str, job: Dict[str, Any]) -> str:
+    """Process pool worker: render one badge and write it plus its gzip variant"""
+    from .badges import generate_badge, generate_heatmap
+
+    if job.get("github", (None, None, None))[2] == "heatmap":
+        from .heatmap import decode
+
+        svg = generate_heatmap("commits", decode(job["value"]), style=job["style"], color=job["color"]).encode()
+    else:
+        svg = generate_badge(job["label"], job["value"], style=job["style"], color=job["color"],
+                             icon=job["icon"], animated=job["animated"]).encode()
+    target = os.path.join(out, file_name(job))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    for path, content in ((target, svg), (target + ".gz", gzip.compress(svg, mtime=0))):
+        with open(path + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+    return file_name(job)
+
+
+def prerender(manifest: Dict[str, Any], out: str, concurrency: int = 8, workers: Optional[int] = None,
+              force: bool = False) -> Dict[str, Any]:
+    from .http_client import close_client
+    from .snapshots import snapshots
+
+    async def resolve_all() -> List[str]:
+        # Snapshots let re-runs revalidate with ETags instead of refetching
+        await snapshots.load()
+        try:
+            return await resolve(jobs, concurrency)
+        finally:
+            await snapshots.flush()
+            await close_client()
+
+    started = time.perf_counter()
+    jobs = expand(manifest)
+    errors = asyncio.run(resolve_all())
+
+    state_path = os.path.join(out, STATE_FILE)
+    state: Dict[str, str] = {}
+    if os.path.exists(state_path) and not force:
+        with open(state_path) as f:
+            state = json.load(f)
+
+    todo: List[Tuple[str, Dict[str, Any]]] = []
+    for job in jobs:
+        if job["value"] is None:
+            continue
+        name, current = file_name(job), digest(job)
+        if state.get(name) == current and os.path.exists(os.path.join(out, name)):
+            continue
+        todo.append((name, job))
+        state[name] = current
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render_file, [out] * len(todo), [job for _, job in todo], chunksize=16))
+        with open(state_path, "w") as f:
+            json.dump(state, f, indent=0, sort_keys=True)
+
+    return {
+        "badges": len(jobs),
+        "written": len(todo),
+        "unchanged": len(jobs) - len(todo) - sum(job["value"] is None for job in jobs),
+        "failed": errors,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render badges from a manifest to static SVG files")
+    parser.add_argument("manifest", help="YAML or JSON badge manifest")
+    parser.add_argument("--out", default="dist", help="output directory")
+    parser.add_argument("--concurrency", type=int, default=8, help="upstream requests in flight")
+    parser.add_argument("--workers", type=int, help="render processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rewrite every badge")
+    args = parser.parse_args()
+
+    report = prerender(load_manifest(args.manifest), args.out, args.concurrency, args.workers, args.force)
+    print(f"{report['written']} written, {report['unchanged']} unchanged, "
+          f"{len(report['failed'])} failed of {report['badges']} badges in {report['elapsed_s']}s")
+    for error in report["failed"]:
+        print(f"  {error}", file=sys.stderr)
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
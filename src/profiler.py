@@ -0,0 +1,109 @@
+"""Sampling profiler for a live process.
+
+A daemon thread wakes every ``interval`` seconds, reads the target thread's
+current frame from ``sys._current_frames()`` and counts the stack. Nothing
+is installed in the target thread, so the cost is one stack walk per
+sample, taken while holding the GIL. The interval floor and the duration cap
+bound that overhead, and only one profile runs at a time.
+
+Output is collapsed stacks (``root;caller;leaf count`` per line), which
+flamegraph.pl and speedscope read directly, plus a top-functions summary.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+MIN_INTERVAL = 0.005
+MAX_DEPTH = 128
+
+_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, interval: float = 0.01):
+        self.thread_id = thread_id
+        self.interval = max(interval, MIN_INTERVAL)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if not _lock.acquire(blocking=False):
+            raise ProfilerBusy("a profile is already running")
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            _lock.release()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            # Collapsed format separates frames with ';'
+            label = self._labels[code] = label.replace(";", ":")
+        return label
+
+    def _run(self):
+        started = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack: List[str] = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            del frame
+            stack.reverse()
+            self.stacks[";".join(stack)] += 1
+            self.samples += 1
+        self.elapsed = time.perf_counter() - started
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 25) -> List[Dict[str, Any]]:
+        """Functions by self samples (leaf frame) with inclusive samples alongside"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [
+            {
+                "function": name,
+                "self": count,
+                "self_pct": round(count / self.samples * 100, 2),
+                "total": total[name],
+                "total_pct": round(total[name] / self.samples * 100, 2),
+            }
+            for name, count in own.most_common(limit)
+        ]
+
+    def report(self, limit: int = 25) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "elapsed_s": round(self.elapsed, 3),
+            "top": self.top(limit) if self.samples else [],
+            "collapsed": self.collapsed(),
+        }
+
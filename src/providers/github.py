@@ -1,19 +1,188 @@
 import httpx
-from typing import Optional, Dict, Any
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Tuple
 from ..config import settings
+from ..cache import cache_get, cache_set
+from ..metrics import GITHUB_RATE_LIMIT_REMAINING, upstream_instruments
+from ..timing import timed
+from ..negative_cache import NOT_FOUND, OVERLOADED, UNKNOWN_METRIC, UPSTREAM_ERROR, MetricUnavailable, NegativeCache, classify
+from ..resilience import Upstream, last_known, remember
+from ..snapshots import Snapshot, snapshots
+from ..timeseries import record_metric
+from ..adaptive_ttl import bounds
+from ..commit_activity import CommitActivity, since_timestamp, WINDOWS
+from .. import heatmap
 
 BASE_URL = 'https://api.github.com/repos/{owner}/{repo}'
+REPOS_PREFIX = 'https://api.github.com/repos/'
+OWNER_PREFIXES = ('https://api.github.com/orgs/', 'https://api.github.com/users/')
+ENDPOINTS = ('repo', 'pulls', 'commits', 'releases', 'actions', 'contributors', 'owner_repos', 'other')
+COMMITS_PER_PAGE = 100
+MAX_ACTIVITY_TRACKERS = 4096
+METRICS = frozenset({
+    'stars', 'forks', 'watchers', 'open_issues', 'size', 'open_prs', 'last_commit', 'contributors',
+    'release', 'license', 'ci_status', 'commit_frequency', 'commit_velocity', 'activity_rank', 'trophy',
+    'heatmap',
+})
 
-async def fetch_github_data(url: str, token: Optional[str] = None) -> Dict[str, Any]:
+_activity: 'OrderedDict[str, CommitActivity]' = OrderedDict()
+_instruments = upstream_instruments('github', ENDPOINTS)
+_negative = NegativeCache('github')
+_upstream = Upstream('github')
+
+def endpoint_of(url: str) -> str:
+    """Metrics label for a GitHub URL, e.g. .../repos/o/r/pulls?state=open -> pulls"""
+    if not url.startswith(REPOS_PREFIX):
+        return 'owner_repos' if url.startswith(OWNER_PREFIXES) else 'other'
+    parts = url[len(REPOS_PREFIX):].split('?', 1)[0].split('/')
+    if len(parts) <= 2:
+        return 'repo'
+    return parts[2] if parts[2] in _instruments else 'other'
+
+class Exchange:
+    """Upstream responses seen while resolving one metric"""
+
+    __slots__ = ('prefetched', 'fetched', 'dated')
+
+    def __init__(self, prefetched: Optional[Dict[str, Tuple[Optional[str], Any]]] = None):
+        self.prefetched = prefetched or {}
+        self.fetched: List[Tuple[str, Optional[str]]] = []
+        # Read from the commit activity window, so the value moves with the date as well
+        self.dated = False
+
+_exchange: ContextVar[Optional[Exchange]] = ContextVar('github_exchange', default=None)
+
+async def request_github(url: str, token: Optional[str] = None, etag: Optional[str] = None) -> httpx.Response:
     headers = {'Accept': 'application/vnd.github.v3+json'}
     if token:
         headers['Authorization'] = f'token {token}'
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
+    if etag:
+        headers['If-None-Match'] = etag
+    response = await _upstream.get(_instruments[endpoint_of(url)], url, headers=headers)
+    remaining = response.headers.get('X-RateLimit-Remaining')
+    if remaining is not None:
+        GITHUB_RATE_LIMIT_REMAINING.set(int(remaining))
+    if response.status_code != 304:
         response.raise_for_status()
-        return response.json()
+    return response
+
+async def fetch_github_data(url: str, token: Optional[str] = None) -> Dict[str, Any]:
+    exchange = _exchange.get()
+    if exchange is not None and url in exchange.prefetched:
+        etag, data = exchange.prefetched.pop(url)
+    else:
+        response = await request_github(url, token)
+        etag, data = response.headers.get('ETag'), response.json()
+    if exchange is not None:
+        exchange.fetched.append((url, etag))
+    return data
+
+async def load_commit_activity(owner: str, repo: str) -> CommitActivity:
+    key = f'commit_activity:{owner}:{repo}'
+    activity = _activity.get(key)
+    if activity is None:
+        stored = await cache_get(key)
+        activity = CommitActivity.from_dict(json.loads(stored)) if stored else CommitActivity()
+        _activity[key] = activity
+        if len(_activity) > MAX_ACTIVITY_TRACKERS:
+            _activity.popitem(last=False)
+    _activity.move_to_end(key)
+    return activity
+
+async def refresh_commit_activity(owner: str, repo: str, token: Optional[str] = None) -> CommitActivity:
+    """Fetch commits newer than the stored cursor and fold them into the tracker"""
+    exchange = _exchange.get()
+    if exchange is not None:
+        exchange.dated = True
+    activity = await load_commit_activity(owner, repo)
+    if time.time() - activity.refreshed_at < settings.CACHE_TTL:
+        return activity
+
+    since = activity.cursor or since_timestamp(max(WINDOWS))
+    commits_url = BASE_URL.format(owner=owner, repo=repo) + '/commits'
+    commits: List[Dict[str, Any]] = []
+    for page in range(1, settings.COMMIT_ACTIVITY_MAX_PAGES + 1):
+        data = await fetch_github_data(
+            f'{commits_url}?since={since}&per_page={COMMITS_PER_PAGE}&page={page}', token
+        )
+        commits.extend(data)
+        if len(data) < COMMITS_PER_PAGE:
+            break
+    # Ingested once all pages are in, so a failed page leaves the cursor where it was
+    activity.ingest(commits)
 
+    activity.refreshed_at = time.time()
+    await cache_set(f'commit_activity:{owner}:{repo}', json.dumps(activity.to_dict()), ttl=settings.COMMIT_ACTIVITY_TTL)
+    return activity
+
+def value_ttl(owner: str, repo: str, metric: str) -> int:
+    """How long a badge rendered from the current value may be cached"""
+    return snapshots.ttl_left(f'github:{owner}/{repo}'.lower() + f'/{metric}')
+
+@timed("provider")
 async def get_github_metric(owner: str, repo: str, metric: str) -> str:
+    """Fetch one metric; failures are negative cached and raised as MetricUnavailable"""
+    if metric not in METRICS:
+        raise MetricUnavailable(UNKNOWN_METRIC, metric)
+    # A missing repo fails every metric; other failures only the metric that hit them
+    repo_key = f'{owner}/{repo}'.lower()
+    metric_key = f'{repo_key}/{metric}'
+    snapshot_key = f'github:{metric_key}'
+    snapshot = snapshots.get(snapshot_key)
+    if snapshot is not None and snapshot.fresh:
+        return snapshot.value
+    try:
+        await _negative.check(repo_key)
+        await _negative.check(metric_key)
+        value = await resolve_metric(owner, repo, metric, snapshot_key, snapshot)
+    except Exception as e:
+        category = classify(e)
+        if category in (UPSTREAM_ERROR, OVERLOADED):
+            # Circuit open or GitHub failing: the last good value beats an error badge
+            stale = snapshot.value if snapshot is not None else await last_known('github', metric_key)
+            if stale is not None:
+                return stale
+        if isinstance(e, MetricUnavailable):
+            raise
+        raise await _negative.record(repo_key if category == NOT_FOUND else metric_key, category) from e
+    await remember('github', metric_key, value)
+    return value
+
+async def resolve_metric(owner: str, repo: str, metric: str, key: str, snapshot: Optional[Snapshot]) -> str:
+    """Revalidate a stale snapshot if it has a validator, otherwise fetch; snapshot the result"""
+    prefetched = {}
+    if snapshot is not None and snapshot.etag:
+        try:
+            response = await request_github(snapshot.url, settings.GITHUB_TOKEN, snapshot.etag)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise
+            # Some metrics read a 404 as a value (no release, no CI runs); fetch_metric knows which
+            snapshot.etag = None
+        else:
+            if response.status_code == 304:
+                snapshots.touch(key, bounds(metric))
+                record_metric(f'{owner}/{repo}'.lower(), metric, snapshot.value)
+                return snapshot.value
+            prefetched[snapshot.url] = (response.headers.get('ETag'), response.json())
+
+    exchange = Exchange(prefetched)
+    reset = _exchange.set(exchange)
+    try:
+        value = await fetch_metric(owner, repo, metric)
+    finally:
+        _exchange.reset(reset)
+    # Only single-request metrics can be revalidated with one conditional GET. A 304 for a
+    # windowed value only says no commits arrived, not that none aged out of the window
+    url, etag = exchange.fetched[0] if len(exchange.fetched) == 1 and not exchange.dated else (None, None)
+    snapshots.put(key, value, url, etag, bounds(metric))
+    record_metric(f'{owner}/{repo}'.lower(), metric, value)
+    return value
+
+async def fetch_metric(owner: str, repo: str, metric: str) -> str:
     token = settings.GITHUB_TOKEN
     repo_url = BASE_URL.format(owner=owner, repo=repo)
 
@@ -66,10 +235,25 @@ async def get_github_metric(owner: str, repo: str, metric: str) -> str:
             return 'unknown'
 
     elif metric == 'commit_frequency':
-        # Calculate commits in last 30 days
-        commits_url = f'{repo_url}/commits?since=2023-01-01T00:00:00Z'
-        data = await fetch_github_data(commits_url, token)
-        return str(len(data))
+        # Commits in the last 30 days
+        activity = await refresh_commit_activity(owner, repo, token)
+        return str(activity.window(30))
+
+    elif metric == 'commit_velocity':
+        # Average commits per week over the last 90 days
+        activity = await refresh_commit_activity(owner, repo, token)
+        return f'{activity.window(90) * 7 / 90:.1f}/week'
+
+    elif metric == 'heatmap':
+        # Weekday x week commit counts; GitHub answers 202 with no body while it computes the stats
+        data = await fetch_github_data(f'{repo_url}/stats/commit_activity', token)
+        if isinstance(data, list) and data:
+            matrix = heatmap.from_commit_activity_stats(data)
+        else:
+            matrix = heatmap.from_daily_counts(await refresh_commit_activity(owner, repo, token))
+        value = heatmap.encode(matrix)
+        heatmap.remember(f'{owner}/{repo}'.lower(), value, matrix)
+        return value
 
     elif metric == 'activity_rank':
         # Simple activity rank based on stars + forks + issues
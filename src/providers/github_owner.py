@@ -0,0 +1,248 @@
+"""Badges that add up every public repository of a GitHub org or user.
+
+The repository list is paged at 100 per page, which runs to hundreds of
+pages for large orgs. Page 1 is fetched first. Its ``Link: rel="last"``
+header gives the page count, and the remaining pages are then fetched
+concurrently. Each page keeps the ETag it was served with and is
+revalidated with If-None-Match, so an unchanged page costs a 304 and no
+GitHub rate limit.
+
+Totals are kept incrementally. Every repository remembers the page it was
+last seen on and what it contributed. A changed page only subtracts and
+re-adds its own repositories, and a repository that shifts between pages
+is counted once.
+
+Aggregates are served for GITHUB_OWNER_TTL seconds. After that the stale
+totals are still served while one background refresh per owner runs.
+Page fetches from all refreshes share GITHUB_OWNER_CONCURRENCY slots, so
+they never hold more than that many of the pooled upstream connections
+and ordinary badge misses are not queued behind them.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+import httpx
+from ..cache import cache_get, cache_set
+from ..config import settings
+from ..negative_cache import UNKNOWN_METRIC, MetricUnavailable, NegativeCache, classify
+from ..timing import timed
+from .github import request_github
+
+REPOS_URL = 'https://api.github.com/{kind}/{owner}/repos?type={type}&sort=full_name&per_page={per_page}&page={page}'
+# Tried in order; /orgs/ 404s for users. Org members' tokens also see private repos, hence type=public
+KINDS = {'orgs': 'public', 'users': 'owner'}
+PER_PAGE = 100
+# Totals kept per owner, from each repository's fields
+FIELDS = ('stargazers_count', 'forks_count', 'open_issues_count')
+METRICS = {'stars': 'stargazers_count', 'forks': 'forks_count', 'open_issues': 'open_issues_count', 'repos': None}
+MAX_OWNER_TRACKERS = 256
+
+_owners: 'OrderedDict[str, OwnerRepos]' = OrderedDict()
+_refreshing: Dict[str, asyncio.Task] = {}
+_slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+_negative = NegativeCache('github_owner')
+
+
+def last_page(response: httpx.Response) -> int:
+    """Page count from the Link header; a single page has no rel="last" link"""
+    url = response.links.get('last', {}).get('url')
+    if not url:
+        return 1
+    return int(parse_qs(urlparse(url).query).get('page', ['1'])[0])
+
+
+class OwnerRepos:
+    """Public repositories of one owner, by page, with running totals"""
+
+    def __init__(self):
+        self.kind: Optional[str] = None
+        self.pages: Dict[int, Tuple[Optional[str], List[str]]] = {}  # page -> (etag, repo names)
+        self.repos: Dict[str, Tuple[int, Tuple[int, ...]]] = {}  # name -> (page, one count per FIELDS)
+        self.totals = [0] * len(FIELDS)
+        self.refreshed_at = 0.0
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.refreshed_at < settings.GITHUB_OWNER_TTL
+
+    def value(self, metric: str) -> str:
+        field = METRICS[metric]
+        if field is None:
+            return str(len(self.repos))
+        return str(self.totals[FIELDS.index(field)])
+
+    def _add(self, counts: Tuple[int, ...], sign: int):
+        for i, count in enumerate(counts):
+            self.totals[i] += sign * count
+
+    def _drop(self, name: str):
+        _, counts = self.repos.pop(name)
+        self._add(counts, -1)
+
+    def apply(self, page: int, etag: Optional[str], items: List[Dict[str, Any]]):
+        """Replace one page's contribution to the totals"""
+        names = []
+        for item in items:
+            name = item['full_name']
+            if name in self.repos:
+                self._drop(name)
+            counts = tuple(item.get(field) or 0 for field in FIELDS)
+            self.repos[name] = (page, counts)
+            self._add(counts, 1)
+            names.append(name)
+        seen = set(names)
+        _, previous = self.pages.get(page, (None, []))
+        for name in previous:
+            # Repositories that moved to another page are owned by that page now
+            if name not in seen and name in self.repos and self.repos[name][0] == page:
+                self._drop(name)
+        self.pages[page] = (etag, names)
+
+    def truncate(self, pages: int):
+        """Forget pages past ``pages``, after repositories were deleted"""
+        for page in [p for p in self.pages if p > pages]:
+            _, names = self.pages.pop(page)
+            for name in names:
+                if name in self.repos and self.repos[name][0] == page:
+                    self._drop(name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "pages": {str(page): [etag, names] for page, (etag, names) in self.pages.items()},
+            "repos": {name: [page, list(counts)] for name, (page, counts) in self.repos.items()},
+            "refreshed_at": self.refreshed_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OwnerRepos":
+        state = cls()
+        state.kind = data.get("kind")
+        state.pages = {int(page): (etag, list(names)) for page, (etag, names) in (data.get("pages") or {}).items()}
+        for name, (page, counts) in (data.get("repos") or {}).items():
+            state.repos[name] = (page, tuple(counts))
+            state._add(tuple(counts), 1)
+        state.refreshed_at = data.get("refreshed_at", 0.0)
+        return state
+
+
+def page_slots() -> asyncio.Semaphore:
+    """Page fetches in flight across every refresh in this process"""
+    global _slots
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots[0] is not loop:
+        _slots = (loop, asyncio.Semaphore(settings.GITHUB_OWNER_CONCURRENCY))
+    return _slots[1]
+
+
+async def load_owner(owner: str) -> OwnerRepos:
+    key = f'github_owner:{owner}'
+    state = _owners.get(key)
+    if state is None:
+        stored = await cache_get(key)
+        state = OwnerRepos.from_dict(json.loads(stored)) if stored else OwnerRepos()
+        _owners[key] = state
+        if len(_owners) > MAX_OWNER_TRACKERS:
+            _owners.popitem(last=False)
+    _owners.move_to_end(key)
+    return state
+
+
+async def fetch_page(state: OwnerRepos, owner: str, page: int) -> Tuple[httpx.Response, int]:
+    """Fetch (or revalidate) one page into ``state``; returns the response and its item count"""
+    etag, names = state.pages.get(page, (None, []))
+    url = REPOS_URL.format(kind=state.kind, type=KINDS[state.kind], owner=owner, per_page=PER_PAGE, page=page)
+    async with page_slots():
+        response = await request_github(url, settings.GITHUB_TOKEN, etag)
+    if response.status_code == 304:
+        return response, len(names)
+    items = response.json()
+    state.apply(page, response.headers.get('ETag'), items)
+    return response, len(items)
+
+
+async def refresh_owner(owner: str) -> OwnerRepos:
+    state = await load_owner(owner)
+    if state.kind is None:
+        for kind in KINDS:
+            state.kind = kind
+            try:
+                first, count = await fetch_page(state, owner, 1)
+                break
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404 or kind == 'users':
+                    state.kind = None
+                    raise
+    else:
+        first, count = await fetch_page(state, owner, 1)
+
+    # A 304 carries no body to count from; keep the page count of the last full read
+    pages = last_page(first) if first.status_code != 304 else max(state.pages, default=1)
+    pages = min(pages, settings.GITHUB_OWNER_MAX_PAGES)
+    counts = [count]
+    if pages > 1:
+        results = await asyncio.gather(*(fetch_page(state, owner, page) for page in range(2, pages + 1)))
+        counts += [count for _, count in results]
+    # Repositories created since the page count was read spill onto further pages
+    while counts[-1] == PER_PAGE and pages < settings.GITHUB_OWNER_MAX_PAGES:
+        pages += 1
+        _, count = await fetch_page(state, owner, pages)
+        counts.append(count)
+    while pages > 1 and counts[pages - 1] == 0:
+        pages -= 1
+    state.truncate(pages)
+
+    state.refreshed_at = time.time()
+    await cache_set(f'github_owner:{owner}', json.dumps(state.to_dict()), ttl=settings.GITHUB_OWNER_STATE_TTL)
+    return state
+
+
+def start_refresh(owner: str) -> asyncio.Task:
+    """One refresh per owner at a time; later callers share it"""
+    task = _refreshing.get(owner)
+    if task is None or task.done():
+        task = _refreshing[owner] = asyncio.get_running_loop().create_task(refresh_owner(owner))
+        task.add_done_callback(lambda t: _refreshing.pop(owner, None) if _refreshing.get(owner) is t else None)
+    return task
+
+
+def report_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Aggregate refresh failed: {task.exception()!r}")
+
+
+def value_ttl(owner: str) -> int:
+    """How long a badge rendered from the current totals may be cached"""
+    state = _owners.get(f'github_owner:{owner.lower()}')
+    if state is None:
+        return settings.CACHE_TTL
+    # Stale totals are re-rendered once the background refresh has had time to land
+    return max(int(state.refreshed_at + settings.GITHUB_OWNER_TTL - time.time()), settings.CACHE_TTL // 5, 1)
+
+
+@timed("provider")
+async def get_owner_metric(owner: str, metric: str) -> str:
+    """Total of one metric over an owner's public repositories"""
+    if metric not in METRICS:
+        raise MetricUnavailable(UNKNOWN_METRIC, metric)
+    owner = owner.lower()
+    state = await load_owner(owner)
+    if state.fresh:
+        return state.value(metric)
+    if state.refreshed_at:
+        # Serve the previous totals; the refresh runs without holding up the request
+        if owner not in _refreshing:
+            start_refresh(owner).add_done_callback(report_failure)
+        return state.value(metric)
+    try:
+        await _negative.check(owner)
+        # Shielded so a client hanging up doesn't cancel a refresh others are waiting on
+        state = await asyncio.shield(start_refresh(owner))
+    except Exception as e:
+        if isinstance(e, MetricUnavailable):
+            raise
+        raise await _negative.record(owner, classify(e)) from e
+    return state.value(metric)
@@ -1,21 +1,252 @@
-import httpx
-from typing import Optional, Dict, Any
+"""PyPI package metrics.
 
-async def fetch_pypi_data(package: str) -> Dict[str, Any]:
-    url = f'https://pypi.org/pypi/{package}/json'
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+The JSON API puts a package's ``info`` first, followed by ``releases``. That
+member lists every file of every release and runs to megabytes for
+long-lived packages. Responses are streamed and decoded one top-level member
+at a time. Reading stops as soon as the members a metric needs are in, so
+``version``, ``python_requires`` and ``license`` never download ``releases``.
+
+Fields extracted for a package are kept as one snapshot, together with the
+response's ETag, and stale snapshots are revalidated with If-None-Match.
+PyPI doesn't publish download counts, so ``downloads`` comes from
+pypistats.org.
+"""
+import asyncio
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from ..metrics import upstream_instruments
+from ..negative_cache import NOT_FOUND, OVERLOADED, UNKNOWN_METRIC, UPSTREAM_ERROR, MetricUnavailable, NegativeCache, classify
+from ..resilience import Upstream, last_known, remember
+from ..snapshots import snapshots
+from ..adaptive_ttl import bounds
+from ..timing import timed
+
+JSON_URL = 'https://pypi.org/pypi/{package}/json'
+STATS_URL = 'https://pypistats.org/api/packages/{package}/recent'
+# Top-level member of the JSON API response each metric is read from
+SOURCES = {
+    'version': 'info',
+    'python_requires': 'info',
+    'license': 'info',
+    'releases': 'releases',
+    'last_upload': 'releases',
+}
+METRICS = frozenset(SOURCES) | {'downloads'}
+BULK_CONCURRENCY = 8
+RETRY_BACKOFF_FROM = 256 * 1024
+
+_instruments = upstream_instruments('pypi', ('json',))
+_stats_instruments = upstream_instruments('pypistats', ('recent',))
+_upstream = Upstream('pypi')
+_stats_upstream = Upstream('pypistats')
+_negative = NegativeCache('pypi')
+
+_whitespace = re.compile(r'\s*')
+
+
+async def read_members(chunks: AsyncIterator[bytes], wanted: Iterable[str]) -> Dict[str, Any]:
+    """Decode top-level members of a streamed JSON object until all of ``wanted`` are read.
+
+    An incomplete member is retried on every chunk until it passes
+    RETRY_BACKOFF_FROM characters, then only each time the buffer doubles, so
+    a multi-megabyte member costs a few parses, not one per chunk.
+    """
+    wanted = set(wanted)
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    found: Dict[str, Any] = {}
+    parts: List[str] = []
+    size = 0
+    opened = False
+    retry_at = 0
+
+    def consume() -> bool:
+        """Decode complete members from the buffer; True once nothing more is needed"""
+        nonlocal parts, size, opened, retry_at
+        text = ''.join(parts)
+        pos = _whitespace.match(text).end()
+        if not opened:
+            if pos == len(text):
+                return False
+            if text[pos] != '{':
+                raise ValueError('expected a JSON object')
+            opened = True
+            pos += 1
+        while True:
+            pos = _whitespace.match(text, pos).end()
+            if pos < len(text) and text[pos] == ',':
+                pos = _whitespace.match(text, pos + 1).end()
+            if pos == len(text):
+                break
+            if text[pos] == '}':
+                return True
+            try:
+                key, end = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                break
+            colon = _whitespace.match(text, end).end()
+            if colon == len(text):
+                break
+            if text[colon] != ':':
+                raise ValueError('expected a colon after an object key')
+            start = _whitespace.match(text, colon + 1).end()
+            if start == len(text):
+                break
+            try:
+                value, end = decoder.raw_decode(text, start)
+            except json.JSONDecodeError:
+                pending = len(text) - pos
+                retry_at = 2 * pending if pending >= RETRY_BACKOFF_FROM else 0
+                break
+            # Need at least one character past the value: a number may continue in the next chunk
+            if end == len(text):
+                break
+            if key in wanted:
+                found[key] = value
+                if wanted <= found.keys():
+                    return True
+            pos, retry_at = end, 0
+        parts = [text[pos:]]
+        size = len(parts[0])
+        return False
+
+    async for chunk in chunks:
+        parts.append(utf8.decode(chunk))
+        size += len(parts[-1])
+        if size >= retry_at and consume():
+            return found
+    parts.append(utf8.decode(b'', final=True))
+    if not consume() and ''.join(parts).strip():
+        raise ValueError('truncated JSON object')
+    return found
+
+
+def license_of(info: Dict[str, Any]) -> str:
+    if info.get('license_expression'):
+        return info['license_expression']
+    # Some packages paste the whole license text here
+    text = (info.get('license') or '').strip()
+    if text and len(text) <= 40 and '\n' not in text:
+        return text
+    for classifier in info.get('classifiers') or []:
+        if classifier.startswith('License :: '):
+            return classifier.rsplit(' :: ', 1)[-1]
+    return 'unknown'
+
+
+def summarize(members: Dict[str, Any]) -> Dict[str, str]:
+    """Metric values derivable from the members that were read"""
+    summary = {}
+    info = members.get('info')
+    if info is not None:
+        summary['version'] = info.get('version') or 'unknown'
+        summary['python_requires'] = info.get('requires_python') or 'any'
+        summary['license'] = license_of(info)
+    releases = members.get('releases')
+    if releases is not None:
+        # Releases whose files were all deleted don't count
+        summary['releases'] = str(sum(1 for files in releases.values() if files))
+        uploads = [f.get('upload_time_iso_8601') or f.get('upload_time') or '' for files in releases.values() for f in files]
+        summary['last_upload'] = max(uploads, default='')[:10] or 'unknown'
+    return summary
+
+
+def format_count(count: int) -> str:
+    for suffix, scale in (('B', 10 ** 9), ('M', 10 ** 6), ('k', 10 ** 3)):
+        if count >= scale:
+            return f'{count / scale:.1f}{suffix}'
+    return str(count)
+
+
+async def package_summary(package: str, metric: str) -> Dict[str, str]:
+    """Fields of one package, from its snapshot or a streamed fetch"""
+    key = f'pypi:{package.lower()}'
+    snapshot = snapshots.get(key)
+    summary = json.loads(snapshot.value) if snapshot is not None else {}
+    if metric in summary and snapshot.fresh:
+        return summary
+
+    # Re-read what the snapshot already holds so it stays from one response
+    wanted = {SOURCES[metric]} | {SOURCES[field] for field in summary}
+    url = JSON_URL.format(package=package)
+    headers = {'Accept': 'application/json'}
+    if snapshot is not None and metric in summary and snapshot.etag:
+        headers['If-None-Match'] = snapshot.etag
+    async with _upstream.stream(_instruments['json'], url, headers=headers) as response:
+        if response.status_code == 304:
+            snapshots.touch(key, bounds('version'))
+            return summary
         response.raise_for_status()
-        return response.json()
+        members = await read_members(response.aiter_bytes(), wanted)
+        etag = response.headers.get('ETag')
+    summary = summarize(members)
+    # One snapshot holds every field; it changes when a release ships
+    snapshots.put(key, json.dumps(summary), url, etag, bounds('version'))
+    return summary
+
+
+async def fetch_downloads(package: str) -> str:
+    key = f'pypi:{package.lower()}/downloads'
+    snapshot = snapshots.get(key)
+    if snapshot is not None and snapshot.fresh:
+        return snapshot.value
+    url = STATS_URL.format(package=package.lower())
+    response = await _stats_upstream.get(_stats_instruments['recent'], url)
+    response.raise_for_status()
+    value = f"{format_count(response.json()['data']['last_month'])}/month"
+    snapshots.put(key, value, url, limits=bounds('downloads'))
+    return value
+
 
+def value_ttl(package: str, metric: str) -> int:
+    """How long a badge rendered from the current value may be cached"""
+    suffix = '/downloads' if metric == 'downloads' else ''
+    return snapshots.ttl_left(f'pypi:{package.lower()}{suffix}')
+
+
+@timed("provider")
 async def get_pypi_metric(package: str, metric: str) -> str:
-    data = await fetch_pypi_data(package)
-    info = data.get('info', {})
-
-    if metric == 'downloads':
-        # PyPI doesn't provide download counts easily, return version for now
-        return info.get('version', 'unknown')
-    elif metric == 'version':
-        return info.get('version', 'unknown')
-    else:
-        raise ValueError(f'Unknown metric: {metric}')
\ No newline at end of file
+    """Fetch one metric; failures are negative cached and raised as MetricUnavailable"""
+    if metric not in METRICS:
+        raise MetricUnavailable(UNKNOWN_METRIC, metric)
+    subject = package.lower()
+    metric_key = f'{subject}/{metric}'
+    try:
+        await _negative.check(subject)
+        await _negative.check(metric_key)
+        if metric == 'downloads':
+            value = await fetch_downloads(package)
+        else:
+            value = (await package_summary(package, metric))[metric]
+    except Exception as e:
+        category = classify(e)
+        if category in (UPSTREAM_ERROR, OVERLOADED):
+            # Serve the last good value while PyPI is down or the circuit is open
+            stale = await last_known('pypi', metric_key)
+            if stale is not None:
+                return stale
+        if isinstance(e, MetricUnavailable):
+            raise
+        # pypistats lags behind PyPI, so its 404s don't mark the package missing
+        missing_package = category == NOT_FOUND and metric != 'downloads'
+        raise await _negative.record(subject if missing_package else metric_key, category) from e
+    await remember('pypi', metric_key, value)
+    return value
+
+
+async def get_pypi_metrics(packages: Iterable[str], metric: str,
+                           concurrency: int = BULK_CONCURRENCY) -> Dict[str, Optional[str]]:
+    """One metric for many packages, fetched concurrently; failed lookups map to None"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup(package: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                return await get_pypi_metric(package, metric)
+            except Exception:
+                return None
+
+    packages = list(dict.fromkeys(packages))
+    return dict(zip(packages, await asyncio.gather(*(lookup(p) for p in packages))))
@@ -1,5 +1,179 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+import functools
+import re
+import time
+from typing import Callable, Dict, List, Tuple
+from fastapi import HTTPException, Request
 from .config import settings
 
-limiter = Limiter(key_func=get_remote_address, default_limits=[settings.RATE_LIMIT])
\ No newline at end of file
+# Limits per route class; each falls back to the global RATE_LIMIT
+ROUTE_LIMITS: Dict[str, str] = {
+    "custom": settings.RATE_LIMIT_CUSTOM or settings.RATE_LIMIT,
+    "github": settings.RATE_LIMIT_GITHUB or settings.RATE_LIMIT,
+    "compose": settings.RATE_LIMIT_COMPOSE or settings.RATE_LIMIT,
+}
+
+MAX_LEASES = 10000
+
+UNIT_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+LIMIT_RE = re.compile(r"^\s*(\d+)\s*(?:/|per)\s*(\d*)\s*(second|minute|hour|day)s?\s*$")
+
+
+def parse_limit(value: str) -> Tuple[int, int]:
+    """Parse "100/minute", "100 per hour" or "10/5 minutes" into (amount, window seconds)"""
+    match = LIMIT_RE.match(value)
+    if not match:
+        raise ValueError(f"Invalid rate limit: {value}")
+    amount, multiple, unit = match.groups()
+    return int(amount), int(multiple or 1) * UNIT_SECONDS[unit]
+
+
+def get_remote_address(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+
+# Sliding window counter: the previous window's count is weighted by how much
+# of it still overlaps the sliding window. Grants up to ARGV[2] tokens at once.
+# KEYS: current window counter, previous window counter
+# ARGV: limit, tokens wanted, previous window weight, window seconds
+LEASE_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local available = tonumber(ARGV[1]) - used - math.floor(previous * tonumber(ARGV[3]))
+if available <= 0 then
+    return 0
+end
+local granted = math.min(tonumber(ARGV[2]), available)
+redis.call('INCRBY', KEYS[1], granted)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]) * 2)
+return granted
+"""
+
+
+class LeasedRateLimiter:
+    """Global rate limits kept in Redis, admitted from local token leases.
+
+    Each process leases a small batch of tokens from the shared counter and
+    spends them locally, so only one request in a batch pays a Redis round
+    trip. Leases only live until the end of the window they were granted in.
+    """
+
+    def __init__(self, url: str, limits: Dict[str, str], lease_size: int):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.redis_errors = redis.RedisError
+        self.script = self.redis.register_script(LEASE_SCRIPT)
+        self.limits = {name: parse_limit(value) for name, value in limits.items()}
+        self.lease_size = lease_size
+        # key -> [tokens left, window index]
+        self._leases: Dict[str, List[int]] = {}
+
+    def _batch(self, route_class: str) -> int:
+        # Small limits get small leases so one process can't hold the quota
+        amount = self.limits[route_class][0]
+        return max(1, min(self.lease_size, amount // 10))
+
+    async def hit(self, route_class: str, identifier: str) -> bool:
+        amount, window = self.limits[route_class]
+        now = time.time()
+        index = int(now // window)
+        key = f"ratelimit:{route_class}:{identifier}"
+
+        lease = self._leases.get(key)
+        if lease and lease[1] == index and lease[0] > 0:
+            lease[0] -= 1
+            return True
+
+        weight = 1 - (now % window) / window
+        try:
+            granted = await self.script(
+                keys=[f"{key}:{index}", f"{key}:{index - 1}"],
+                args=[amount, self._batch(route_class), weight, window],
+            )
+        except self.redis_errors:
+            # Fail open rather than turning a Redis outage into a full outage
+            return True
+        if not granted:
+            return False
+
+        lease = self._leases.get(key)
+        if lease and lease[1] == index:
+            lease[0] += int(granted) - 1
+        else:
+            if len(self._leases) >= MAX_LEASES:
+                self._prune()
+            self._leases[key] = [int(granted) - 1, index]
+        return True
+
+    def _prune(self):
+        now = time.time()
+        current = {name: int(now // window) for name, (_, window) in self.limits.items()}
+        self._leases = {
+            key: lease for key, lease in self._leases.items()
+            if lease[0] > 0 and lease[1] == current[key.split(":")[1]]
+        }
+
+
+class LocalRateLimiter:
+    """The same sliding window counter as LEASE_SCRIPT, kept in process.
+
+    Used in startup budget mode so the badge path doesn't import slowapi.
+    """
+
+    def __init__(self, limits: Dict[str, str]):
+        self.limits = {name: parse_limit(value) for name, value in limits.items()}
+        # key -> [current window index, current count, previous count]
+        self._windows: Dict[str, List[int]] = {}
+
+    async def hit(self, route_class: str, identifier: str) -> bool:
+        amount, window = self.limits[route_class]
+        now = time.time()
+        index = int(now // window)
+        key = f"{route_class}:{identifier}"
+
+        counter = self._windows.get(key)
+        if counter is None or counter[0] < index - 1:
+            if counter is None and len(self._windows) >= MAX_LEASES:
+                self._windows = {k: c for k, c in self._windows.items() if c[0] >= index - 1}
+            counter = self._windows[key] = [index, 0, 0]
+        elif counter[0] == index - 1:
+            counter[:] = [index, 0, counter[1]]
+
+        weight = 1 - (now % window) / window
+        if counter[1] + int(counter[2] * weight) >= amount:
+            return False
+        counter[1] += 1
+        return True
+
+
+limiter = None
+if not settings.STARTUP_BUDGET:
+    from slowapi import Limiter
+
+    limiter = Limiter(key_func=get_remote_address, default_limits=[settings.RATE_LIMIT])
+
+backend = None
+if settings.REDIS_URL:
+    backend = LeasedRateLimiter(settings.REDIS_URL, ROUTE_LIMITS, settings.RATE_LIMIT_LEASE_SIZE)
+elif limiter is None:
+    backend = LocalRateLimiter(ROUTE_LIMITS)
+
+
+def limit(route_class: str) -> Callable:
+    """Rate limit a route by class; routes must take a ``request`` argument"""
+    limit_string = ROUTE_LIMITS[route_class]
+    if backend is None:
+        return limiter.limit(limit_string)
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs["request"]
+            if not await backend.hit(route_class, get_remote_address(request)):
+                raise HTTPException(status_code=429, detail=f"Rate limit exceeded: {limit_string}")
+            return await func(*args, **kwargs)
+
+        # The in-memory slowapi defaults would otherwise apply on top
+        return limiter.exempt(wrapper) if limiter else wrapper
+
+    return decorator
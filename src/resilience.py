@@ -0,0 +1,257 @@
+"""Per-provider failure isolation for upstream calls.
+
+Each provider gets one Upstream. It owns a circuit breaker and a rolling
+latency sample. The breaker opens after UPSTREAM_BREAKER_FAILURES
+consecutive failures (transport errors, timeouts and 5xx). While it is
+open, calls fail fast with CircuitOpen instead of tying up a connection.
+After UPSTREAM_BREAKER_RESET seconds one probe call is let through, and
+its outcome closes or re-opens the breaker.
+
+Hedging is opt-in (UPSTREAM_HEDGE). When a GET has not completed after the
+provider's recent p95 latency, a second identical GET is sent and the first
+response that isn't an error wins. Hedges are capped at UPSTREAM_HEDGE_MAX_RATIO of calls so
+a slow upstream can't double our traffic or our GitHub rate limit use.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+import httpx
+from .cache import cache_get, cache_set
+from .config import settings
+from .http_client import instrumented_get, instrumented_stream
+from .admission import admission
+from .metrics import CallbackFamily, Family, UpstreamInstruments
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+HEDGES = Family("badge_upstream_hedges_total", "Hedged upstream requests sent and won", "counter", ("provider", "outcome"))
+REJECTED = Family("badge_upstream_rejected_total", "Upstream calls refused by an open circuit breaker", "counter", ("provider",))
+
+
+class CircuitOpen(Exception):
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} circuit is open")
+        self.provider = provider
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_after: float):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opens += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def abandon(self):
+        """The call was cancelled; let another one probe"""
+        self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "retry_in_s": round(max(0.0, self.opened_at + self.reset_after - time.monotonic()), 3)
+            if self.state == OPEN else 0.0,
+        }
+
+
+class LatencyWindow:
+    """Recent call latencies; p95 is recomputed every ``refresh`` samples"""
+
+    def __init__(self, size: int = 256, refresh: int = 32):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.refresh = refresh
+        self.p95: Optional[float] = None
+        self._since_refresh = 0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh:
+            self._since_refresh = 0
+            ordered = sorted(self.samples)
+            self.p95 = ordered[int(len(ordered) * 0.95) - 1]
+
+
+class Upstream:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.breaker = CircuitBreaker(settings.UPSTREAM_BREAKER_FAILURES, settings.UPSTREAM_BREAKER_RESET)
+        self.latency = LatencyWindow()
+        self.calls = 0
+        self.hedges = 0
+        self._hedge_sent = HEDGES.labels(provider, "sent")
+        self._hedge_won = HEDGES.labels(provider, "won")
+        self._rejected = REJECTED.labels(provider)
+        _upstreams[provider] = self
+
+    def hedge_delay(self) -> Optional[float]:
+        if not settings.UPSTREAM_HEDGE or self.latency.p95 is None:
+            return None
+        if self.hedges >= self.calls * settings.UPSTREAM_HEDGE_MAX_RATIO:
+            return None
+        return max(self.latency.p95, settings.UPSTREAM_HEDGE_MIN_DELAY)
+
+    async def get(self, instruments: UpstreamInstruments, url: str, **kwargs) -> httpx.Response:
+        """Idempotent GET through admission control and the breaker, hedged when enabled"""
+        admission.enter_upstream(self.provider)
+        try:
+            return await self._get(instruments, url, kwargs)
+        finally:
+            admission.exit_upstream()
+
+    async def _get(self, instruments: UpstreamInstruments, url: str, kwargs: Dict[str, Any]) -> httpx.Response:
+        if not self.breaker.allow():
+            self._rejected.inc()
+            raise CircuitOpen(self.provider)
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            delay = self.hedge_delay()
+            if delay is None:
+                response = await instrumented_get(instruments, url, **kwargs)
+            else:
+                response = await self._hedged(delay, instruments, url, kwargs)
+        except httpx.HTTPError:
+            self.breaker.failure()
+            raise
+        except BaseException:
+            # Cancelled by the caller; says nothing about upstream health
+            self.breaker.abandon()
+            raise
+        if response.status_code >= 500:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+            self.latency.add(time.perf_counter() - start)
+        return response
+
+    @asynccontextmanager
+    async def stream(self, instruments: UpstreamInstruments, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streaming GET through the breaker, judged on the response status; never hedged"""
+        admission.enter_upstream(self.provider)
+        try:
+            async with self._stream(instruments, url, kwargs) as response:
+                yield response
+        finally:
+            admission.exit_upstream()
+
+    @asynccontextmanager
+    async def _stream(self, instruments: UpstreamInstruments, url: str, kwargs: Dict[str, Any]) -> AsyncIterator[httpx.Response]:
+        if not self.breaker.allow():
+            self._rejected.inc()
+            raise CircuitOpen(self.provider)
+        self.calls += 1
+        start = time.perf_counter()
+        judged = False
+        try:
+            async with instrumented_stream(instruments, url, **kwargs) as response:
+                if response.status_code >= 500:
+                    self.breaker.failure()
+                else:
+                    self.breaker.success()
+                    self.latency.add(time.perf_counter() - start)
+                judged = True
+                yield response
+        except httpx.HTTPError:
+            if not judged:
+                self.breaker.failure()
+            raise
+        except BaseException:
+            if not judged:
+                self.breaker.abandon()
+            raise
+
+    async def _hedged(self, delay: float, instruments: UpstreamInstruments, url: str,
+                      kwargs: Dict[str, Any]) -> httpx.Response:
+        primary = asyncio.ensure_future(instrumented_get(instruments, url, **kwargs))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            self.hedges += 1
+            self._hedge_sent.inc()
+            pending.add(asyncio.ensure_future(instrumented_get(instruments, url, **kwargs)))
+            error: Optional[BaseException] = None
+            failed: Optional[httpx.Response] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                    elif task.result().status_code >= 500:
+                        # A fast 5xx must not beat a slower good response
+                        failed = failed or task.result()
+                    else:
+                        if task is not primary:
+                            self._hedge_won.inc()
+                        return task.result()
+            if failed is not None:
+                return failed
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.breaker.snapshot(),
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "p95_ms": round(self.latency.p95 * 1000, 3) if self.latency.p95 is not None else None,
+        }
+
+
+_upstreams: Dict[str, Upstream] = {}
+
+
+async def remember(provider: str, subject: str, value: str):
+    """Keep the last good value for serving while the upstream is failing"""
+    await cache_set(f"last_known:{provider}:{subject}", value, ttl=settings.UPSTREAM_STALE_TTL)
+
+
+async def last_known(provider: str, subject: str) -> Optional[str]:
+    value = await cache_get(f"last_known:{provider}:{subject}")
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def upstream_status() -> Dict[str, Dict[str, Any]]:
+    return {name: upstream.snapshot() for name, upstream in _upstreams.items()}
+
+
+CallbackFamily("badge_upstream_circuit_state", "Circuit breaker state (0 closed, 1 half open, 2 open)", "gauge",
+               ("provider",), lambda: {(name,): STATE_VALUES[u.breaker.state] for name, u in _upstreams.items()})
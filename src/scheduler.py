@@ -1,6 +1,7 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import asyncio
+from .config import settings
 
 scheduler = AsyncIOScheduler()
 
@@ -8,6 +9,31 @@ async def refresh_cache():
     # Placeholder for cache refresh logic
     print("Refreshing cache...")
 
-def start_scheduler():
-    scheduler.add_job(refresh_cache, IntervalTrigger(hours=1))
+async def sample_timeseries():
+    """Resample the stalest tracked series so trends move without badge traffic"""
+    from .providers.github import get_github_metric, snapshots
+    from .timeseries import record_metric, stalest
+    for repo_key, metric in await stalest(settings.TIMESERIES_SAMPLE_LIMIT):
+        owner, repo = repo_key.split('/', 1)
+        snapshot = snapshots.get(f'github:{repo_key}/{metric}')
+        # Read before the call: revalidation refreshes this same snapshot object
+        served_fresh = snapshot is not None and snapshot.fresh
+        try:
+            value = await get_github_metric(owner, repo, metric)
+        except Exception:
+            continue
+        # Fetched and revalidated values are recorded by the provider; a fresh snapshot is not
+        if served_fresh:
+            record_metric(repo_key, metric, value)
+
+def start_scheduler(primary: bool = True):
+    """Start the jobs; ``primary`` adds those that should run once per deployment, not per process"""
+    if primary:
+        scheduler.add_job(refresh_cache, IntervalTrigger(hours=1))
+        if settings.TIMESERIES_SAMPLE_INTERVAL > 0:
+            scheduler.add_job(sample_timeseries, IntervalTrigger(seconds=settings.TIMESERIES_SAMPLE_INTERVAL))
+    # Every process serves from its own loaded plugins
+    if settings.PLUGIN_RELOAD_INTERVAL > 0:
+        from .plugins import reload_plugins
+        scheduler.add_job(reload_plugins, IntervalTrigger(seconds=settings.PLUGIN_RELOAD_INTERVAL))
     scheduler.start()
\ No newline at end of file
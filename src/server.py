@@ -0,0 +1,245 @@
+"""Pre-forking multi-process server.
+
+    python -m src.server --workers 4        # or: badge-server --workers 4
+
+The parent imports the app, themes and plugins, creates the analytics
+database, freezes the GC and binds the listening socket. It then forks one
+uvicorn worker per core (or ``--workers``/WORKERS). Workers share the
+imported modules copy-on-write and accept from the same socket. They run on uvloop and httptools when
+those are installed.
+
+Worker 0 is the primary. Only it runs the scheduled jobs meant to run once
+per deployment, such as time series sampling; every worker reloads its
+own plugins. A replacement primary is started only after the old one has
+exited, so two never overlap.
+
+Signals to the parent:
+
+- SIGTERM / SIGINT: each worker stops accepting, finishes in-flight
+  requests, and flushes analytics and snapshots in its shutdown handlers.
+  Workers still running after GRACEFUL_TIMEOUT seconds are killed.
+- SIGHUP: workers are replaced one at a time, a new worker starting before
+  the old one drains. Replacements are forked from the parent, so code
+  changes need a full restart.
+
+Workers that crash are restarted, at most once per RESPAWN_DELAY seconds
+per slot.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional, Set
+
+RESPAWN_DELAY = 1.0
+POLL_INTERVAL = 0.2
+
+
+def bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def available_cores() -> int:
+    # Respects CPU affinity (taskset, container cpusets) where the platform reports it
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def event_loop_options():
+    """uvloop and httptools when available, uvicorn's defaults otherwise"""
+    try:
+        import uvloop  # noqa: F401
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    try:
+        import httptools  # noqa: F401
+        http = "httptools"
+    except ImportError:
+        http = "h11"
+    return loop, http
+
+
+def preload():
+    """Import everything workers need so they share it copy-on-write"""
+    import asyncio
+    from .analytics import init_db
+    from .main import app
+    from .plugins import load_plugins, preload_plugins
+    from .themes import THEMES  # noqa: F401
+
+    load_plugins()
+    preload_plugins()
+    # Once, before forking: workers inherit the ready flag instead of racing on the schema
+    asyncio.run(init_db())
+    # Keep the GC from touching (and so copying) objects allocated so far
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+class Supervisor:
+    def __init__(self, app, sock: socket.socket, workers: int, graceful_timeout: float):
+        self.app = app
+        self.sock = sock
+        self.size = workers
+        self.graceful_timeout = graceful_timeout
+        self.slots: Dict[int, int] = {}  # pid -> slot
+        self.retiring: Set[int] = set()  # pids stopped on purpose, not to be replaced
+        self.exited: List[int] = []  # slots whose worker died
+        self.last_spawn: Dict[int, float] = {}
+        self.stopping = False
+        self.restart_requested = False
+
+    def spawn(self, slot: int) -> int:
+        self.last_spawn[slot] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.run_worker(slot)
+            except BaseException:
+                import traceback
+
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.slots[pid] = slot
+        return pid
+
+    def run_worker(self, slot: int):
+        import uvicorn
+        from .config import settings
+
+        # uvicorn installs its own SIGTERM/SIGINT handlers; restarts are the parent's business
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        settings.PRIMARY_WORKER = slot == 0
+        loop, http = event_loop_options()
+        config = uvicorn.Config(self.app, loop=loop, http=http, lifespan="on",
+                                timeout_graceful_shutdown=int(self.graceful_timeout))
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def pid_of(self, slot: int) -> Optional[int]:
+        return next((pid for pid, s in self.slots.items() if s == slot), None)
+
+    def reap(self, block: bool = False):
+        """Collect exited workers; unexpected exits are queued in ``exited``"""
+        while self.slots:
+            try:
+                pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            slot = self.slots.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+            elif slot is not None:
+                self.exited.append(slot)
+            block = False
+
+    def wait_for(self, pid: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while pid in self.slots and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(POLL_INTERVAL / 4)
+        return pid not in self.slots
+
+    def terminate(self, pid: int):
+        self.retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        if not self.wait_for(pid, self.graceful_timeout + 5):
+            os.kill(pid, signal.SIGKILL)
+            self.wait_for(pid, 5)
+
+    def rolling_restart(self):
+        for slot in range(self.size):
+            old = self.pid_of(slot)
+            if slot == 0:
+                # The primary runs the cluster-wide jobs: never run two at once
+                if old is not None:
+                    self.terminate(old)
+                self.spawn(slot)
+            else:
+                self.spawn(slot)
+                if old is not None:
+                    self.terminate(old)
+            if self.stopping:
+                return
+
+    def shutdown(self):
+        self.retiring.update(self.slots)
+        for pid in list(self.slots):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.slots and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(POLL_INTERVAL / 4)
+        for pid in list(self.slots):
+            os.kill(pid, signal.SIGKILL)
+        self.reap(block=True)
+
+    def run(self):
+        def stop(signum, frame):
+            self.stopping = True
+
+        def restart(signum, frame):
+            self.restart_requested = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, restart)
+
+        for slot in range(self.size):
+            self.spawn(slot)
+        print(f"Serving on {self.sock.getsockname()} with {self.size} workers (pid {os.getpid()})")
+
+        while not self.stopping:
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            self.reap()
+            while self.exited and not self.stopping:
+                slot = self.exited.pop(0)
+                print(f"Worker {slot} exited; restarting")
+                time.sleep(max(0.0, self.last_spawn.get(slot, 0) + RESPAWN_DELAY - time.monotonic()))
+                self.spawn(slot)
+            time.sleep(POLL_INTERVAL)
+        self.shutdown()
+
+
+def main():
+    from .config import settings
+
+    parser = argparse.ArgumentParser(description="Run the badge API in pre-forked worker processes")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.WORKERS or available_cores())
+    parser.add_argument("--graceful-timeout", type=float, default=settings.GRACEFUL_TIMEOUT,
+                        help="seconds workers get to finish in-flight requests")
+    args = parser.parse_args()
+
+    app = preload()
+    sock = bind(args.host, args.port)
+    Supervisor(app, sock, max(args.workers, 1), args.graceful_timeout).run()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
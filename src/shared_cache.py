@@ -0,0 +1,172 @@
+"""Cache shared by all worker processes through a memory-mapped file.
+
+The file is a fixed-size open-addressing hash table of ``slots`` slots of
+``slot_size`` bytes each. A key hashes (blake2b, identical in every process)
+to a home slot. It can live in that slot or the next PROBE - 1 slots.
+
+Slot layout::
+
+    seq u32 | key hash u64 | expires f64 | key len u16 | value len u32 | key | value
+
+Reads take no lock. ``seq`` is a seqlock: writers make it odd before
+touching the slot and even again afterwards. A reader that sees an odd
+``seq``, or a ``seq`` that changed while it copied, treats the slot as a miss.
+Writers serialize per slot with an fcntl byte-range lock, so workers
+writing different slots never contend. When all probe slots hold live
+entries, the one closest to expiry is evicted.
+
+Values larger than a slot are not stored here; Cache keeps them in
+process memory instead.
+
+A file laid out for another slot count or size is replaced with a new one
+rather than resized, since older processes may still have it mapped.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+from typing import Optional, Tuple
+
+MAGIC = b"BADGESHM"
+FILE_HEADER = struct.Struct("<8sII")  # magic, slots, slot size
+SLOT_HEADER = struct.Struct("<IQdHI")  # seq, key hash, expires, key len, value len
+PROBE = 4
+READ_RETRIES = 3
+
+
+def key_hash(key: bytes) -> int:
+    # 0 marks an empty slot, so real hashes are never 0
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryCache:
+    def __init__(self, path: str, slots: int, slot_size: int):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.evictions = 0
+        self.expirations = 0
+        size = FILE_HEADER.size + slots * slot_size
+        self.fd = self._open(size)
+        self.map = mmap.mmap(self.fd, size)
+
+    def _open(self, size: int) -> int:
+        """Descriptor of the file at ``path``, laid out for this configuration"""
+        layout = FILE_HEADER.pack(MAGIC, self.slots, self.slot_size)
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino != os.stat(self.path).st_ino:
+                    # Replaced by another process while we waited for the lock
+                    os.close(fd)
+                    continue
+                header = os.pread(fd, FILE_HEADER.size, 0)
+                if not header:
+                    # Just created: nobody has mapped it yet
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, layout, 0)
+                elif header != layout:
+                    # Laid out by another configuration and possibly still mapped by the
+                    # processes using it. Resizing it under them would fault their reads,
+                    # so a new file takes its name and they keep the old one until they exit
+                    staged = f"{self.path}.{os.getpid()}.tmp"
+                    new = os.open(staged, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+                    os.ftruncate(new, size)
+                    os.pwrite(new, layout, 0)
+                    os.replace(staged, self.path)
+                    os.close(fd)
+                    return new
+            except BaseException:
+                os.close(fd)
+                raise
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+            return fd
+
+    def _offset(self, index: int) -> int:
+        return FILE_HEADER.size + index * self.slot_size
+
+    def _probe(self, hashed: int):
+        home = hashed % self.slots
+        for i in range(PROBE):
+            yield self._offset((home + i) % self.slots)
+
+    def _read(self, offset: int) -> Optional[Tuple[int, float, bytes, bytes]]:
+        """Consistent copy of one slot, or None if it is being written"""
+        buf = self.map
+        for _ in range(READ_RETRIES):
+            seq, hashed, expires, key_len, value_len = SLOT_HEADER.unpack_from(buf, offset)
+            if seq & 1:
+                continue
+            start = offset + SLOT_HEADER.size
+            key = buf[start:start + key_len]
+            value = buf[start + key_len:start + key_len + value_len]
+            if SLOT_HEADER.unpack_from(buf, offset)[0] == seq:
+                return hashed, expires, key, value
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        encoded = key.encode()
+        hashed = key_hash(encoded)
+        for offset in self._probe(hashed):
+            if struct.unpack_from("<Q", self.map, offset + 4)[0] != hashed:
+                continue
+            entry = self._read(offset)
+            if entry is None or entry[0] != hashed or entry[2] != encoded:
+                continue
+            if entry[1] < time.time():
+                self.expirations += 1
+                return None
+            return entry[3].decode()
+        return None
+
+    def set(self, key: str, value: str, ttl: int) -> bool:
+        """Store value; False if it doesn't fit in a slot"""
+        encoded, data = key.encode(), value.encode()
+        if SLOT_HEADER.size + len(encoded) + len(data) > self.slot_size:
+            return False
+        hashed = key_hash(encoded)
+        now = time.time()
+
+        # Prefer this key's own slot, then an empty or expired one, then the soonest to expire
+        target, target_rank = 0, (3, 0.0)
+        for offset in self._probe(hashed):
+            _, slot_hash, expires, key_len, _ = SLOT_HEADER.unpack_from(self.map, offset)
+            if slot_hash == hashed:
+                start = offset + SLOT_HEADER.size
+                if self.map[start:start + key_len] == encoded:
+                    target, target_rank = offset, (0, 0.0)
+                    break
+            rank = (1, 0.0) if slot_hash == 0 or expires < now else (2, expires)
+            if rank < target_rank:
+                target, target_rank = offset, rank
+        if target_rank[0] == 2:
+            self.evictions += 1
+
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, self.slot_size, target)
+        try:
+            seq = struct.unpack_from("<I", self.map, target)[0]
+            struct.pack_into("<I", self.map, target, seq | 1)
+            start = target + SLOT_HEADER.size
+            self.map[start:start + len(encoded)] = encoded
+            self.map[start + len(encoded):start + len(encoded) + len(data)] = data
+            SLOT_HEADER.pack_into(self.map, target, ((seq | 1) + 1) & 0xFFFFFFFF, hashed, now + ttl, len(encoded), len(data))
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, self.slot_size, target)
+        return True
+
+    def count(self) -> int:
+        """Live entries; scans every slot, so only for metrics"""
+        now = time.time()
+        live = 0
+        for index in range(self.slots):
+            _, hashed, expires, _, _ = SLOT_HEADER.unpack_from(self.map, self._offset(index))
+            if hashed and expires >= now:
+                live += 1
+        return live
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
@@ -0,0 +1,178 @@
+"""Durable snapshots of resolved metric values.
+
+Each snapshot holds a metric value, the URL it was derived from, that
+response's ETag and when it was fetched. Snapshots are bulk-loaded from
+SQLite at startup, so a restarted process has warm values before its first
+request. Writes are buffered and flushed in the background, so the request
+path never waits on disk.
+
+A snapshot is served as is for its TTL, which is learned from how often
+the value has changed (see adaptive_ttl). An older one is revalidated with
+If-None-Match against its URL. A 304 costs no GitHub rate limit and keeps
+the value.
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from .adaptive_ttl import DEFAULT_CLASS, CLASS_BOUNDS, change_rate, changes_between, choose_ttl, decay, prior
+from .config import settings
+from .metrics import CallbackFamily
+
+# Added after the table first shipped; added to older databases on load
+LATER_COLUMNS = (("changes", "REAL NOT NULL DEFAULT 0"), ("observed", "REAL NOT NULL DEFAULT 0"), ("ttl", "INTEGER"))
+
+
+class Snapshot:
+    __slots__ = ("value", "url", "etag", "fetched_at", "changes", "observed", "ttl")
+
+    def __init__(self, value: str, url: Optional[str], etag: Optional[str], fetched_at: float,
+                 changes: float = 0.0, observed: float = 0.0, ttl: Optional[int] = None):
+        self.value = value
+        self.url = url
+        self.etag = etag
+        self.fetched_at = fetched_at
+        # Rows from before TTLs were learned have nothing observed
+        self.changes, self.observed = (changes, observed) if observed else prior()
+        self.ttl = ttl or settings.CACHE_TTL
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.fetched_at < self.ttl
+
+    def observe(self, since: float, changes: float, limits: Tuple[int, int], now: float):
+        """Fold one observation window into the decayed change counts and re-pick the TTL"""
+        elapsed = max(now - since, 0.0)
+        weight = decay(elapsed)
+        self.changes = self.changes * weight + changes
+        self.observed = self.observed * weight + elapsed
+        self.ttl = choose_ttl(self.changes, self.observed, limits)
+
+    def describe(self) -> Dict[str, float]:
+        return {
+            "ttl": self.ttl,
+            "expires_in": round(self.fetched_at + self.ttl - time.time(), 1),
+            "changes_per_day": round(change_rate(self.changes, self.observed) * 86400, 3),
+            "observed_hours": round(self.observed / 3600, 2),
+        }
+
+
+class SnapshotStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Snapshot] = {}
+        self._dirty: Dict[str, Snapshot] = {}
+        self._writer: Optional[asyncio.Task] = None
+        self.loaded = 0
+
+    def connect(self):
+        import aiosqlite
+
+        return aiosqlite.connect(self.path)
+
+    async def _create_table(self, db):
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS metric_snapshots (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                url TEXT,
+                etag TEXT,
+                fetched_at REAL NOT NULL,
+                changes REAL NOT NULL DEFAULT 0,
+                observed REAL NOT NULL DEFAULT 0,
+                ttl INTEGER
+            )
+        ''')
+        cursor = await db.execute("PRAGMA table_info(metric_snapshots)")
+        columns = {row[1] for row in await cursor.fetchall()}
+        for name, definition in LATER_COLUMNS:
+            if name not in columns:
+                await db.execute(f"ALTER TABLE metric_snapshots ADD COLUMN {name} {definition}")
+
+    async def load(self):
+        """Drop expired rows and read the newest snapshots into memory, oldest first"""
+        if not self.path:
+            return
+        async with self.connect() as db:
+            await self._create_table(db)
+            await db.execute("DELETE FROM metric_snapshots WHERE fetched_at < ?",
+                             (time.time() - settings.SNAPSHOT_MAX_AGE,))
+            await db.commit()
+            cursor = await db.execute(
+                "SELECT * FROM (SELECT key, value, url, etag, fetched_at, changes, observed, ttl FROM metric_snapshots "
+                "ORDER BY fetched_at DESC LIMIT ?) ORDER BY fetched_at",
+                (settings.SNAPSHOT_MAX_ENTRIES,)
+            )
+            rows = await cursor.fetchall()
+        self.entries.update((row[0], Snapshot(*row[1:])) for row in rows)
+        self.loaded = len(rows)
+
+    def get(self, key: str) -> Optional[Snapshot]:
+        return self.entries.get(key)
+
+    def put(self, key: str, value: str, url: Optional[str] = None, etag: Optional[str] = None,
+            limits: Tuple[int, int] = CLASS_BOUNDS[DEFAULT_CLASS]):
+        """Store a fetched value; ``limits`` bound the TTL learned for it"""
+        now = time.time()
+        previous = self.entries.pop(key, None)
+        if len(self.entries) >= settings.SNAPSHOT_MAX_ENTRIES:
+            del self.entries[next(iter(self.entries))]
+        snapshot = self.entries[key] = Snapshot(value, url, etag, now)
+        if previous is None:
+            snapshot.ttl = choose_ttl(snapshot.changes, snapshot.observed, limits)
+        else:
+            snapshot.changes, snapshot.observed = previous.changes, previous.observed
+            snapshot.observe(previous.fetched_at, changes_between(previous.value, value), limits, now)
+        self._mark(key, snapshot)
+
+    def touch(self, key: str, limits: Tuple[int, int] = CLASS_BOUNDS[DEFAULT_CLASS]):
+        """The upstream confirmed the value (304); restart its TTL"""
+        snapshot = self.entries.get(key)
+        if snapshot is not None:
+            now = time.time()
+            snapshot.observe(snapshot.fetched_at, 0.0, limits, now)
+            snapshot.fetched_at = now
+            self._mark(key, snapshot)
+
+    def ttl_left(self, key: str) -> int:
+        """Seconds until the value under ``key`` goes stale; how long a render of it may be cached"""
+        snapshot = self.entries.get(key)
+        if snapshot is None:
+            return settings.CACHE_TTL
+        return max(int(snapshot.fetched_at + snapshot.ttl - time.time()), 1)
+
+    def _mark(self, key: str, snapshot: Snapshot):
+        if not self.path:
+            return
+        self._dirty[key] = snapshot
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while self._dirty:
+            await asyncio.sleep(settings.SNAPSHOT_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Snapshot flush failed: {e}")
+
+    async def flush(self):
+        if not self._dirty or not self.path:
+            return
+        dirty, self._dirty = self._dirty, {}
+        rows = [(key, s.value, s.url, s.etag, s.fetched_at, s.changes, s.observed, s.ttl) for key, s in dirty.items()]
+        async with self.connect() as db:
+            await self._create_table(db)
+            await db.executemany(
+                "INSERT OR REPLACE INTO metric_snapshots (key, value, url, etag, fetched_at, changes, observed, ttl) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            await db.commit()
+
+
+snapshots = SnapshotStore(settings.SNAPSHOT_PATH)
+
+CallbackFamily("badge_snapshot_entries", "Metric snapshots held in memory", "gauge", (),
+               lambda: {(): len(snapshots.entries)})
+CallbackFamily("badge_snapshot_pending_writes", "Snapshots waiting to be flushed to disk", "gauge", (),
+               lambda: {(): len(snapshots._dirty)})
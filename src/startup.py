@@ -0,0 +1,80 @@
+"""Startup timing: in-process phase timings and a per-module import report.
+
+Run ``python -m src.startup`` to print the slowest imports of ``src.main``;
+``--budget-ms`` exits non-zero when the total import time is over budget so
+CI can catch cold-start regressions.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# Phase name -> milliseconds, filled in as the app starts
+PHASES: Dict[str, float] = {}
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES[name] = round((time.perf_counter() - start) * 1000, 3)
+
+
+def import_report(module: str = "src.main") -> List[Dict]:
+    """Import ``module`` in a fresh interpreter with -X importtime.
+
+    Returns one row per imported module with self and cumulative times in
+    milliseconds, slowest cumulative first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time per module")
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="print rows as JSON")
+    parser.add_argument("--budget-ms", type=float, help="fail if total import time exceeds this")
+    args = parser.parse_args()
+
+    rows = import_report(args.module)
+    total = next(row["cumulative_ms"] for row in rows if row["module"] == args.module)
+    if args.json:
+        print(json.dumps({"total_ms": total, "modules": rows[:args.top]}, indent=2))
+    else:
+        print(f"{'cumulative':>12} {'self':>10}  module")
+        for row in rows[:args.top]:
+            print(f"{row['cumulative_ms']:>10.1f}ms {row['self_ms']:>8.1f}ms  {'  ' * row['depth']}{row['module']}")
+        print(f"\nimport {args.module}: {total:.1f}ms")
+
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"over budget: {total:.1f}ms > {args.budget_ms:.1f}ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
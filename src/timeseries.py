@@ -0,0 +1,343 @@
+"""Time series of numeric metric values.
+
+Every GitHub fetch of a numeric metric appends a sample, and a scheduler
+job resamples tracked series so they keep moving without badge traffic.
+Each (repo, metric) series has three fixed-size NumPy ring buffers of
+(timestamp, value) pairs:
+
+    raw     every sample          RAW_POINTS     (288)
+    hourly  last value per hour   HOURLY_POINTS  (168, one week)
+    daily   last value per day    DAILY_POINTS   (400, ~13 months)
+
+A series therefore takes (288 + 168 + 400) * 16 bytes, about 13.7 KB of
+buffers plus ~0.5 KB of object overhead, whatever its age. At most
+TIMESERIES_MAX_SERIES series are kept; the least recently updated is
+dropped first, so the store is bounded at roughly 14 KB * that limit
+(~140 MB at the default 10,000).
+
+Range queries read from the finest tier that still covers the start of the
+range, using searchsorted on the unrolled buffers.
+
+Series are kept where every worker reads them: in Redis when REDIS_URL is
+set, otherwise in a metric_series table of the snapshot database, one row
+of serialized buffers per series. Samples are queued and merged into the
+shared copy in the background, so they show up in sparklines after at most
+TIMESERIES_FLUSH_INTERVAL. Only with neither configured are the series
+held in process memory, per worker and lost on restart.
+"""
+import asyncio
+import struct
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+import numpy as np
+from .config import settings
+from .metrics import CallbackFamily
+
+if TYPE_CHECKING:
+    from .timeseries_redis import RedisSeries
+
+RAW_POINTS = 288
+HOURLY_POINTS = 168
+DAILY_POINTS = 400
+HOUR = 3600
+DAY = 86400
+
+# Metrics whose values are counts and can be charted
+NUMERIC_METRICS = frozenset({'stars', 'forks', 'watchers', 'open_issues', 'size', 'open_prs', 'contributors'})
+
+# Size and next slot of each tier, ahead of the buffers themselves
+HEADER = struct.Struct("<6I")
+
+
+class Ring:
+    """Fixed-capacity (timestamp, value) buffer; optionally one point per bucket"""
+
+    __slots__ = ("data", "size", "next", "bucket")
+
+    def __init__(self, capacity: int, bucket: int = 0):
+        self.data = np.zeros((capacity, 2), dtype=np.float64)
+        self.size = 0
+        self.next = 0
+        self.bucket = bucket
+
+    def add(self, ts: float, value: float):
+        if self.bucket and self.size:
+            last = (self.next - 1) % len(self.data)
+            if self.data[last, 0] // self.bucket == ts // self.bucket:
+                # Same bucket: the latest value wins
+                self.data[last] = (ts, value)
+                return
+        self.data[self.next] = (ts, value)
+        self.next = (self.next + 1) % len(self.data)
+        self.size = min(self.size + 1, len(self.data))
+
+    def ordered(self) -> np.ndarray:
+        if self.size < len(self.data):
+            return self.data[:self.size]
+        return np.concatenate((self.data[self.next:], self.data[:self.next]))
+
+    def oldest(self) -> Optional[float]:
+        if not self.size:
+            return None
+        return float(self.data[0 if self.size < len(self.data) else self.next, 0])
+
+
+class Series:
+    __slots__ = ("raw", "hourly", "daily")
+
+    def __init__(self):
+        self.raw = Ring(RAW_POINTS)
+        self.hourly = Ring(HOURLY_POINTS, HOUR)
+        self.daily = Ring(DAILY_POINTS, DAY)
+
+    def add(self, ts: float, value: float):
+        self.raw.add(ts, value)
+        self.hourly.add(ts, value)
+        self.daily.add(ts, value)
+
+    def range(self, since: float, until: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Timestamps and values in [since, until] from the finest covering tier"""
+        for ring in (self.raw, self.hourly, self.daily):
+            oldest = ring.oldest()
+            if oldest is not None and oldest <= since:
+                break
+        else:
+            ring = self.daily
+        points = ring.ordered()
+        start = np.searchsorted(points[:, 0], since, side="left")
+        end = len(points) if until is None else np.searchsorted(points[:, 0], until, side="right")
+        return points[start:end, 0], points[start:end, 1]
+
+    def value_at(self, ts: float) -> Optional[float]:
+        """Last value recorded at or before ts"""
+        for ring in (self.raw, self.hourly, self.daily):
+            points = ring.ordered()
+            if len(points) and points[0, 0] <= ts:
+                index = np.searchsorted(points[:, 0], ts, side="right") - 1
+                return float(points[index, 1])
+        return None
+
+    def latest(self) -> Optional[float]:
+        if not self.raw.size:
+            return None
+        return float(self.raw.data[(self.raw.next - 1) % RAW_POINTS, 1])
+
+    def last_seen(self) -> float:
+        """Timestamp of the newest sample, 0 for an empty series"""
+        return float(self.raw.data[(self.raw.next - 1) % RAW_POINTS, 0])
+
+    def sparkline(self, days: int, points: int = 30) -> np.ndarray:
+        """Values over the last ``days`` resampled to ``points`` evenly spaced steps"""
+        now = time.time()
+        ts, values = self.range(now - days * DAY)
+        if len(ts) == 0:
+            return np.empty(0)
+        grid = np.linspace(max(ts[0], now - days * DAY), now, points)
+        # Step interpolation: each grid point takes the last value at or before it
+        return values[np.clip(np.searchsorted(ts, grid, side="right") - 1, 0, len(values) - 1)]
+
+    def delta(self, days: int) -> Optional[float]:
+        """Change over the last ``days``, or since the first sample if the series is younger"""
+        since = time.time() - days * DAY
+        before = self.value_at(since)
+        if before is None:
+            # Younger than the window: measure from the first sample
+            values = self.range(since)[1]
+            before = float(values[0]) if len(values) else None
+        latest = self.latest()
+        if before is None or latest is None:
+            return None
+        return latest - before
+
+    def to_bytes(self) -> bytes:
+        rings = (self.raw, self.hourly, self.daily)
+        header = HEADER.pack(*(field for ring in rings for field in (ring.size, ring.next)))
+        return header + b"".join(ring.data.tobytes() for ring in rings)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Series":
+        series = cls()
+        fields = HEADER.unpack_from(data)
+        offset = HEADER.size
+        for i, ring in enumerate((series.raw, series.hourly, series.daily)):
+            ring.size, ring.next = fields[2 * i], fields[2 * i + 1]
+            count = ring.data.size
+            ring.data = np.frombuffer(data, dtype=np.float64, count=count, offset=offset).reshape(-1, 2).copy()
+            offset += count * 8
+        return series
+
+    def merge(self, samples: List[Tuple[float, float]]):
+        """Append queued samples, skipping any older than what another worker already added"""
+        for ts, value in samples:
+            if ts >= self.last_seen():
+                self.add(ts, value)
+
+
+class TimeSeriesStore:
+    def __init__(self, max_series: int):
+        self.max_series = max_series
+        self.series: OrderedDict[Tuple[str, str], Series] = OrderedDict()
+
+    def record(self, repo: str, metric: str, value: float, ts: Optional[float] = None):
+        key = (repo, metric)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = Series()
+            if len(self.series) > self.max_series:
+                self.series.popitem(last=False)
+        self.series.move_to_end(key)
+        series.add(time.time() if ts is None else ts, value)
+
+    def get(self, repo: str, metric: str) -> Optional[Series]:
+        return self.series.get((repo, metric))
+
+    def sparkline(self, repo: str, metric: str, days: int, points: int = 30) -> np.ndarray:
+        series = self.get(repo, metric)
+        return np.empty(0) if series is None else series.sparkline(days, points)
+
+    def delta(self, repo: str, metric: str, days: int) -> Optional[float]:
+        series = self.get(repo, metric)
+        return None if series is None else series.delta(days)
+
+    def stalest(self, limit: int) -> List[Tuple[str, str]]:
+        """Keys of the series that have gone longest without a sample"""
+        last_seen = [(series.last_seen(), key) for key, series in self.series.items()]
+        return [key for _, key in sorted(last_seen)[:limit]]
+
+
+class SQLiteSeries:
+    """Series shared through the snapshot database; one row of serialized buffers each"""
+
+    def __init__(self, path: str, max_series: int):
+        self.path = path
+        self.max_series = max_series
+
+    def connect(self):
+        import aiosqlite
+
+        return aiosqlite.connect(self.path)
+
+    async def _create_table(self, db):
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS metric_series (
+                repo TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (repo, metric)
+            )
+        ''')
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_metric_series_updated ON metric_series(updated_at)")
+
+    async def write(self, samples: Dict[Tuple[str, str], List[Tuple[float, float]]]):
+        """Merge queued samples into the stored series"""
+        async with self.connect() as db:
+            # Take the write lock before reading, so workers flushing at once don't drop each other's samples
+            await db.execute("BEGIN IMMEDIATE")
+            await self._create_table(db)
+            for (repo, metric), points in samples.items():
+                cursor = await db.execute("SELECT data FROM metric_series WHERE repo = ? AND metric = ?", (repo, metric))
+                row = await cursor.fetchone()
+                series = Series() if row is None else Series.from_bytes(row[0])
+                series.merge(points)
+                await db.execute(
+                    "INSERT OR REPLACE INTO metric_series (repo, metric, updated_at, data) VALUES (?, ?, ?, ?)",
+                    (repo, metric, series.last_seen(), series.to_bytes())
+                )
+            await db.execute(
+                "DELETE FROM metric_series WHERE rowid IN "
+                "(SELECT rowid FROM metric_series ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_series,)
+            )
+            await db.commit()
+
+    async def get(self, repo: str, metric: str) -> Optional[Series]:
+        async with self.connect() as db:
+            await self._create_table(db)
+            cursor = await db.execute("SELECT data FROM metric_series WHERE repo = ? AND metric = ?", (repo, metric))
+            row = await cursor.fetchone()
+        return None if row is None else Series.from_bytes(row[0])
+
+    async def stalest(self, limit: int) -> List[Tuple[str, str]]:
+        async with self.connect() as db:
+            await self._create_table(db)
+            cursor = await db.execute("SELECT repo, metric FROM metric_series ORDER BY updated_at LIMIT ?", (limit,))
+            rows = await cursor.fetchall()
+        return [(repo, metric) for repo, metric in rows]
+
+
+store = TimeSeriesStore(settings.TIMESERIES_MAX_SERIES)
+_pending: Dict[Tuple[str, str], List[Tuple[float, float]]] = {}
+_writer: Optional[asyncio.Task] = None
+
+# Every worker reads and writes the same series; in process memory only when nothing is shared
+shared: Optional[Union[SQLiteSeries, "RedisSeries"]]
+if settings.REDIS_URL:
+    from .timeseries_redis import RedisSeries
+
+    shared = RedisSeries(settings.REDIS_URL, settings.TIMESERIES_MAX_SERIES)
+elif settings.SNAPSHOT_PATH:
+    shared = SQLiteSeries(settings.SNAPSHOT_PATH, settings.TIMESERIES_MAX_SERIES)
+else:
+    shared = None
+
+
+def record_metric(repo: str, metric: str, value: str):
+    global _writer
+    if metric not in NUMERIC_METRICS:
+        return
+    try:
+        sample = float(value)
+    except ValueError:
+        return
+    if shared is None:
+        store.record(repo, metric, sample)
+        return
+    _pending.setdefault((repo, metric), []).append((time.time(), sample))
+    if _writer is None or _writer.done():
+        _writer = asyncio.get_running_loop().create_task(_write_loop())
+
+
+async def _write_loop():
+    while _pending:
+        await asyncio.sleep(settings.TIMESERIES_FLUSH_INTERVAL)
+        try:
+            await flush()
+        except Exception as e:
+            print(f"Time series flush failed: {e}")
+
+
+async def flush():
+    """Merge every queued sample into the shared series"""
+    global _pending
+    if not _pending or shared is None:
+        return
+    batch, _pending = _pending, {}
+    await shared.write(batch)
+
+
+async def get_series(repo: str, metric: str) -> Optional[Series]:
+    if shared is None:
+        return store.get(repo, metric)
+    return await shared.get(repo, metric)
+
+
+async def sparkline(repo: str, metric: str, days: int, points: int = 30) -> np.ndarray:
+    series = await get_series(repo, metric)
+    return np.empty(0) if series is None else series.sparkline(days, points)
+
+
+async def delta(repo: str, metric: str, days: int) -> Optional[float]:
+    series = await get_series(repo, metric)
+    return None if series is None else series.delta(days)
+
+
+async def stalest(limit: int) -> List[Tuple[str, str]]:
+    if shared is None:
+        return store.stalest(limit)
+    return await shared.stalest(limit)
+
+
+CallbackFamily("badge_timeseries_pending_series", "Series with samples waiting to be written", "gauge", (),
+               lambda: {(): len(_pending)})
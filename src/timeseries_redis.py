@@ -0,0 +1,69 @@
+"""Time series shared through Redis.
+
+Used instead of the snapshot database when REDIS_URL is set. Each series is
+one string holding its serialized ring buffers, and a sorted set scores
+every series by its newest sample: the scheduler resamples from the low
+end and, past TIMESERIES_MAX_SERIES, series are dropped from it too.
+
+Workers merge their queued samples with WATCH/MULTI, retrying when another
+worker wrote the same series in between.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from .timeseries import Series
+
+PREFIX = "timeseries"
+INDEX = f"{PREFIX}:updated"
+
+
+def series_key(member: str) -> str:
+    return f"{PREFIX}:{member}"
+
+
+class RedisSeries:
+    def __init__(self, url: str, max_series: int):
+        import redis.asyncio as redis
+
+        # Untyped: replies are bytes, the stubs allow for decoded clients too
+        self.redis: Any = redis.from_url(url)
+        self.max_series = max_series
+
+    async def write(self, samples: Dict[Tuple[str, str], List[Tuple[float, float]]]):
+        """Merge queued samples into the stored series"""
+        from redis.exceptions import WatchError
+
+        for (repo, metric), points in samples.items():
+            member = f"{repo}/{metric}"
+            key = series_key(member)
+            async with self.redis.pipeline() as pipe:
+                while True:
+                    try:
+                        await pipe.watch(key)
+                        data = await pipe.get(key)
+                        series = Series() if data is None else Series.from_bytes(data)
+                        series.merge(points)
+                        pipe.multi()
+                        pipe.set(key, series.to_bytes())
+                        pipe.zadd(INDEX, {member: series.last_seen()})
+                        await pipe.execute()
+                        break
+                    except WatchError:
+                        continue
+        excess = await self.redis.zcard(INDEX) - self.max_series
+        if excess > 0:
+            dropped = await self.redis.zrange(INDEX, 0, excess - 1)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(*(series_key(member.decode()) for member in dropped))
+            pipe.zrem(INDEX, *dropped)
+            await pipe.execute()
+
+    async def get(self, repo: str, metric: str) -> Optional[Series]:
+        data = await self.redis.get(series_key(f"{repo}/{metric}"))
+        return None if data is None else Series.from_bytes(data)
+
+    async def stalest(self, limit: int) -> List[Tuple[str, str]]:
+        keys = []
+        for member in await self.redis.zrange(INDEX, 0, limit - 1):
+            # Repos hold one slash and metrics none
+            repo, metric = member.decode().rsplit("/", 1)
+            keys.append((repo, metric))
+        return keys
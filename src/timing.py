@@ -0,0 +1,95 @@
+"""Per-request phase timing.
+
+The HTTP middleware starts a RequestTimer for each request. Functions
+decorated with ``timed(phase)`` add their duration to the current request's
+timer, and do nothing outside a request. Time spent in one phase is summed
+across calls, so a compose request reports a single ``render`` total.
+Phases can nest: ``provider`` includes the cache lookups the provider makes
+itself.
+"""
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, List, Optional
+from .config import settings
+
+
+class RequestTimer:
+    __slots__ = ("start", "phases")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+# Most recent requests over SLOW_REQUEST_MS, oldest first
+slow_requests: Deque[Dict[str, Any]] = deque(maxlen=settings.SLOW_REQUEST_LOG_SIZE)
+
+
+def start_request() -> RequestTimer:
+    timer = RequestTimer()
+    _current.set(timer)
+    return timer
+
+
+def timed(phase: str) -> Callable:
+    """Decorator recording a sync or async function's duration as ``phase``"""
+
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                timer = _current.get()
+                if timer is None:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    timer.add(phase, time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timer = _current.get()
+            if timer is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer.add(phase, time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+def record_if_slow(timer: RequestTimer, method: str, path: str, route: str, status: int, total: float):
+    if total * 1000 < settings.SLOW_REQUEST_MS:
+        return
+    slow_requests.append({
+        "timestamp": time.time(),
+        "method": method,
+        "path": path,
+        "route": route,
+        "status": status,
+        "total_ms": round(total * 1000, 2),
+        "phases_ms": {name: round(seconds * 1000, 2) for name, seconds in timer.phases.items()},
+    })
+
+
+def slow_request_log() -> List[Dict[str, Any]]:
+    """Slow requests, most recent first"""
+    return list(reversed(slow_requests))
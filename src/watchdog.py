@@ -0,0 +1,198 @@
+"""Detector for synchronous work holding the event loop.
+
+Opt-in with WATCHDOG_MS. The loop schedules a heartbeat callback every
+quarter of the threshold, and a daemon thread checks it just as often.
+When the heartbeat is older than the threshold, the thread reads the loop
+thread's stack from ``sys._current_frames()`` while the loop is still
+stuck. Once the loop runs again, the heartbeat measures how late it was.
+Stalls of at least WATCHDOG_MS are recorded with the captured stack, to
+within a quarter of the threshold. Shorter ones are dropped.
+
+Each stall is attributed from its stack:
+
+- ``route``: the path of the endpoint the stack runs through
+- ``component``: the innermost plugin (``plugin:system``), provider
+  (``provider:pypi``) or ``dashboard`` frame
+- ``site``: the innermost frame in this codebase, which is where to look
+
+Stalls are aggregated per (site, route, component). The WATCHDOG_MAX_SITES
+most recently seen groups are kept, along with the last WATCHDOG_RECENT
+stalls. Between stalls the cost is a timer callback and a thread wakeup per
+check, and stacks are only walked while the loop is blocked.
+"""
+import asyncio
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+from .config import settings
+from .metrics import Family
+
+MAX_DEPTH = 64
+SOURCE_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+PROVIDERS_DIR = os.path.join(SOURCE_ROOT, "providers", "")
+DASHBOARD_DIR = os.path.join(SOURCE_ROOT, "dashboard", "")
+
+STALLS = Family("badge_event_loop_stalls_total", "Event loop stalls over WATCHDOG_MS", "counter", ("kind",))
+
+# (label, filename, function code) innermost first
+Frames = List[Tuple[str, str, Any]]
+
+
+def capture(frame, limit: int = MAX_DEPTH) -> Frames:
+    frames: Frames = []
+    while frame is not None and len(frames) < limit:
+        code = frame.f_code
+        name = getattr(code, "co_qualname", code.co_name)
+        frames.append((f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})", code.co_filename, code))
+        frame = frame.f_back
+    return frames
+
+
+def plugin_dir() -> str:
+    from .plugins import PLUGIN_DIR
+
+    return os.path.join(os.path.abspath(PLUGIN_DIR), "")
+
+
+def attribute(frames: Frames, routes: Dict[Any, str], plugins: str) -> Dict[str, Optional[str]]:
+    """Route, component and site of a stack captured innermost first"""
+    route = component = site = None
+    for label, filename, code in frames:
+        path = os.path.abspath(filename)
+        if site is None and (path.startswith(SOURCE_ROOT) or path.startswith(plugins)) and path != os.path.abspath(__file__):
+            site = label
+        if component is None:
+            if path.startswith(plugins):
+                component = f"plugin:{os.path.splitext(os.path.basename(path))[0]}"
+            elif path.startswith(PROVIDERS_DIR):
+                component = f"provider:{os.path.splitext(os.path.basename(path))[0]}"
+            elif path.startswith(DASHBOARD_DIR):
+                component = "dashboard"
+        if code in routes:
+            route = routes[code]
+    return {"route": route, "component": component, "site": site or (frames[0][0] if frames else None)}
+
+
+def route_codes(routes: Iterable[Any]) -> Dict[Any, str]:
+    """Code object of each endpoint (under its decorators) -> route path"""
+    codes = {}
+    for route in routes:
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            # Routers added with include_router
+            codes.update(route_codes(included.routes))
+            continue
+        endpoint = getattr(route, "endpoint", None)
+        code = getattr(inspect.unwrap(endpoint), "__code__", None) if endpoint is not None else None
+        if code is not None:
+            codes[code] = route.path
+    return codes
+
+
+class LoopWatchdog:
+    def __init__(self, threshold_ms: float):
+        self.threshold = threshold_ms / 1000
+        self.interval = self.threshold / 4
+        self.stalls = 0
+        self.sites: OrderedDict[Tuple, Dict[str, Any]] = OrderedDict()
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=settings.WATCHDOG_RECENT)
+        self.routes: Dict[Any, str] = {}
+        self.plugins = ""
+        self._beat = 0.0
+        self._beats = 0
+        self._captured: Optional[Tuple[int, Frames]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, routes: Iterable[Any] = ()):
+        """Start watching the running loop"""
+        if self._thread is not None:
+            return
+        # Resolved up front: importing during a stall's report would itself stall the loop
+        self.routes = route_codes(routes)
+        self.plugins = plugin_dir()
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._beat = time.monotonic()
+        self._handle = self._loop.call_later(self.interval, self._heartbeat)
+        self._thread = threading.Thread(target=self._watch, args=(threading.get_ident(),),
+                                        name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        late = now - self._beat - self.interval
+        if late >= self.threshold:
+            captured = self._captured
+            # Only a stack taken during this stall belongs to it
+            frames = captured[1] if captured is not None and captured[0] == self._beats else []
+            self.record(late, frames)
+        self._captured = None
+        self._beats += 1
+        self._beat = now
+        if self._loop is not None:
+            self._handle = self._loop.call_later(self.interval, self._heartbeat)
+
+    def _watch(self, loop_thread: int):
+        while not self._stop.wait(self.interval):
+            beats = self._beats
+            if self._captured is None and time.monotonic() - self._beat >= self.threshold:
+                frame = sys._current_frames().get(loop_thread)
+                frames = capture(frame) if frame is not None else []
+                del frame
+                # The loop may have moved on while the stack was walked
+                if self._beats == beats:
+                    self._captured = (beats, frames)
+
+    def record(self, seconds: float, frames: Frames):
+        where = attribute(frames, self.routes, self.plugins) if frames else {"route": None, "component": None, "site": None}
+        kind = (where["component"] or "").split(":")[0] or ("route" if where["route"] else "unattributed")
+        STALLS.labels(kind).inc()
+        self.stalls += 1
+        blocked_ms = round(seconds * 1000, 1)
+        key = (where["site"], where["route"], where["component"])
+        group = self.sites.pop(key, None)
+        if group is None:
+            group = {**where, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                     "stack": [label for label, _, _ in reversed(frames)]}
+            if len(self.sites) >= settings.WATCHDOG_MAX_SITES:
+                self.sites.popitem(last=False)
+        group["count"] += 1
+        group["total_ms"] = round(group["total_ms"] + blocked_ms, 1)
+        group["max_ms"] = max(group["max_ms"], blocked_ms)
+        group["last_seen"] = time.time()
+        self.sites[key] = group
+        self.recent.append({"timestamp": time.time(), "blocked_ms": blocked_ms, **where})
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "sites": sorted(self.sites.values(), key=lambda g: g["total_ms"], reverse=True),
+            "recent": list(reversed(self.recent)),
+        }
+
+
+watchdog = LoopWatchdog(settings.WATCHDOG_MS) if settings.WATCHDOG_MS > 0 else None
+
+
+def watchdog_report() -> Dict[str, Any]:
+    if watchdog is None:
+        return {"enabled": False, "threshold_ms": 0, "stalls": 0, "sites": [], "recent": []}
+    return watchdog.report()
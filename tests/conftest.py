@@ -0,0 +1,16 @@
+import httpx
+import pytest_asyncio
+
+from src import http_client
+
+
+@pytest_asyncio.fixture
+async def upstream():
+    """Serve outgoing HTTP from ``handler`` for the test: ``upstream(handler)``"""
+
+    def route(handler):
+        http_client.use_transport(httpx.MockTransport(handler))
+
+    yield route
+    await http_client.close_client()
+    http_client.use_transport(None)
@@ -0,0 +1,63 @@
+import asyncio
+import sqlite3
+
+from src import adaptive_ttl, snapshots as snapshot_module
+from src.adaptive_ttl import bounds, changes_between, choose_ttl
+from src.config import settings
+from src.snapshots import SnapshotStore
+
+
+def test_ttl_starts_at_cache_ttl_within_class_bounds():
+    assert choose_ttl(0, 0, bounds("stars")) == settings.CACHE_TTL
+    assert choose_ttl(0, 0, bounds("license")) == bounds("license")[0]
+    assert choose_ttl(0, 0, bounds("ci_status")) == settings.CACHE_TTL
+
+
+def test_ttl_follows_observed_changes(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(snapshot_module.time, "time", lambda: now[0])
+    store = SnapshotStore("")
+
+    # A license confirmed unchanged for a few weeks drifts up to the class maximum
+    for _ in range(40):
+        store.put("github:a/b/license", "MIT", limits=bounds("license"))
+        now[0] += 12 * 3600
+    assert store.get("github:a/b/license").ttl == bounds("license")[1]
+
+    # Stars gaining ~50 an hour stay at the class minimum
+    for i in range(20):
+        store.put("github:a/b/stars", str(1000 + 50 * i), limits=bounds("stars"))
+        now[0] += 3600
+    stars = store.get("github:a/b/stars")
+    assert stars.ttl == bounds("stars")[0]
+    assert stars.describe()["changes_per_day"] > 1000
+
+
+def test_numeric_changes_count_the_step():
+    assert changes_between("10", "14") == 4
+    assert changes_between("v1.0", "v1.1") == 1
+    assert changes_between("MIT", "MIT") == 0
+
+
+def test_learned_ttls_survive_a_restart_and_old_tables_migrate(tmp_path):
+    path = str(tmp_path / "snapshots.db")
+    with sqlite3.connect(path) as db:
+        # The table as it shipped before TTLs were learned
+        db.execute("CREATE TABLE metric_snapshots (key TEXT PRIMARY KEY, value TEXT NOT NULL, url TEXT, "
+                   "etag TEXT, fetched_at REAL NOT NULL)")
+        db.execute("INSERT INTO metric_snapshots VALUES ('github:old/row/stars', '3', NULL, NULL, 9e12)")
+
+    async def scenario():
+        store = SnapshotStore(path)
+        await store.load()
+        old = store.get("github:old/row/stars")
+        store.put("github:a/b/license", "MIT", limits=bounds("license"))
+        await store.flush()
+        restarted = SnapshotStore(path)
+        await restarted.load()
+        return old, restarted.get("github:a/b/license")
+
+    old, license = asyncio.run(scenario())
+    assert old.ttl == settings.CACHE_TTL and (old.changes, old.observed) == adaptive_ttl.prior()
+    assert license.ttl == bounds("license")[0]
+    assert adaptive_ttl.metric_class("license") == "static"
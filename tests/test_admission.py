@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.admission import AdmissionController, admission
+from src.negative_cache import OVERLOADED, MetricUnavailable
+from src.providers import github
+from src.snapshots import SnapshotStore
+
+
+def test_probe_measures_a_blocked_loop():
+    controller = AdmissionController()
+
+    async def scenario():
+        controller.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)  # a handler blocking the loop
+        await asyncio.sleep(0.15)
+        await controller.stop()
+
+    asyncio.run(scenario())
+    assert controller.lag >= 0.15
+    assert controller.overloaded
+
+
+def test_overload_sheds_new_work_only():
+    controller = AdmissionController()
+    controller.enter_upstream("github")
+    controller.exit_upstream()
+    controller.lag = 1.0
+    with pytest.raises(MetricUnavailable) as raised:
+        controller.enter_upstream("github")
+    assert raised.value.category == OVERLOADED
+    assert controller.inflight == 0
+    assert not controller.admit_websocket()
+    assert controller.defer_analytics(queued=0)
+
+
+def test_stale_values_and_cache_hits_are_served_while_overloaded(monkeypatch):
+    store = SnapshotStore("")
+    store.put("github:shed/repo/stars", "41")
+    store.get("github:shed/repo/stars").fetched_at -= 10 ** 6
+    monkeypatch.setattr(github, "snapshots", store)
+    monkeypatch.setattr(admission, "inflight", 10 ** 6)
+
+    # The stale snapshot stands in for the refused upstream call
+    assert asyncio.run(github.get_github_metric("shed", "repo", "stars")) == "41"
+
+    from src.main import app
+    client = TestClient(app)
+    miss = client.get("/v2/badge/github/shed/other/stars")
+    assert "busy" in miss.text and miss.headers["Cache-Control"] == "no-cache"
+    assert client.get("/v2/badge/github/shed/other/stars?format=json").status_code == 503
+
+    # Badges that need no upstream call are unaffected
+    assert "passing" in client.get("/v2/badge/custom?label=build&value=passing").text
@@ -0,0 +1,91 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from src import analytics
+
+RENDERS = [
+    ("github", "a/b", "stars", "2024-06-01 09:15:00", None),
+    ("github", "a/b", "stars", "2024-06-01 10:05:00", None),
+    ("github", "a/b", "forks", "2024-06-01 10:45:00", None),
+    ("github", "c/d", "stars", "2024-06-02 08:00:00", None),
+    ("pypi", "requests", "version", "2024-06-03 12:00:00", None),
+]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "DB_PATH", str(tmp_path / "analytics.db"))
+    monkeypatch.setattr(analytics, "_db_ready", False)
+    monkeypatch.setattr(analytics, "_redis", None)
+    # Renders queued by other tests would be flushed into this database
+    analytics._pending.clear()
+    analytics._pending.extend(RENDERS)
+
+
+def collect(lines):
+    async def read():
+        return "".join([line async for line in lines])
+
+    return asyncio.run(read())
+
+
+def test_range_queries_roll_up_per_bucket_and_column(database):
+    per_day = asyncio.run(analytics.query_rollups({"start": "2024-06-01", "end": "2024-06-03"}, "day"))
+    assert per_day == [{"bucket": "2024-06-01", "count": 3}, {"bucket": "2024-06-02", "count": 1}]
+
+    per_repo = asyncio.run(analytics.query_rollups({"metric": "stars"}, "day", "identifier"))
+    assert per_repo == [{"bucket": "2024-06-01", "identifier": "a/b", "count": 2},
+                        {"bucket": "2024-06-02", "identifier": "c/d", "count": 1}]
+
+    hourly = asyncio.run(analytics.query_rollups({"badge_type": "github", "identifier": "a/b"}, "hour", limit=1))
+    assert hourly == [{"bucket": "2024-06-01 09:00", "count": 1}]
+
+    with pytest.raises(ValueError):
+        analytics.export({}, "ndjson", "fortnight")
+
+
+def test_range_queries_need_the_admin_key(database, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from src.config import settings
+    from src.main import app
+
+    client = TestClient(app)
+    url = "/api/analytics/query?metric=stars&group_by=identifier"
+    assert client.get(url).status_code == 404
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "secret")
+    assert client.get(url).status_code == 403
+    rows = client.get(url, headers={"X-Admin-Key": "secret"}).json()["rows"]
+    assert {row["identifier"] for row in rows} == {"a/b", "c/d"}
+
+
+def test_export_streams_every_render_in_chunks(database, monkeypatch):
+    monkeypatch.setattr(analytics.settings, "ANALYTICS_EXPORT_CHUNK", 2)
+    lines = collect(analytics.export({"start": "2024-06-01T10:00:00Z"}, "ndjson"))
+    rows = [json.loads(line) for line in lines.splitlines()]
+    assert [r["timestamp"] for r in rows] == ["2024-06-01 10:05:00", "2024-06-01 10:45:00",
+                                              "2024-06-02 08:00:00", "2024-06-03 12:00:00"]
+    assert rows[0] == {"timestamp": "2024-06-01 10:05:00", "type": "github", "identifier": "a/b", "metric": "stars"}
+
+    table = list(csv.reader(io.StringIO(collect(analytics.export({}, "csv", "day", "metric")))))
+    assert table[0] == ["bucket", "metric", "count"]
+    assert table[1:3] == [["2024-06-01", "forks", "1"], ["2024-06-01", "stars", "2"]]
+
+
+def test_range_filters_use_the_indexes(database):
+    async def plans():
+        await analytics.init_db()
+        async with analytics.connect() as db:
+            found = []
+            for filters in ({"start": "2024-06-02"}, {"identifier": "a/b", "badge_type": "github"}, {"metric": "stars"}):
+                where, params = analytics.render_filter(**filters)
+                cursor = await db.execute(f"EXPLAIN QUERY PLAN SELECT * FROM badge_renders{where}", params)
+                found.append(" ".join(row[-1] for row in await cursor.fetchall()))
+            return found
+
+    for plan in asyncio.run(plans()):
+        assert "USING INDEX" in plan
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from src.analytics_redis import RedisAnalytics, past_days
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # Lua scripting in fakeredis
+
+
+def backend():
+    analytics = RedisAnalytics("redis://localhost:6379")
+    analytics.redis = fakeredis.aioredis.FakeRedis()
+    analytics.sketch = (4, 256, 5)
+    return analytics
+
+
+def render(identifier, metric, referrer=None, badge_type="github", day=None):
+    day = day or past_days(1)[0]
+    return (badge_type, identifier, metric, f"{day} 12:00:00", referrer)
+
+
+def test_flush_is_one_round_trip_and_summary_is_cluster_wide():
+    analytics = backend()
+    yesterday = past_days(2)[1]
+    renders = [render(f"o/r{i % 40}", "stars", referrer=f"site{i % 3}.example") for i in range(200)]
+    renders += [render("o/r0", "forks", day=yesterday), render("label", "1.0", badge_type="custom")]
+
+    pipelines = []
+    pipeline = analytics.redis.pipeline
+
+    def counted(**kwargs):
+        pipelines.append(pipeline(**kwargs))
+        return pipelines[-1]
+
+    analytics.redis.pipeline = counted
+
+    async def scenario():
+        await analytics.write(renders)
+        writes = len(pipelines)
+        return writes, await analytics.summary()
+
+    writes, summary = asyncio.run(scenario())
+    assert writes == 1
+    assert summary["total_renders"] == 202
+    assert summary["renders_by_day"][yesterday] == 1
+    assert summary["unique_repos"] == {"1d": 40, "7d": 40, "30d": 40}
+    assert summary["unique_referrers"]["1d"] == 3
+    assert summary["popular_metrics"][0] == {"metric": "stars", "count": 200}
+    assert summary["popular_badges"][0]["count"] == 5
+
+
+def test_top_k_is_bounded_and_keeps_heavy_hitters():
+    analytics = backend()
+    # 300 one-off badges, then a popular one arriving late
+    renders = [render(f"tail/r{i}", "stars") for i in range(300)] + [render("hot/repo", "stars")] * 50
+
+    async def scenario():
+        for start in range(0, len(renders), 25):
+            await analytics.write(renders[start:start + 25])
+        return await analytics.redis.zcard("analytics:top:badges"), await analytics.summary()
+
+    size, summary = asyncio.run(scenario())
+    assert size == 5
+    assert summary["popular_badges"][0]["badge"] == "github:hot/repo:stars"
+    assert summary["popular_badges"][0]["count"] >= 50
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from src.commit_activity import CommitActivity, day_of
+from src.providers import github
+
+
+def commit(sha, timestamp):
+    return {"sha": sha, "commit": {"committer": {"date": timestamp}}}
+
+
+def test_rolling_windows():
+    activity = CommitActivity()
+    now = day_of("2024-06-30T00:00:00Z")
+    activity.add(now)
+    activity.add(now - 10, 2)
+    activity.add(now - 60, 3)
+    assert activity.window(7, now) == 1
+    assert activity.window(30, now) == 3
+    assert activity.window(90, now) == 6
+    assert activity.window(30, now + 25) == 1
+    assert activity.window(90, now + 25) == 6
+    assert activity.window(90, now + 31) == 3
+
+
+def test_ingest_skips_seen_commits():
+    activity = CommitActivity()
+    batch = [commit("b", "2024-06-30T10:00:00Z"), commit("a", "2024-06-29T10:00:00Z")]
+    assert activity.ingest(batch) == 2
+    assert activity.cursor == "2024-06-30T10:00:00Z"
+    # `since` is inclusive, so the newest commit comes back on the next refresh
+    assert activity.ingest([commit("c", "2024-06-30T10:00:00Z"), batch[0]]) == 1
+    assert activity.window(7, day_of("2024-06-30T00:00:00Z")) == 3
+
+
+def test_round_trip():
+    activity = CommitActivity()
+    activity.ingest([commit("a", "2024-06-30T10:00:00Z"), commit("b", "2024-05-01T10:00:00Z")])
+    restored = CommitActivity.from_dict(activity.to_dict())
+    now = day_of("2024-06-30T00:00:00Z")
+    assert restored.cursor == activity.cursor
+    assert restored.window(7, now) == 1
+    assert restored.window(90, now) == 2
+
+
+@pytest.mark.asyncio
+async def test_refresh_counts_every_page(upstream):
+    now = datetime.now(timezone.utc)
+    history = [commit(f"s{i}", (now - timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ")) for i in range(250)]
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        page = int(request.url.params["page"])
+        return httpx.Response(200, json=history[(page - 1) * 100:page * 100])
+
+    upstream(handler)
+    activity = await github.refresh_commit_activity("paged", "history")
+    assert len(requests) == 3
+    assert activity.window(90) == 250
+    assert activity.cursor == history[0]["commit"]["committer"]["date"]
+
+
+@pytest.mark.asyncio
+async def test_windowed_values_move_with_the_date(monkeypatch, upstream):
+    from src import commit_activity
+    from src.snapshots import SnapshotStore
+
+    committed = (datetime.now(timezone.utc) - timedelta(days=25)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    async def handler(request):
+        # Nothing new ever arrives: every conditional request is answered with 304
+        if request.headers.get("If-None-Match"):
+            return httpx.Response(304)
+        return httpx.Response(200, json=[commit("old", committed)], headers={"ETag": '"c"'})
+
+    upstream(handler)
+    store = SnapshotStore("")
+    monkeypatch.setattr(github, "snapshots", store)
+
+    assert await github.get_github_metric("aging", "commits", "commit_frequency") == "1"
+    # Ten days later the commit is 35 days old
+    later = commit_activity.today() + 10
+    monkeypatch.setattr(commit_activity, "today", lambda: later)
+    store.get("github:aging/commits/commit_frequency").fetched_at -= 10 ** 6
+    github._activity["commit_activity:aging:commits"].refreshed_at = 0
+    assert await github.get_github_metric("aging", "commits", "commit_frequency") == "0"
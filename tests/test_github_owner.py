@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.providers import github_owner
+from src.providers.github_owner import OwnerRepos
+
+
+def repos(start, count, stars=1):
+    return [{"full_name": f"o/r{i:04d}", "stargazers_count": stars, "forks_count": 1, "open_issues_count": 0}
+            for i in range(start, start + count)]
+
+
+def serve(pages, requests, kind="orgs"):
+    """Mock GitHub serving ``pages`` (page -> (etag, items)) for one owner"""
+
+    async def handler(request):
+        requests.append(request)
+        if f"/{kind}/" not in request.url.path:
+            return httpx.Response(404, json={})
+        page = int(request.url.params["page"])
+        etag, items = pages.get(page, ('"empty"', []))
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        last = f'<{request.url.copy_set_param("page", len(pages))}>; rel="last"'
+        return httpx.Response(200, json=items, headers={"ETag": etag, "Link": last})
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_pages_are_fetched_and_totals_revalidated_per_page(upstream):
+    pages = {1: ('"a1"', repos(0, 100)), 2: ('"a2"', repos(100, 100)), 3: ('"a3"', repos(200, 50))}
+    requests = []
+    upstream(serve(pages, requests))
+
+    assert await github_owner.get_owner_metric("paged", "stars") == "250"
+    github_owner._owners["github_owner:paged"].refreshed_at = 0
+    # One repo on page 2 gained stars
+    pages[2] = ('"b2"', repos(100, 99) + repos(199, 1, stars=11))
+    await github_owner.refresh_owner("paged")
+    assert await github_owner.get_owner_metric("paged", "stars") == "260"
+    assert await github_owner.get_owner_metric("paged", "repos") == "250"
+    assert len(requests) == 6
+    revalidated = {r.url.params["page"]: r.headers.get("If-None-Match") for r in requests[3:]}
+    assert revalidated == {"1": '"a1"', "2": '"a2"', "3": '"a3"'}
+
+
+@pytest.mark.asyncio
+async def test_users_fall_back_from_orgs(upstream):
+    requests = []
+    pages = {1: ('"u1"', repos(0, 3, stars=2))}
+    upstream(serve(pages, requests, kind="users"))
+    assert await github_owner.get_owner_metric("someone", "stars") == "6"
+    assert [r.url.path for r in requests] == ["/orgs/someone/repos", "/users/someone/repos"]
+
+
+def test_repos_moving_between_pages_are_counted_once():
+    state = OwnerRepos()
+    state.apply(1, None, repos(0, 2))
+    state.apply(2, None, repos(2, 2))
+    # A repo was deleted from page 1, so r0002 moved up; page 2 is read first
+    state.apply(2, None, repos(3, 1))
+    state.apply(1, None, repos(1, 2))
+    assert state.value("repos") == "3"
+    assert state.value("forks") == "3"
+    state.truncate(1)
+    assert state.value("repos") == "2"
+    assert OwnerRepos.from_dict(state.to_dict()).value("stars") == "2"
+
+
+@pytest.mark.asyncio
+async def test_page_fetches_share_a_bounded_pool(monkeypatch, upstream):
+    monkeypatch.setattr(github_owner.settings, "GITHUB_OWNER_CONCURRENCY", 3)
+    pages = {p: (f'"{p}"', repos(p * 100, 100)) for p in range(1, 13)}
+    inner = serve(pages, [])
+    inflight, peak = 0, 0
+
+    async def handler(request):
+        nonlocal inflight, peak
+        inflight += 1
+        peak = max(peak, inflight)
+        await asyncio.sleep(0.01)
+        inflight -= 1
+        return await inner(request)
+
+    upstream(handler)
+    assert await github_owner.get_owner_metric("big", "repos") == "1200"
+    assert peak == 3
@@ -0,0 +1,70 @@
+from datetime import date
+
+import httpx
+import pytest
+
+from src import heatmap
+from src.badges import generate_heatmap
+from src.commit_activity import CommitActivity
+from src.providers import github
+from src.snapshots import SnapshotStore
+
+
+def test_stats_become_weekday_rows():
+    weeks = [{"week": 0, "days": [0, 1, 2, 3, 4, 5, 6]}, {"week": 1, "days": [7, 0, 0, 0, 0, 0, 8]}]
+    matrix = heatmap.from_commit_activity_stats(weeks)
+    assert matrix.shape == (7, 2)
+    assert matrix[:, 1].tolist() == [7, 0, 0, 0, 0, 0, 8]
+    assert (heatmap.decode(heatmap.encode(matrix)) == matrix).all()
+
+
+def test_daily_counts_are_binned_by_weekday():
+    activity = CommitActivity()
+    wednesday = date(2024, 5, 15).toordinal()
+    activity.add(wednesday, 3)
+    activity.add(wednesday - 7, 1)
+    matrix = heatmap.from_daily_counts(activity)
+    assert matrix.shape[0] == 7 and matrix.sum() == 4
+    assert matrix[3, -1] == 3 and matrix[3, -2] == 1
+
+
+@pytest.mark.asyncio
+async def test_styles_reuse_the_cached_matrix(monkeypatch, upstream):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=[{"week": 0, "days": [1, 0, 0, 2, 0, 0, 9]}])
+
+    upstream(handler)
+    monkeypatch.setattr(github, "snapshots", SnapshotStore(""))
+    monkeypatch.setattr(heatmap, "decode", None)  # a cached matrix must never be decoded again
+
+    svgs = []
+    for style in ("flat", "neon"):
+        value = await github.get_github_metric("heat", "map", "heatmap")
+        svgs.append(generate_heatmap("commits", heatmap.matrix_for("heat/map", value), style=style))
+    flat, neon = svgs
+    assert len(requests) == 1
+    assert flat.count("<rect x=") == 7 and 'fill-opacity="1.0"' in flat
+    assert flat != neon
+
+
+def test_v1_and_prerender_draw_the_grid(monkeypatch, tmp_path):
+    from fastapi.testclient import TestClient
+
+    from src import prerender
+    from src.main import app
+
+    value = heatmap.encode(heatmap.from_commit_activity_stats([{"week": 0, "days": [1, 0, 0, 2, 0, 0, 9]}]))
+
+    async def get_github_metric(owner, repo, metric):
+        return value
+
+    monkeypatch.setattr(github, "get_github_metric", get_github_metric)
+    monkeypatch.setattr("src.snapshots.snapshots.path", "")
+    svg = TestClient(app).get("/badge/github/grid/v1/heatmap").text
+    assert svg.count("<rect x=") == 7
+
+    prerender.prerender({"badges": [{"github": "grid/files", "metric": "heatmap"}]}, str(tmp_path), workers=1)
+    assert (tmp_path / "v2/badge/github/grid/files/heatmap.svg").read_text().count("<rect x=") == 7
@@ -15,4 +15,24 @@ async def test_custom_badge():
         response = await client.get("/badge/custom?label=Hello&value=World")
         assert response.status_code == 200
         assert "image/svg+xml" in response.headers["content-type"]
-        assert b"Hello: World" in response.content
\ No newline at end of file
+        assert b"Hello: World" in response.content
+
+def test_deferred_tasks_start_once(monkeypatch):
+    import asyncio
+
+    import httpx
+
+    from src import main
+
+    started = []
+    monkeypatch.setattr(main, "_deferred_started", False)
+    monkeypatch.setattr(main, "start_background_tasks", lambda: started.append(1))
+
+    async def scenario():
+        # Several requests finish before the queued start gets to run
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            await asyncio.gather(*(client.get("/health") for _ in range(5)))
+            await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert started == [1]
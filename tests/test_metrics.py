@@ -0,0 +1,25 @@
+from src.metrics import Family, Histogram, render, status_class
+from src.providers.github import endpoint_of
+
+
+def test_histogram_buckets_are_cumulative():
+    family = Family("test_latency_seconds", "test", "histogram", ("route",), Histogram)
+    child = family.labels("/x")
+    for value in (0.002, 0.002, 0.3, 20.0):
+        child.observe(value)
+    lines = family.render()
+    assert 'test_latency_seconds_bucket{route="/x",le="0.0025"} 2' in lines
+    assert 'test_latency_seconds_bucket{route="/x",le="0.5"} 3' in lines
+    assert 'test_latency_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{route="/x"} 4' in lines
+    assert "# TYPE test_latency_seconds histogram" in render()
+
+
+def test_status_class_and_github_endpoint_labels():
+    assert status_class(200) == "2xx"
+    assert status_class(304) == "3xx"
+    assert status_class(503) == "5xx"
+    assert endpoint_of("https://api.github.com/repos/o/r") == "repo"
+    assert endpoint_of("https://api.github.com/repos/o/r/pulls?state=open") == "pulls"
+    assert endpoint_of("https://api.github.com/repos/o/r/releases/latest") == "releases"
+    assert endpoint_of("https://api.github.com/repos/o/r/traffic/views") == "other"
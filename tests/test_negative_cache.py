@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+
+from src.bloom import BloomFilter
+from src.negative_cache import NOT_FOUND, UPSTREAM_ERROR, MetricUnavailable, MissingFilter
+from src.providers import github
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"org/repo{i}")
+    assert all(f"org/repo{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other/repo{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_missing_filter_rotates_generations():
+    missing = MissingFilter(capacity=10, error_rate=0.01)
+    for i in range(10):
+        missing.add(f"a{i}")
+    missing.add("b0")
+    assert "a0" in missing and "b0" in missing
+    for i in range(1, 11):
+        missing.add(f"b{i}")
+    assert "b0" in missing
+    assert "a0" not in missing.current
+
+
+def test_missing_repo_is_fetched_once(monkeypatch):
+    calls = []
+
+    async def fetch_github_data(url, token=None):
+        calls.append(url)
+        request = httpx.Request("GET", url)
+        raise httpx.HTTPStatusError("404", request=request, response=httpx.Response(404, request=request))
+
+    monkeypatch.setattr(github, "fetch_github_data", fetch_github_data)
+
+    async def scenario():
+        outcomes = []
+        for metric in ("stars", "forks", "stars"):
+            try:
+                await github.get_github_metric("ghost", "Nope", metric)
+            except MetricUnavailable as e:
+                outcomes.append(e.category)
+        try:
+            await github.get_github_metric("ghost", "nope", "bogus")
+        except MetricUnavailable as e:
+            outcomes.append(e.category)
+        return outcomes
+
+    assert asyncio.run(scenario()) == [NOT_FOUND, NOT_FOUND, NOT_FOUND, "unknown_metric"]
+    assert len(calls) == 1
+
+
+def test_upstream_errors_are_scoped_to_the_metric(monkeypatch):
+    async def fetch_github_data(url, token=None):
+        if "pulls" in url:
+            raise httpx.ConnectError("down")
+        return {"stars": 7}
+
+    monkeypatch.setattr(github, "fetch_github_data", fetch_github_data)
+
+    async def scenario():
+        try:
+            await github.get_github_metric("flaky", "repo", "open_prs")
+        except MetricUnavailable as e:
+            assert e.category == UPSTREAM_ERROR
+        return await github.get_github_metric("flaky", "repo", "stars")
+
+    assert asyncio.run(scenario()) == "7"
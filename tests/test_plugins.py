@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+import pytest
+from src.plugins import PluginRegistry, PluginRuntime
+
+
+def sync_meta(**overrides):
+    return {"sync": True, "cache_ttl": 60, "max_latency": 1.0, **overrides}
+
+
+@pytest.mark.asyncio
+async def test_results_are_cached_per_metric():
+    runtime = PluginRuntime(max_workers=1)
+    calls = []
+
+    def get_metric(metric):
+        calls.append(metric)
+        return metric.upper()
+
+    assert await runtime.call("demo", get_metric, sync_meta(), "cpu") == "CPU"
+    assert await runtime.call("demo", get_metric, sync_meta(), "cpu") == "CPU"
+    assert await runtime.call("demo", get_metric, sync_meta(), "disk") == "DISK"
+    assert calls == ["cpu", "disk"]
+    assert runtime.stats["demo"].as_dict()["cache_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_sync_plugin_times_out_without_blocking_loop():
+    runtime = PluginRuntime(max_workers=1)
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        await runtime.call("slow", lambda metric: time.sleep(0.5), sync_meta(max_latency=0.05), "cpu")
+    assert time.perf_counter() - start < 0.4
+    assert runtime.stats["slow"].timeouts == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_are_counted_and_not_cached():
+    runtime = PluginRuntime(max_workers=1)
+
+    async def get_metric(metric):
+        raise ValueError(metric)
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await runtime.call("broken", get_metric, sync_meta(sync=False), "cpu")
+    assert runtime.stats["broken"].errors == 2
+
+
+def write_plugin(path, value, mtime):
+    path.write_text(f"def get_metric(metric):\n    return {value!r}\n")
+    os.utime(path, (mtime, mtime))
+
+
+def test_registry_imports_lazily_and_reloads(tmp_path):
+    write_plugin(tmp_path / "demo.py", "v1", 1000)
+    registry = PluginRegistry(str(tmp_path))
+    registry.index()
+    assert not registry.entries["demo"].loaded
+
+    assert registry.get("demo").get_metric("x") == "v1"
+    old = registry.get("demo").get_metric
+
+    write_plugin(tmp_path / "demo.py", "v2", 2000)
+    assert registry.check_for_changes() == ["demo"]
+    assert registry.get("demo").get_metric("x") == "v2"
+    # A call that grabbed the old function keeps working
+    assert old("x") == "v1"
+    assert registry.reloads == 1
+
+
+def test_broken_reload_keeps_old_module(tmp_path):
+    write_plugin(tmp_path / "demo.py", "v1", 1000)
+    registry = PluginRegistry(str(tmp_path))
+    registry.index()
+    registry.get("demo")
+
+    (tmp_path / "demo.py").write_text("def get_metric(metric):\n    return (\n")
+    os.utime(tmp_path / "demo.py", (2000, 2000))
+    assert registry.check_for_changes() == []
+    assert registry.get("demo").get_metric("x") == "v1"
+    assert registry.entries["demo"].error
+
+
+def test_reindex_keeps_plugins_loaded_before_fork(tmp_path):
+    write_plugin(tmp_path / "demo.py", "v1", 1000)
+    write_plugin(tmp_path / "other.py", "v1", 1000)
+    registry = PluginRegistry(str(tmp_path))
+    registry.index()
+    registry.get("demo")
+    registry.get("other")
+
+    write_plugin(tmp_path / "other.py", "v2", 2000)
+    registry.index()
+    assert registry.entries["demo"].loaded
+    assert not registry.entries["other"].loaded
+    assert registry.get("other").get_metric("x") == "v2"
@@ -0,0 +1,33 @@
+import gzip
+import os
+
+from src import prerender
+
+
+def test_prerender_writes_mirrored_files_and_skips_unchanged(tmp_path, monkeypatch):
+    values = {"stars": "10", "forks": "2"}
+
+    async def get_github_metric(owner, repo, metric):
+        return values[metric]
+
+    monkeypatch.setattr("src.providers.github.get_github_metric", get_github_metric)
+    monkeypatch.setattr("src.snapshots.snapshots.path", "")
+    manifest = {
+        "badges": [
+            {"github": "octo/cat", "metrics": ["stars", "forks"], "styles": ["flat", "neon"]},
+            {"label": "build", "value": "passing", "color": "green"},
+        ]
+    }
+    out = str(tmp_path)
+
+    report = prerender.prerender(manifest, out, workers=2)
+    assert (report["badges"], report["written"], report["failed"]) == (5, 5, [])
+    svg_path = os.path.join(out, "v2/badge/github/octo/cat/stars.svg")
+    with open(svg_path, "rb") as f, gzip.open(svg_path + ".gz") as gz:
+        assert f.read() == gz.read()
+    assert os.path.exists(os.path.join(out, "v2/badge/github/octo/cat/forks_style-neon.svg"))
+    assert os.path.exists(os.path.join(out, "v2/badge/custom_label-build_value-passing_color-green.svg"))
+
+    values["stars"] = "11"
+    report = prerender.prerender(manifest, out, workers=2)
+    assert (report["written"], report["unchanged"]) == (2, 3)
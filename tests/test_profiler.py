@@ -0,0 +1,35 @@
+import threading
+import time
+
+import pytest
+
+from src.profiler import ProfilerBusy, SamplingProfiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_attributes_samples_to_the_busy_function():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,))
+    worker.start()
+    profiler = SamplingProfiler(worker.ident, interval=0.005)
+    profiler.start()
+    try:
+        with pytest.raises(ProfilerBusy):
+            SamplingProfiler(worker.ident).start()
+        time.sleep(0.2)
+    finally:
+        profiler.stop()
+        stop.set()
+        worker.join()
+
+    report = profiler.report()
+    assert report["samples"] > 0
+    assert any(entry["function"].startswith("busy_loop ") for entry in report["top"])
+    for line in report["collapsed"].splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert "busy_loop" in stack
@@ -0,0 +1,73 @@
+import json
+
+import httpx
+import pytest
+
+from src.providers import pypi
+from src.snapshots import SnapshotStore
+
+DOCUMENT = {
+    "info": {"version": "2.1.0", "requires_python": ">=3.9", "license": "",
+             "classifiers": ["License :: OSI Approved :: MIT License"]},
+    "last_serial": 42,
+    "releases": {
+        "1.0": [{"upload_time_iso_8601": "2021-03-01T10:00:00Z"}],
+        "2.0": [],
+        "2.1.0": [{"upload_time_iso_8601": "2024-06-02T08:00:00Z"}, {"upload_time_iso_8601": "2024-06-01T08:00:00Z"}],
+    },
+    "urls": [],
+}
+
+
+@pytest.mark.asyncio
+async def test_reading_stops_after_the_wanted_members():
+    raw = json.dumps(DOCUMENT).encode()
+    served = []
+
+    async def chunks():
+        for i in range(0, len(raw), 16):
+            served.append(i)
+            yield raw[i:i + 16]
+
+    members = await pypi.read_members(chunks(), {"info"})
+    assert members["info"]["version"] == "2.1.0"
+    assert len(served) * 16 < raw.index(b'"releases"')
+
+
+@pytest.mark.asyncio
+async def test_metrics_share_one_revalidated_snapshot(monkeypatch, upstream):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        if request.url.host == "pypistats.org":
+            return httpx.Response(200, json={"data": {"last_day": 1, "last_week": 7, "last_month": 1234567}})
+        if request.headers.get("If-None-Match") == '"r1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=DOCUMENT, headers={"ETag": '"r1"'})
+
+    upstream(handler)
+    store = SnapshotStore("")
+    monkeypatch.setattr(pypi, "snapshots", store)
+
+    values = [await pypi.get_pypi_metric("demo", m) for m in ("version", "license", "python_requires")]
+    values.append(await pypi.get_pypi_metric("demo", "releases"))
+    store.get("pypi:demo").fetched_at -= 10 ** 6
+    values.append(await pypi.get_pypi_metric("demo", "last_upload"))
+    values.append(await pypi.get_pypi_metric("demo", "downloads"))
+    assert values == ["2.1.0", "MIT License", ">=3.9", "2", "2024-06-02", "1.2M/month"]
+    # info once, info + releases once, then a 304 for the stale snapshot
+    assert [r.headers.get("If-None-Match") for r in requests if r.url.host == "pypi.org"] == [None, None, '"r1"']
+
+
+@pytest.mark.asyncio
+async def test_bulk_lookup_maps_failures_to_none(monkeypatch, upstream):
+    async def handler(request):
+        if "missing" in request.url.path:
+            return httpx.Response(404)
+        return httpx.Response(200, json=DOCUMENT)
+
+    upstream(handler)
+    monkeypatch.setattr(pypi, "snapshots", SnapshotStore(""))
+    values = await pypi.get_pypi_metrics(["a", "missing-pkg", "a", "b"], "version")
+    assert values == {"a": "2.1.0", "missing-pkg": None, "b": "2.1.0"}
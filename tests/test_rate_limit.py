@@ -0,0 +1,36 @@
+import pytest
+from src.rate_limit import LeasedRateLimiter
+
+
+class FakeScript:
+    """Stands in for the Redis Lua script with a plain fixed window"""
+
+    def __init__(self):
+        self.calls = 0
+        self.counters = {}
+
+    async def __call__(self, keys, args):
+        self.calls += 1
+        limit, wanted = args[0], args[1]
+        used = self.counters.get(keys[0], 0)
+        granted = max(0, min(wanted, limit - used))
+        self.counters[keys[0]] = used + granted
+        return granted
+
+
+@pytest.mark.asyncio
+async def test_leased_tokens_skip_redis():
+    limiter = LeasedRateLimiter("redis://localhost:6379", {"custom": "100/hour"}, lease_size=10)
+    limiter.script = FakeScript()
+    for _ in range(20):
+        assert await limiter.hit("custom", "1.2.3.4")
+    assert limiter.script.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_global_limit_enforced():
+    limiter = LeasedRateLimiter("redis://localhost:6379", {"github": "30/hour"}, lease_size=10)
+    limiter.script = FakeScript()
+    results = [await limiter.hit("github", "1.2.3.4") for _ in range(35)]
+    assert results.count(True) == 30
+    assert not results[-1]
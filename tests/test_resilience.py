@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.metrics import UpstreamInstruments
+from src.providers import github
+from src.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, Upstream
+
+INSTRUMENTS = UpstreamInstruments("test", "json")
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("src.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_after=10)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    now[0] += 10
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # one probe at a time
+    breaker.failure()
+    assert breaker.state == OPEN
+
+    now[0] += 10
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_returns_the_faster_response(monkeypatch, upstream):
+    monkeypatch.setattr("src.resilience.settings.UPSTREAM_HEDGE", True)
+    monkeypatch.setattr("src.resilience.settings.UPSTREAM_HEDGE_MIN_DELAY", 0.01)
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+        return httpx.Response(200, json={"call": len(calls)})
+
+    upstream(handler)
+    hedged = Upstream("hedge-test")
+    hedged.latency.p95 = 0.01
+    hedged.calls = 100
+    response = await hedged.get(INSTRUMENTS, "https://example.test/x")
+    assert response.json() == {"call": 2}
+    assert hedged.hedges == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_waits_past_a_fast_server_error(monkeypatch, upstream):
+    monkeypatch.setattr("src.resilience.settings.UPSTREAM_HEDGE", True)
+    monkeypatch.setattr("src.resilience.settings.UPSTREAM_HEDGE_MIN_DELAY", 0.01)
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, json={"call": 1})
+        return httpx.Response(502)
+
+    upstream(handler)
+    hedged = Upstream("hedge-error-test")
+    hedged.latency.p95 = 0.01
+    hedged.calls = 100
+    response = await hedged.get(INSTRUMENTS, "https://example.test/x")
+    assert response.json() == {"call": 1}
+    assert hedged.breaker.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_serves_last_known_value(monkeypatch, upstream):
+    async def handler(request):
+        return httpx.Response(503)
+
+    upstream(handler)
+    monkeypatch.setattr(github, "_upstream", Upstream("github"))
+    github._upstream.breaker.failure_threshold = 1
+    await github.remember("github", "octo/cat/stars", "42")
+    assert await github.get_github_metric("octo", "cat", "stars") == "42"
+    assert github._upstream.breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        await github.fetch_github_data(github.BASE_URL.format(owner="octo", repo="cat"))
+    assert await github.get_github_metric("octo", "cat", "stars") == "42"
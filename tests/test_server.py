@@ -0,0 +1,99 @@
+import itertools
+import os
+
+import uvicorn
+
+from src import server
+from src.config import settings
+from src.server import Supervisor
+
+
+class FakeProcesses:
+    """fork/kill/waitpid for a supervisor whose workers exit as soon as they are signalled"""
+
+    def __init__(self, monkeypatch):
+        self.pids = itertools.count(100)
+        self.events = []
+        self.exited = []
+        monkeypatch.setattr(os, "fork", self.fork)
+        monkeypatch.setattr(os, "kill", self.kill)
+        monkeypatch.setattr(os, "waitpid", self.waitpid)
+        monkeypatch.setattr(server, "POLL_INTERVAL", 0.0)
+
+    def fork(self):
+        pid = next(self.pids)
+        self.events.append(("start", pid))
+        return pid
+
+    def kill(self, pid, signum):
+        self.events.append(("stop", pid))
+        self.exited.append(pid)
+
+    def waitpid(self, pid, options):
+        if self.exited:
+            return self.exited.pop(0), 0
+        if options == 0:
+            raise ChildProcessError
+        return 0, 0
+
+
+def test_slots_and_primary(monkeypatch):
+    processes = FakeProcesses(monkeypatch)
+    supervisor = Supervisor(None, None, 3, graceful_timeout=1)
+    for slot in range(3):
+        supervisor.spawn(slot)
+    assert supervisor.slots == {100: 0, 101: 1, 102: 2}
+    assert supervisor.pid_of(2) == 102
+
+    # A worker that dies on its own is queued for a restart in its slot
+    processes.exited.append(101)
+    supervisor.reap()
+    assert supervisor.exited == [1]
+    assert supervisor.pid_of(1) is None
+
+    primary = []
+
+    class Server:
+        def __init__(self, config):
+            pass
+
+        def run(self, sockets):
+            primary.append(settings.PRIMARY_WORKER)
+
+    monkeypatch.setattr(uvicorn, "Server", Server)
+    monkeypatch.setattr(server.signal, "signal", lambda *args: None)
+    monkeypatch.setattr(settings, "PRIMARY_WORKER", True)
+    for slot in range(3):
+        supervisor.run_worker(slot)
+    assert primary == [True, False, False]
+
+
+def test_rolling_restart_order(monkeypatch):
+    processes = FakeProcesses(monkeypatch)
+    supervisor = Supervisor(None, None, 3, graceful_timeout=1)
+    for slot in range(3):
+        supervisor.spawn(slot)
+    processes.events.clear()
+
+    supervisor.rolling_restart()
+    # The primary is stopped before its replacement starts; the others overlap
+    assert processes.events == [("stop", 100), ("start", 103),
+                                ("start", 104), ("stop", 101),
+                                ("start", 105), ("stop", 102)]
+    assert supervisor.slots == {103: 0, 104: 1, 105: 2}
+    assert supervisor.exited == [] and supervisor.retiring == set()
+
+
+def test_plugins_reload_in_every_worker(monkeypatch):
+    from src import scheduler
+
+    jobs = []
+    monkeypatch.setattr(settings, "TIMESERIES_SAMPLE_INTERVAL", 60)
+    monkeypatch.setattr(settings, "PLUGIN_RELOAD_INTERVAL", 30)
+    monkeypatch.setattr(scheduler.scheduler, "add_job", lambda job, trigger: jobs.append(job.__name__))
+    monkeypatch.setattr(scheduler.scheduler, "start", lambda: None)
+    scheduler.start_scheduler(primary=False)
+    assert jobs == ["reload_plugins"]
+    jobs.clear()
+    scheduler.start_scheduler(primary=True)
+    assert "sample_timeseries" in jobs and "reload_plugins" in jobs
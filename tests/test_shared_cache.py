@@ -0,0 +1,53 @@
+import multiprocessing
+
+from src.shared_cache import PROBE, SharedMemoryCache
+
+
+def test_round_trip_ttl_and_oversized_values(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / "shm"), slots=64, slot_size=256)
+    assert cache.set("badge:a", "<svg>a</svg>", ttl=60)
+    assert cache.set("badge:a", "<svg>b</svg>", ttl=60)
+    assert cache.get("badge:a") == "<svg>b</svg>"
+    assert cache.get("badge:missing") is None
+    assert not cache.set("badge:big", "x" * 1000, ttl=60)
+
+    assert cache.set("badge:old", "gone", ttl=-1)
+    assert cache.get("badge:old") is None
+    assert cache.expirations == 1
+    assert cache.count() == 1
+
+
+def test_full_probe_window_evicts_soonest_expiry(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / "shm"), slots=1, slot_size=256)
+    for i in range(PROBE + 1):
+        cache.set(f"k{i}", str(i), ttl=100 + i)
+    assert cache.evictions >= 1
+    assert cache.get(f"k{PROBE}") == str(PROBE)
+
+
+def _writer(path):
+    SharedMemoryCache(path, slots=64, slot_size=256).set("from-child", "rendered elsewhere", ttl=60)
+
+
+def test_other_processes_see_writes(tmp_path):
+    path = str(tmp_path / "shm")
+    cache = SharedMemoryCache(path, slots=64, slot_size=256)
+    child = multiprocessing.get_context("fork").Process(target=_writer, args=(path,))
+    child.start()
+    child.join()
+    assert cache.get("from-child") == "rendered elsewhere"
+
+
+def test_new_layout_leaves_old_mappings_intact(tmp_path):
+    path = str(tmp_path / "shm")
+    old = SharedMemoryCache(path, slots=64, slot_size=256)
+    for i in range(64):
+        old.set(f"k{i}", "old", ttl=60)
+
+    # A rolling deploy with a different slot count
+    new = SharedMemoryCache(path, slots=16, slot_size=256)
+    assert new.get("k0") is None
+    assert sum(old.get(f"k{i}") == "old" for i in range(64)) == old.count()
+
+    new.set("k1", "new", ttl=60)
+    assert SharedMemoryCache(path, slots=16, slot_size=256).get("k1") == "new"
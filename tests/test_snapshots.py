@@ -0,0 +1,64 @@
+import httpx
+import pytest
+
+from src.providers import github
+from src.snapshots import SnapshotStore
+
+
+@pytest.mark.asyncio
+async def test_snapshots_survive_a_restart(tmp_path):
+    path = str(tmp_path / "snapshots.db")
+    store = SnapshotStore(path)
+    await store.load()
+    store.put("github:a/b/stars", "12", "https://api.github.com/repos/a/b", '"v1"')
+    store.put("github:a/b/commit_velocity", "3.0/week")
+    await store.flush()
+
+    restarted = SnapshotStore(path)
+    await restarted.load()
+    assert restarted.loaded == 2
+    snapshot = restarted.get("github:a/b/stars")
+    assert (snapshot.value, snapshot.etag) == ("12", '"v1"')
+    assert snapshot.fresh
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_revalidated_not_refetched(monkeypatch, upstream):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json={"stargazers_count": 5, "stars": 5}, headers={"ETag": '"v1"'})
+
+    upstream(handler)
+    store = SnapshotStore("")
+    monkeypatch.setattr(github, "snapshots", store)
+
+    assert await github.get_github_metric("rev", "alidate", "stars") == "5"
+    store.get("github:rev/alidate/stars").fetched_at -= 10 ** 6
+    assert await github.get_github_metric("rev", "alidate", "stars") == "5"
+    assert [r.headers.get("If-None-Match") for r in requests] == [None, '"v1"']
+    assert store.get("github:rev/alidate/stars").fresh
+
+
+@pytest.mark.asyncio
+async def test_revalidation_404_goes_through_the_metric(monkeypatch, upstream):
+    released = [True]
+
+    async def handler(request):
+        if request.url.path.endswith("/releases/latest") and released[0]:
+            return httpx.Response(200, json={"tag_name": "v1.0"}, headers={"ETag": '"r1"'})
+        return httpx.Response(404, json={"message": "Not Found"})
+
+    upstream(handler)
+    store = SnapshotStore("")
+    monkeypatch.setattr(github, "snapshots", store)
+
+    assert await github.get_github_metric("del", "eted", "release") == "v1.0"
+    # The release is deleted; the repo itself is still there
+    released[0] = False
+    store.get("github:del/eted/release").fetched_at -= 10 ** 6
+    assert await github.get_github_metric("del", "eted", "release") == "none"
+    await github._negative.check("del/eted")
@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import pytest
+
+from src import timeseries
+from src.badges import generate_delta_badge, generate_sparkline
+from src.timeseries import DAY, HOURLY_POINTS, RAW_POINTS, Series, SQLiteSeries, TimeSeriesStore
+
+
+def test_tiers_stay_bounded_and_downsample():
+    store = TimeSeriesStore(max_series=10)
+    start = (time.time() // DAY - 30) * DAY
+    for i in range(30 * 24 * 4):  # every 15 minutes for 30 days
+        store.record("o/r", "stars", float(i), ts=start + i * 900)
+    series = store.get("o/r", "stars")
+    assert series.raw.size == RAW_POINTS
+    assert series.hourly.size == HOURLY_POINTS
+    assert 30 <= series.daily.size <= 31
+
+    # Last value in each hour wins
+    hourly = series.hourly.ordered()
+    assert (hourly[1:, 1] - hourly[:-1, 1] == 4).all()
+
+    # 14 days back is beyond raw and hourly, so the daily tier answers
+    ts, values = series.range(time.time() - 14 * DAY)
+    assert 13 <= len(ts) <= 15
+    assert store.delta("o/r", "stars", 7) == values[-1] - series.value_at(time.time() - 7 * DAY)
+
+
+def test_series_count_is_bounded():
+    store = TimeSeriesStore(max_series=2)
+    for repo in ("a/a", "b/b", "c/c"):
+        store.record(repo, "stars", 1.0)
+    assert store.get("a/a", "stars") is None
+    assert len(store.series) == 2
+
+
+def test_sparkline_and_delta_badges_render():
+    svg = generate_sparkline("stars 90d", [1, 2, 3, 5, 8])
+    assert "<polyline" in svg and "stars 90d" in svg
+    assert "no data" in generate_sparkline("stars 90d", [])
+    assert "+12 this week" in generate_delta_badge("stars", 12, "this week")
+    assert "#e05d44" in generate_delta_badge("stars", -3, "this week")
+
+
+@pytest.mark.asyncio
+async def test_resampling_records_each_value_once(monkeypatch, upstream):
+    import httpx
+
+    from src import scheduler
+    from src.providers import github
+    from src.snapshots import SnapshotStore
+
+    store = TimeSeriesStore(max_series=10)
+    recorded = []
+    record = store.record
+    monkeypatch.setattr(store, "record", lambda *args, **kwargs: recorded.append(args[:3]) or record(*args, **kwargs))
+    monkeypatch.setattr(timeseries, "store", store)
+    monkeypatch.setattr(timeseries, "shared", None)
+    snapshots = SnapshotStore("")
+    monkeypatch.setattr(github, "snapshots", snapshots)
+
+    stars = [7]
+
+    async def handler(request):
+        body = {"stars": stars[0]}
+        etag = f'"{stars[0]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json=body, headers={"ETag": etag})
+
+    upstream(handler)
+    await github.get_github_metric("re", "sample", "stars")
+    snapshot = snapshots.get("github:re/sample/stars")
+    snapshot.fetched_at -= 10 ** 6
+    await scheduler.sample_timeseries()  # 304: recorded by the provider
+    await scheduler.sample_timeseries()  # fresh snapshot: recorded by the sampler
+    stars[0] = 8
+    snapshot.fetched_at -= 10 ** 6
+    await scheduler.sample_timeseries()  # changed: refetched and recorded by the provider
+    assert recorded == [("re/sample", "stars", 7.0)] * 3 + [("re/sample", "stars", 8.0)]
+
+
+def test_series_round_trips_through_bytes():
+    series = Series()
+    for i in range(400):
+        series.add(1000.0 + i * 900, float(i))
+    restored = Series.from_bytes(series.to_bytes())
+    for ring, copy in zip((series.raw, series.hourly, series.daily), (restored.raw, restored.hourly, restored.daily)):
+        assert (ring.size, ring.next) == (copy.size, copy.next)
+        assert (ring.ordered() == copy.ordered()).all()
+
+
+@pytest.mark.asyncio
+async def test_workers_share_series_through_the_snapshot_database(tmp_path):
+    path = str(tmp_path / "snapshots.db")
+    # Two workers flushing at once each merge into the same row
+    first, second = SQLiteSeries(path, max_series=2), SQLiteSeries(path, max_series=2)
+    now = time.time()
+    await asyncio.gather(first.write({("o/r", "stars"): [(now - 60, 5.0)]}),
+                         second.write({("o/r", "stars"): [(now - 60, 6.0)]}))
+    for worker in (first, second):
+        series = await worker.get("o/r", "stars")
+        assert sorted(series.raw.ordered()[:, 1]) == [5.0, 6.0]
+
+    # A sample older than the stored series is dropped rather than stored out of order
+    await first.write({("o/r", "stars"): [(now - 90, 4.0)]})
+    assert (await second.get("o/r", "stars")).raw.size == 2
+
+    await second.write({("a/b", "forks"): [(now - 120, 1.0)], ("c/d", "forks"): [(now, 2.0)]})
+    assert await first.stalest(5) == [("o/r", "stars"), ("c/d", "forks")]
+    assert await first.get("a/b", "forks") is None
+
+
+@pytest.mark.asyncio
+async def test_workers_share_series_through_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    from src.timeseries_redis import RedisSeries
+
+    server = fakeredis.FakeServer()
+    first, second = RedisSeries("redis://localhost:6379", 2), RedisSeries("redis://localhost:6379", 2)
+    first.redis = fakeredis.aioredis.FakeRedis(server=server)
+    second.redis = fakeredis.aioredis.FakeRedis(server=server)
+    now = time.time()
+    await asyncio.gather(first.write({("o/r", "stars"): [(now - 60, 5.0)]}),
+                         second.write({("o/r", "stars"): [(now - 60, 6.0)]}))
+    series = await second.get("o/r", "stars")
+    assert sorted(series.raw.ordered()[:, 1]) == [5.0, 6.0]
+
+    await second.write({("a/b", "forks"): [(now - 120, 1.0)], ("c/d", "forks"): [(now, 2.0)]})
+    assert await first.stalest(5) == [("o/r", "stars"), ("c/d", "forks")]
+    assert await first.get("a/b", "forks") is None
+
+
+@pytest.mark.asyncio
+async def test_trend_badges_read_the_shared_series(monkeypatch, tmp_path):
+    monkeypatch.setattr(timeseries, "shared", SQLiteSeries(str(tmp_path / "snapshots.db"), max_series=10))
+    monkeypatch.setattr(timeseries, "store", TimeSeriesStore(max_series=10))
+    monkeypatch.setattr(timeseries, "_pending", {})
+    timeseries.record_metric("o/r", "stars", "3")
+    timeseries.record_metric("o/r", "stars", "5")
+    # Queued, not yet visible to any worker
+    assert await timeseries.delta("o/r", "stars", 7) is None
+    await timeseries.flush()
+    series = await timeseries.get_series("o/r", "stars")
+    assert list(series.raw.ordered()[:, 1]) == [3.0, 5.0]
+    assert await timeseries.delta("o/r", "stars", 7) == series.delta(7)
+    assert list(await timeseries.sparkline("o/r", "stars", 7, points=3)) == list(series.sparkline(7, 3))
+    assert await timeseries.stalest(10) == [("o/r", "stars")]
+    assert not timeseries.store.series
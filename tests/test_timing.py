@@ -0,0 +1,44 @@
+import asyncio
+
+from src import timing
+from src.timing import record_if_slow, start_request, timed
+
+
+@timed("render")
+def render():
+    return "svg"
+
+
+@timed("cache_get")
+async def lookup():
+    await asyncio.sleep(0)
+    return None
+
+
+def test_phases_accumulate_per_request():
+    assert render() == "svg"  # no request in progress, nothing recorded
+
+    async def request():
+        timer = start_request()
+        render()
+        render()
+        await lookup()
+        return timer
+
+    timer = asyncio.run(request())
+    assert set(timer.phases) == {"render", "cache_get"}
+    header = timer.server_timing(0.0123)
+    assert header.startswith("render;dur=")
+    assert header.endswith("total;dur=12.30")
+
+
+def test_slow_log_is_bounded(monkeypatch):
+    monkeypatch.setattr(timing.settings, "SLOW_REQUEST_MS", 10.0)
+    timing.slow_requests.clear()
+    timer = timing.RequestTimer()
+    record_if_slow(timer, "GET", "/fast", "/fast", 200, 0.005)
+    for i in range(timing.slow_requests.maxlen + 5):
+        record_if_slow(timer, "GET", f"/slow/{i}", "/slow/{i}", 200, 0.5)
+    log = timing.slow_request_log()
+    assert len(log) == timing.slow_requests.maxlen
+    assert log[0]["path"] == f"/slow/{timing.slow_requests.maxlen + 4}"